@@ -0,0 +1,134 @@
+# Stdlib Imports
+import datetime
+from typing import Optional
+
+# FastAPI Imports
+from fastapi import Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+# Own Imports
+from admin.router import router
+from core.metrics import metrics
+from core.deps import get_admin_user
+from auth.principals import principals
+from schemas.user import Principal
+from orm.ledger import ledger_orm
+from orm.imports import import_jobs_orm
+from core.settings import ledger_settings
+from schemas.ledger import ImportJob, Wallet
+from ledger.services.imports import FORMATS, DepositImporter, iter_lines
+from ledger.services import exports
+
+
+@router.get("/metrics/")
+async def service_metrics(
+    admin_user: Principal = Depends(get_admin_user),
+) -> dict:
+    return metrics.snapshot()
+
+
+@router.post("/imports/deposits/", response_model=ImportJob)
+async def import_deposits(
+    request: Request,
+    format: str = "csv",
+    chunk_size: int = Query(ledger_settings.IMPORT_CHUNK_SIZE, ge=1),
+    job_id: Optional[int] = None,
+    admin_user: Principal = Depends(get_admin_user),
+):
+    """
+    Import a csv (`user,id,amount` header) or newline delimited json
+    file of deposits, streamed as the raw request body. Pass the `job_id`
+    of a failed import to resume it after its last committed chunk.
+    """
+
+    if format not in FORMATS:
+        raise HTTPException(
+            400, {"message": f"Format must be one of {', '.join(FORMATS)}!"}
+        )
+
+    if job_id is None:
+        job = await import_jobs_orm.create(format)
+    else:
+        job = await import_jobs_orm.get(job_id)
+        if job is None:
+            raise HTTPException(404, {"message": "Import job does not exist!"})
+        if job.status == "completed" or job.format != format:
+            raise HTTPException(
+                400, {"message": "Import job can not be resumed!"}
+            )
+
+    importer = DepositImporter(chunk_size)
+    return await importer.run(job, iter_lines(request.stream()))
+
+
+@router.get("/imports/{job_id}/", response_model=ImportJob)
+async def import_job(
+    job_id: int,
+    admin_user: Principal = Depends(get_admin_user),
+):
+
+    job = await import_jobs_orm.get(job_id)
+    if job is None:
+        raise HTTPException(404, {"message": "Import job does not exist!"})
+    return job
+
+
+@router.post("/wallets/{wallet_id}/stripes/", response_model=Wallet)
+async def stripe_wallet(
+    wallet_id: int,
+    stripes: int = Query(..., ge=2, le=ledger_settings.WALLET_MAX_STRIPES),
+    admin_user: Principal = Depends(get_admin_user),
+):
+    """
+    Split the balance of a hot wallet across `stripes` rows, so concurrent
+    deposits and withdrawals stop queueing on a single row lock.
+    """
+
+    return await ledger_orm.stripe(wallet_id, stripes)
+
+
+@router.get("/exports/{kind}/")
+async def export_ledger(
+    kind: str,
+    format: str = "ndjson",
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    gzip: bool = False,
+    admin_user: Principal = Depends(get_admin_user),
+):
+    """
+    Stream every user and their wallets (`users`), or every journal
+    entry created from `start` up to `end` (`entries`), as newline
+    delimited json or csv, optionally gzipped.
+    """
+
+    if kind not in exports.EXPORTS:
+        raise HTTPException(404, {"message": "Export does not exist!"})
+    if format not in exports.FORMATS:
+        raise HTTPException(
+            400,
+            {"message": f"Format must be one of {', '.join(exports.FORMATS)}!"},
+        )
+
+    filename = f"{kind}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        exports.export_stream(kind, format, start, end, compress=gzip),
+        media_type="application/gzip" if gzip else exports.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/users/{user_id}/revoke-tokens/")
+async def revoke_user_tokens(
+    user_id: int,
+    admin_user: Principal = Depends(get_admin_user),
+) -> dict:
+    """
+    Revoke every token issued to a user so far, e.g after their role
+    changed or their account was compromised.
+    """
+
+    version = await principals.revoke(user_id)
+    if version is None:
+        raise HTTPException(404, {"message": "User does not exist!"})
+    return {"message": f"Tokens of user #{user_id} revoked!"}
@@ -0,0 +1,9 @@
+# FastAPI Imports
+from fastapi import APIRouter, Depends
+
+# Own Imports
+from auth.auth_bearer import jwt_bearer
+
+
+# initialize router
+router = APIRouter(prefix="/admin", dependencies=[Depends(jwt_bearer)])
@@ -0,0 +1,32 @@
+"""Exclude stripes from users balance
+
+Revision ID: 2c7e5a9f0b61
+Revises: 6e0a2c9d47b5
+Create Date: 2026-10-18 21:02:14.530871
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2c7e5a9f0b61'
+down_revision = '6e0a2c9d47b5'
+branch_labels = None
+depends_on = None
+
+# the amount held in the stripes of a user wallets
+STRIPES = (
+    "COALESCE(("
+    "SELECT SUM(wallet_stripes.amount) FROM wallet_stripes "
+    "JOIN users_wallet ON users_wallet.id = wallet_stripes.wallet_id "
+    "WHERE users_wallet.user = users.id), 0)"
+)
+
+
+def upgrade() -> None:
+    # the stripes are added when the total is read
+    op.execute(f"UPDATE users SET balance = balance - {STRIPES}")
+
+
+def downgrade() -> None:
+    op.execute(f"UPDATE users SET balance = balance + {STRIPES}")
@@ -0,0 +1,53 @@
+"""Add users wallet owner indexes
+
+Revision ID: 4d2f9a6c81e7
+Revises: e7a1b4c9d203
+Create Date: 2026-10-18 15:02:47.530114
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4d2f9a6c81e7'
+down_revision = 'e7a1b4c9d203'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != "postgresql":
+        # SQLite can not build an index without locking the table,
+        # nor INCLUDE columns in one
+        op.create_index(
+            'ix_users_wallet_user_id', 'users_wallet', ['user', 'id'], unique=False,
+        )
+        return
+
+    # CREATE INDEX CONCURRENTLY does not block writes, but can not run
+    # inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_wallet_user_id', 'users_wallet', ['user', 'id'], unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_users_wallet_user_amount', 'users_wallet', ['user'], unique=False,
+            postgresql_include=['amount'], postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != "postgresql":
+        op.drop_index('ix_users_wallet_user_id', table_name='users_wallet')
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_users_wallet_user_amount', table_name='users_wallet',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_users_wallet_user_id', table_name='users_wallet',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,44 @@
+"""Add entries wallet created index
+
+Revision ID: 6e0a2c9d47b5
+Revises: d9b3f6e1a0c4
+Create Date: 2026-10-18 19:04:38.916225
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6e0a2c9d47b5'
+down_revision = 'd9b3f6e1a0c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != "postgresql":
+        op.create_index(
+            'ix_entries_wallet_created', 'entries', ['wallet_id', 'created_at', 'id'],
+            unique=False,
+        )
+        return
+
+    # the journal is written by every money movement, build the index
+    # without blocking them (CONCURRENTLY can not run in a transaction)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_entries_wallet_created', 'entries', ['wallet_id', 'created_at', 'id'],
+            unique=False, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != "postgresql":
+        op.drop_index('ix_entries_wallet_created', table_name='entries')
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_entries_wallet_created', table_name='entries',
+            postgresql_concurrently=True,
+        )
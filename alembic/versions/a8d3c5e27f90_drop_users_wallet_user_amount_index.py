@@ -0,0 +1,40 @@
+"""Drop users wallet user amount index
+
+Revision ID: a8d3c5e27f90
+Revises: 2c7e5a9f0b61
+Create Date: 2026-10-18 21:40:52.118406
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d3c5e27f90'
+down_revision = '2c7e5a9f0b61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != "postgresql":
+        # only PostgreSQL had it, SQLite can not INCLUDE columns
+        return
+
+    # the totals are read from the user row, while the INCLUDEd amount
+    # made every balance update write to the index
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_users_wallet_user_amount', table_name='users_wallet',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != "postgresql":
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_wallet_user_amount', 'users_wallet', ['user'], unique=False,
+            postgresql_include=['amount'], postgresql_concurrently=True,
+        )
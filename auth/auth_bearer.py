@@ -39,28 +39,15 @@ class JWTBearer(HTTPBearer):
             if authorization_credentials.scheme != "Bearer":
                 raise HTTPException(403, {"message": "Invalid authentication scheme."})
 
-            if not self.verify_jwt_token(authorization_credentials.credentials):
-                raise HTTPException(403, {"message": "Invalid token or expired token."})
+            # verified once per request, the claims are kept for the
+            # dependencies that need them
+            request.state.claims = authentication.decode_jwt(
+                authorization_credentials.credentials
+            )
 
             return authorization_credentials.credentials
         else:
             raise HTTPException(403, {"message": "Invalid authorization code."})
 
-    def verify_jwt_token(self, token: str) -> bool:
-        """
-        This method takes a JWT token as an argument, 
-        decodes it and returns a boolean value.
-
-        :param token: The token that you want to verify
-        :type token: str
-
-        :return: A boolean value.
-        """
-        payload = authentication.decode_jwt(token)
-
-        if payload:
-            return True
-        return False
-
 
 jwt_bearer = JWTBearer()
\ No newline at end of file
@@ -1,6 +1,8 @@
 # Stdlib Imports
-from datetime import datetime, timedelta
-from typing import Dict, Any, Union
+import time
+import uuid
+import hashlib
+from typing import Dict, Any
 
 # FastAPI Imports
 from fastapi import HTTPException
@@ -9,6 +11,8 @@ from fastapi import HTTPException
 import jwt
 
 # Third Party Imports
+from core.cache import LRUCache
+from core.metrics import metrics
 from core.settings import ledger_settings
 
 
@@ -16,6 +20,8 @@ from core.settings import ledger_settings
 JWT_SECRET = ledger_settings.JWT_SECRET_KEY
 JWT_ALGORITHM = ledger_settings.JWT_ALGORITHM
 TOKEN_LIFETIME = ledger_settings.TOKEN_LIFETIME
+REFRESH_TOKEN_LIFETIME = ledger_settings.REFRESH_TOKEN_LIFETIME
+TOKEN_CACHE_SIZE = ledger_settings.TOKEN_CACHE_SIZE
 
 
 class AuthHandler:
@@ -24,6 +30,14 @@ class AuthHandler:
 
     - signing,
     - encoding/decoding of tokens
+
+    Tokens are self-contained: besides the standard `sub`, `iat`, `exp`
+    and `jti` claims they carry the `role` of the user, the user token
+    version (`ver`) they were issued at, and their type (`typ`), either
+    a short lived `access` token or a long lived `refresh` token.
+
+    Verified tokens are cached by digest until they expire, so repeat
+    callers skip the signature check and the claims parsing.
     """
 
     def __init__(
@@ -31,6 +45,8 @@ class AuthHandler:
         secret: str = JWT_SECRET,
         algorithm: str = JWT_ALGORITHM,
         token_lifetime: int = TOKEN_LIFETIME,
+        refresh_token_lifetime: int = REFRESH_TOKEN_LIFETIME,
+        cache_size: int = TOKEN_CACHE_SIZE,
     ):
         """
         This method initializes the class with the secret,
@@ -42,58 +58,109 @@ class AuthHandler:
         :param algorithm: The algorithm used to sign the token
         :type algorithm: str
 
-        :param token_lifetime: The lifetime of the token in seconds
+        :param token_lifetime: The lifetime of the token in minutes
         :type token_lifetime: int
+
+        :param refresh_token_lifetime: The lifetime of the refresh
+            token in minutes
+        :type refresh_token_lifetime: int
+
+        :param cache_size: The number of verified tokens to cache
+        :type cache_size: int
         """
         self.JWT_SECRET = secret
         self.JWT_ALGORITHM = algorithm
         self.TOKEN_LIFETIME = token_lifetime
+        self.REFRESH_TOKEN_LIFETIME = refresh_token_lifetime
+        self.cache = LRUCache(cache_size, ttl=refresh_token_lifetime * 60)
 
-    def sign_jwt(self, user_id: int) -> Dict[str, Any]:
+    def sign_jwt(self, user: Any) -> Dict[str, Any]:
         """
-        This method creates a JWT token with a user_id and expiration date,
-        signs it with a secret key, and returns a response with the token.
+        This method creates an access token and a refresh token for a
+        user, signs them with a secret key, and returns them.
 
-        :param user_id: The user's ID
-        :type user_id: int
+        :param user: The user (or principal) to issue the tokens to
+        :type user: Any
 
-        :return: A dictionary with the token and the expiration time.
+        :return: A dictionary with the access and refresh tokens.
         """
-        payload = {
-            "user_id": user_id,
-            "expires": str(
-                datetime.now() + timedelta(minutes=self.TOKEN_LIFETIME)
+        return {
+            "access_token": self.encode_jwt(
+                user, "access", self.TOKEN_LIFETIME
+            ),
+            "refresh_token": self.encode_jwt(
+                user, "refresh", self.REFRESH_TOKEN_LIFETIME
             ),
+            "token_type": "bearer",
+        }
+
+    def encode_jwt(self, user: Any, token_type: str, lifetime: int) -> str:
+        """
+        This method creates a signed token of the given type for a user.
+
+        :param user: The user (or principal) to issue the token to
+        :type user: Any
+
+        :param token_type: Either `access` or `refresh`
+        :type token_type: str
+
+        :param lifetime: The lifetime of the token in minutes
+        :type lifetime: int
+
+        :return: The token.
+        """
+        issued_at = int(time.time())
+        payload = {
+            "sub": str(user.id),
+            "iat": issued_at,
+            "exp": issued_at + lifetime * 60,
+            "jti": uuid.uuid4().hex,
+            "typ": token_type,
+            "role": "admin" if user.is_admin else "user",
+            "ver": user.token_version,
         }
-        token = jwt.encode(
+        return jwt.encode(
             payload, self.JWT_SECRET, algorithm=self.JWT_ALGORITHM
         )
-        return {"access_token": token}
 
-    def decode_jwt(self, token: str) -> Union[Dict, Exception]:
+    def decode_jwt(self, token: str) -> Dict[str, Any]:
         """
-        This method checks if the token is valid,
-        return the decoded token, otherwise return an empty dictionary.
+        This method checks if the token is valid and not expired,
+        and returns its claims, otherwise raise an error.
 
         :param token: The token to decode
         :type token: str
 
-        :return: A dictionary of the decoded token | error message.
+        :return: A dictionary of the decoded token.
         """
 
+        digest = hashlib.sha256(token.encode()).digest()
+        claims = self.cache.get(digest)
+        if claims is not None:
+            if claims["exp"] > time.time():
+                metrics.increment("auth.token_cache_hits")
+                return claims
+            self.cache.delete(digest)
+
+        metrics.increment("auth.token_cache_misses")
         try:
-            decoded_token = jwt.decode(
-                token, self.JWT_SECRET, algorithms=self.JWT_ALGORITHM
+            claims = jwt.decode(
+                token,
+                self.JWT_SECRET,
+                algorithms=[self.JWT_ALGORITHM],
+                options={
+                    "require": [
+                        "sub", "exp", "iat", "jti", "typ", "role", "ver"
+                    ]
+                },
             )
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(400, {"message": "Token expired."})
         except (jwt.DecodeError, Exception):
             raise HTTPException(403, {"message": "Token invalid."})
 
-        if (
-            datetime.strptime(decoded_token["expires"], "%Y-%m-%d %H:%M:%S.%f")
-            >= datetime.now()
-        ):
-            return decoded_token
-        raise HTTPException(400, {"message": "Token expired."})
+        self.cache.set(digest, claims, ttl=claims["exp"] - time.time())
+        return claims
 
 
 authentication = AuthHandler()
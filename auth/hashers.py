@@ -1,16 +1,226 @@
+# Stdlib Imports
+import os
+import json
+import time
+import tempfile
+import asyncio
+import platform
+import functools
+import multiprocessing
+from typing import Any, Callable, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# FastAPI Imports
+from fastapi import HTTPException
+
+# Own Imports
+from core.metrics import metrics
+from core.settings import ledger_settings
+
 # Third Party Imports
 from passlib.context import CryptContext
 
 
+password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# The cost factor used when there is neither a configured
+# nor a calibrated one (passlib's default)
+DEFAULT_ROUNDS = 12
+
+
+@functools.lru_cache(maxsize=None)
+def rounds_context(rounds: int) -> CryptContext:
+    """
+    This function returns the password context hashing with the given
+    bcrypt cost, where hashes of a lower cost need an update. Hashes of
+    a higher cost (e.g made by a faster host of the fleet) are kept, so
+    hosts calibrated apart do not rehash each other's hashes back and
+    forth.
+    """
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+    )
+
+
+def measure_rounds(budget: float, min_rounds: int, max_rounds: int) -> int:
+    """
+    This function returns the highest bcrypt cost hashing within the
+    latency budget on this host (but no less than `min_rounds`). Every
+    extra round doubles the hashing time, so it is extrapolated from
+    the best of a few hashes at a low cost.
+
+    :param budget: The hashing time to stay within, in seconds
+    :type budget: float
+
+    :param min_rounds: The lowest cost to pick
+    :type min_rounds: int
+
+    :param max_rounds: The highest cost to pick
+    :type max_rounds: int
+
+    :return: The bcrypt cost factor.
+    """
+
+    probe = 8
+    context = rounds_context(probe)
+    elapsed = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        context.hash("calibration")
+        elapsed = min(elapsed, time.perf_counter() - started)
+
+    rounds = probe
+    while rounds < max_rounds and elapsed * 2 ** (rounds + 1 - probe) <= budget:
+        rounds += 1
+    return max(rounds, min_rounds)
+
+
+def host_signature() -> str:
+    """This function identifies the hardware a calibration was made on."""
+
+    return f"{platform.machine()}/{platform.processor()}/{os.cpu_count()}"
+
+
+def load_rounds(path: str) -> Optional[int]:
+    """
+    This function returns the cost calibrated on this host,
+    None if it was calibrated elsewhere (or never).
+    """
+
+    try:
+        with open(path, encoding="utf-8") as calibration:
+            calibration = json.load(calibration)
+    except (OSError, ValueError):
+        return None
+
+    if calibration.get("host") != host_signature():
+        return None
+    return calibration.get("rounds")
+
+
+def save_rounds(path: str, rounds: int) -> None:
+    """
+    This function persists the cost calibrated on this host. The file
+    is replaced at once, as workers starting together calibrate (and
+    save) at the same time.
+    """
+
+    descriptor, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as calibration:
+            json.dump(
+                {"host": host_signature(), "rounds": rounds}, calibration
+            )
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _hash(password: str, rounds: int) -> str:
+    return rounds_context(rounds).hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return password_context.verify(password, hashed_password)
+
+
+def _timed(function: Callable, *args) -> Tuple[float, Any]:
+    """
+    This function runs in a hasher process, and returns the (wall clock)
+    time it started at along with the result, so the caller can tell how
+    long the call was queued for.
+    """
+
+    return time.time(), function(*args)
+
+
 class PasswordHasher:
     """
     Responsible for the following:
 
     - hashing password
     - check/verify hashed password
+
+    bcrypt is slow on purpose, so the async methods run it in a pool of
+    `workers` processes instead of blocking the event loop. At most
+    `max_pending` calls are queued or running at once, past that callers
+    are turned away with a 503 straight away.
+
+    Passwords are hashed with the configured bcrypt cost, or else the
+    one calibrated on this host (see `calibrate`); hashes of a lower
+    cost are reported by `needs_update`.
     """
 
-    password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    def __init__(
+        self,
+        workers: int = ledger_settings.HASHER_WORKERS,
+        max_pending: int = ledger_settings.HASHER_MAX_PENDING,
+        rounds: int = ledger_settings.BCRYPT_ROUNDS,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self._pending = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        self.calibrated = bool(rounds)
+        if not rounds:
+            rounds = load_rounds(ledger_settings.BCRYPT_ROUNDS_FILE)
+            self.calibrated = rounds is not None
+        self.use_rounds(rounds or DEFAULT_ROUNDS)
+
+    def use_rounds(self, rounds: int) -> None:
+        """This method sets the bcrypt cost of the new hashes."""
+
+        self.rounds = rounds
+        self.password_context = rounds_context(rounds)
+        metrics.set_gauge("hasher.bcrypt_rounds", rounds)
+
+    def calibrate(
+        self,
+        budget: float = ledger_settings.BCRYPT_LATENCY_BUDGET,
+        path: str = ledger_settings.BCRYPT_ROUNDS_FILE,
+    ) -> int:
+        """
+        This method picks the bcrypt cost meeting the latency budget on
+        this host, unless a cost is configured or was already calibrated
+        here. The cost is persisted and surfaced in the settings.
+
+        :param budget: The hashing time to stay within, in seconds
+        :type budget: float
+
+        :param path: The file the calibrated cost is persisted to
+        :type path: str
+
+        :return: The bcrypt cost factor.
+        """
+
+        if not self.calibrated:
+            rounds = measure_rounds(
+                budget,
+                ledger_settings.BCRYPT_MIN_ROUNDS,
+                ledger_settings.BCRYPT_MAX_ROUNDS,
+            )
+            save_rounds(path, rounds)
+            self.use_rounds(rounds)
+            self.calibrated = True
+
+        ledger_settings.BCRYPT_ROUNDS = self.rounds
+        return self.rounds
+
+    def needs_update(self, hashed_password: str) -> bool:
+        """
+        This method checks if a hash was made with a lower bcrypt cost
+        than the one in use, and should be redone.
+        """
+        return self.password_context.needs_update(hashed_password)
 
     def hash_password(self, password: str) -> str:
         """
@@ -19,7 +229,7 @@ class PasswordHasher:
 
         :param password: The password to hash
         :type password: str
-        
+
         :return: The hashed password.
         """
         return self.password_context.hash(password)
@@ -38,5 +248,68 @@ class PasswordHasher:
         """
         return self.password_context.verify(password, hashed_password)
 
+    async def async_hash_password(self, password: str) -> str:
+        """
+        This method hashes a password in the hasher pool,
+        see `hash_password`.
+        """
+        return await self._run(_hash, password, self.rounds)
+
+    async def async_check_password(
+        self, password: str, hashed_password: str
+    ) -> bool:
+        """
+        This method checks a password against its hash in the hasher
+        pool, see `check_password`.
+        """
+        return await self._run(_verify, password, hashed_password)
+
+    def close(self) -> None:
+        """This method stops the hasher processes."""
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, function: Callable, *args) -> Any:
+        """
+        This method runs a hashing function in the hasher pool, unless
+        too many calls are already queued.
+        """
+
+        if self._pending >= self.max_pending:
+            metrics.increment("hasher.rejected")
+            raise HTTPException(
+                503, {"message": "Too many requests, try again later!"}
+            )
+
+        if self._executor is None:
+            # spawned, not forked: the server process runs threads
+            self._executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        self._pending += 1
+        metrics.set_gauge("hasher.pending", self._pending)
+        submitted = time.time()
+        try:
+            started, result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _timed, function, *args
+            )
+        except BrokenProcessPool:
+            # a hasher process died, start a new pool on the next call
+            self.close()
+            raise HTTPException(
+                503, {"message": "Too many requests, try again later!"}
+            )
+        finally:
+            self._pending -= 1
+            metrics.set_gauge("hasher.pending", self._pending)
+
+        metrics.observe("hasher.queue_time", max(started - submitted, 0))
+        metrics.observe("hasher.duration", time.time() - started)
+        return result
+
 
-pwd_hasher = PasswordHasher()
\ No newline at end of file
+pwd_hasher = PasswordHasher()
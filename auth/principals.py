@@ -0,0 +1,83 @@
+# Stdlib Imports
+from typing import Optional
+
+# Own Imports
+from core.cache import LRUCache
+from core.metrics import metrics
+from core.settings import ledger_settings
+from orm.users import users_orm
+from auth.revocation import token_versions
+from schemas.user import Principal
+
+
+class Principals:
+    """
+    This service is responsible for serving the authenticated principal
+    of a request (id, flags and token version of the user) without
+    loading the user and its wallets on every request.
+
+    Principals are held in an in-process LRU cache for `ttl` seconds,
+    and dropped as soon as the user is changed through this service.
+    Changes made by another worker are seen once the entry expires.
+    """
+
+    def __init__(
+        self,
+        ttl: float = ledger_settings.PRINCIPAL_CACHE_TTL,
+        cache_size: int = ledger_settings.PRINCIPAL_CACHE_SIZE,
+    ):
+        self.cache = LRUCache(cache_size, ttl)
+
+    async def get(self, user_id: int) -> Optional[Principal]:
+        """
+        This method returns the principal of a user, loading
+        (and caching) it on a cache miss.
+
+        :param user_id: The id of the user
+        :type user_id: int
+
+        :return: The principal, or None if the user does not exist.
+        """
+
+        principal = self.cache.get(user_id)
+        if principal is not None:
+            metrics.increment("principals.cache_hits")
+            return principal
+
+        metrics.increment("principals.cache_misses")
+        principal = await users_orm.get_principal(user_id)
+        if principal is not None:
+            self.cache.set(user_id, principal)
+        return principal
+
+    def invalidate(self, user_id: int) -> None:
+        """This method drops the cached principal of a user."""
+
+        self.cache.delete(user_id)
+
+    async def update(self, user_id: int, **values) -> None:
+        """
+        This method updates the given columns of a user, and drops
+        its cached principal once the change is committed. Changing
+        the role or active status revokes the tokens of the user.
+        """
+
+        version = await users_orm.update(user_id, **values)
+        self.invalidate(user_id)
+        if version is not None:
+            token_versions.revoked(user_id, version)
+
+    async def revoke(self, user_id: int) -> Optional[int]:
+        """
+        This method revokes every token issued to a user so far, and
+        drops its cached principal, holding the old token version.
+
+        :return: The new token version, None if the user does not exist.
+        """
+
+        version = await token_versions.revoke(user_id)
+        self.invalidate(user_id)
+        return version
+
+
+principals = Principals()
@@ -0,0 +1,290 @@
+# Stdlib Imports
+import time
+import asyncio
+import datetime
+from typing import Dict, Optional
+
+# Own Imports
+from core.bloom import BloomFilter
+from core.metrics import metrics
+from core.settings import ledger_settings
+from config.database import session_scope
+from orm.users import users_orm
+from orm.revocations import revoked_tokens_orm
+
+
+class TokenVersions:
+    """
+    This service is responsible for revoking tokens without a database
+    read per request. Every token carries the token version of its user
+    at the time it was issued, and bumping the version revokes them all.
+
+    The versions of the users whose tokens were ever revoked (few of
+    them) are held in memory and reloaded every `refresh_interval`
+    seconds in the background. A revocation is seen straight away by
+    the worker that made it, and by the others on their next reload.
+    """
+
+    def __init__(
+        self, refresh_interval: float = ledger_settings.TOKEN_VERSION_REFRESH
+    ):
+        self.refresh_interval = refresh_interval
+        self._versions: Dict[int, int] = {}
+        self._refreshed_at: Optional[float] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def is_current(self, user_id: int, version: int) -> bool:
+        """
+        This method checks that a token version has not been revoked.
+
+        :param user_id: The id of the user the token was issued to
+        :type user_id: int
+
+        :param version: The token version the token was issued at
+        :type version: int
+
+        :return: True if the token is still valid.
+        """
+
+        if self._refresher is None and (
+            self._refreshed_at is None
+            or time.monotonic() - self._refreshed_at > self.refresh_interval
+        ):
+            # not refreshed in the background, e.g in a command
+            await self.refresh()
+
+        return version >= self._versions.get(user_id, 0)
+
+    async def revoke(self, user_id: int) -> Optional[int]:
+        """
+        This method revokes every token issued to a user so far.
+
+        :param user_id: The id of the user
+        :type user_id: int
+
+        :return: The new token version, None if the user does not exist.
+        """
+
+        version = await users_orm.bump_token_version(user_id)
+        if version is not None:
+            self.revoked(user_id, version)
+        return version
+
+    def revoked(self, user_id: int, version: int) -> None:
+        """
+        This method records a token version bumped by this worker,
+        e.g along with a change of the user's role.
+        """
+
+        self._merge({user_id: version})
+
+    async def refresh(self) -> None:
+        """This method reloads the token versions of the revoked users."""
+
+        self._merge(await users_orm.token_versions())
+        self._refreshed_at = time.monotonic()
+        metrics.set_gauge("auth.token_versions", len(self._versions))
+
+    async def start(self) -> None:
+        """This method starts reloading the versions in the background."""
+
+        if self._refresher is not None:
+            return
+
+        await self.refresh()
+        self._refresher = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self) -> None:
+        """This method stops the background reloads."""
+
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+
+    def _merge(self, versions: Dict[int, int]) -> None:
+        # versions only go up, a reload that raced with a revocation
+        # must not bring back the revoked version
+        for user_id, version in versions.items():
+            if version > self._versions.get(user_id, 0):
+                self._versions[user_id] = version
+
+    async def _refresh_forever(self) -> None:
+        # use a session of its own, not the one of the request
+        # that happened to start the refresher
+        session_scope.set(None)
+
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                metrics.increment("auth.token_versions.refresh_errors")
+
+
+token_versions = TokenVersions()
+
+
+class RevokedTokens:
+    """
+    This service is responsible for revoking single tokens (e.g on
+    logout) without a database read per request.
+
+    The ids (`jti`) of the revoked tokens are held in a Bloom filter:
+    a token missing from it was not revoked, and only a token found in
+    it is looked up in the `revoked_tokens` table. The filter picks up
+    the tokens revoked since its last refresh every `refresh_interval`
+    seconds, and is rebuilt without the expired tokens (which are then
+    purged) every `compact_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        capacity: int = ledger_settings.REVOCATION_FILTER_CAPACITY,
+        error_rate: float = ledger_settings.REVOCATION_FILTER_ERROR_RATE,
+        refresh_interval: float = ledger_settings.REVOCATION_REFRESH,
+        compact_interval: float = ledger_settings.REVOCATION_COMPACT_INTERVAL,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.compact_interval = compact_interval
+        self.filter: Optional[BloomFilter] = None
+        self._refreshed_at: Optional[datetime.datetime] = None
+        self._compacted_at = time.monotonic()
+        self._refresher: Optional[asyncio.Task] = None
+
+    async def is_revoked(self, jti: str) -> bool:
+        """
+        This method checks if a token was revoked.
+
+        :param jti: The id of the token
+        :type jti: str
+
+        :return: True if the token was revoked.
+        """
+
+        if self._refresher is None and self._stale():
+            # not refreshed in the background, e.g in a command
+            await self.refresh()
+
+        if jti not in self.filter:
+            return False
+
+        revoked = await revoked_tokens_orm.exists(jti)
+        metrics.increment(
+            "auth.revocations.filter_hits"
+            if revoked
+            else "auth.revocations.false_positives"
+        )
+        return revoked
+
+    async def revoke(
+        self, jti: str, user_id: int, expires_at: datetime.datetime
+    ) -> bool:
+        """
+        This method revokes a token until it expires.
+
+        :param jti: The id of the token
+        :type jti: str
+
+        :param user_id: The id of the user the token was issued to
+        :type user_id: int
+
+        :param expires_at: The time the token expires at
+        :type expires_at: datetime.datetime
+
+        :return: True if this call revoked the token, False if it was
+        revoked already.
+        """
+
+        revoked = await revoked_tokens_orm.add(jti, user_id, expires_at)
+        if self.filter is not None:
+            self.filter.add(jti)
+        return revoked
+
+    async def refresh(self) -> None:
+        """
+        This method adds the tokens revoked since the last refresh to
+        the filter, or builds the filter if there is none yet.
+        """
+
+        if self.filter is None:
+            await self.rebuild()
+            return
+
+        # revocations committed late (or by a host whose clock is
+        # behind) are picked up again, a token added twice is counted once
+        started = datetime.datetime.now()
+        since = self._refreshed_at - datetime.timedelta(
+            seconds=max(self.refresh_interval * 2, 60)
+        )
+        self.filter.update(await revoked_tokens_orm.list_ids(since))
+        self._refreshed_at = started
+
+        if self.filter.count > self.filter.capacity:
+            # past its capacity the filter answers "maybe" too often
+            await self.rebuild()
+        metrics.set_gauge("auth.revocations.filtered", self.filter.count)
+
+    async def rebuild(self) -> None:
+        """This method builds the filter of the unexpired revoked tokens."""
+
+        started = datetime.datetime.now()
+        revoked = await revoked_tokens_orm.list_ids()
+
+        bloom = BloomFilter(
+            max(self.capacity, len(revoked) * 2), self.error_rate
+        )
+        bloom.update(revoked)
+        self.filter, self._refreshed_at = bloom, started
+        metrics.set_gauge("auth.revocations.filtered", bloom.count)
+
+    async def compact(self) -> int:
+        """
+        This method purges the expired revoked tokens and rebuilds the
+        filter without them, and returns the number of purged tokens.
+        """
+
+        purged = await revoked_tokens_orm.purge_expired()
+        await self.rebuild()
+        self._compacted_at = time.monotonic()
+        return purged
+
+    async def start(self) -> None:
+        """This method starts refreshing the filter in the background."""
+
+        if self._refresher is not None:
+            return
+
+        await self.rebuild()
+        self._refresher = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self) -> None:
+        """This method stops the background refreshes."""
+
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+
+    def _stale(self) -> bool:
+        return self._refreshed_at is None or (
+            datetime.datetime.now() - self._refreshed_at
+        ).total_seconds() > self.refresh_interval
+
+    async def _refresh_forever(self) -> None:
+        # use a session of its own, not the one of the request
+        # that happened to start the refresher
+        session_scope.set(None)
+
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if time.monotonic() - self._compacted_at > self.compact_interval:
+                    await self.compact()
+                else:
+                    await self.refresh()
+            except Exception:
+                metrics.increment("auth.revocations.refresh_errors")
+
+
+revoked_tokens = RevokedTokens()
@@ -1,29 +1,165 @@
 # Stdlib Imports
 import os
+import time
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Optional
 
 # SQLAlchemy Imports
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_scoped_session,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import sessionmaker
 
-# Third Party Imports
-from databases import Database
+# Own Imports
+from core.metrics import metrics
+from core.settings import ledger_settings
 
 
 # SQLALCHEMY_DATABASE_URL = "sqlite:///./ledger.sqlite"
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
+# The non-blocking driver used for every database backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(database_url: str):
+    """
+    This function swaps the driver of a database url
+    for its asyncio counterpart.
+
+    :param database_url: The database url, e.g postgresql://...
+    :type database_url: str
+
+    :return: The database url, e.g postgresql+asyncpg://...
+    """
+
+    url = make_url(database_url)
+    if url.drivername in ASYNC_DRIVERS.values():
+        return url
+
+    return url.set(
+        drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    )
+
+
+class ObservedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Connection pool recording how long sessions wait to check out a
+    connection, and how close the pool is to running out of them.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            metrics.increment("db.pool.timeouts")
+            raise
+        finally:
+            metrics.observe(
+                "db.pool.checkout_wait", time.perf_counter() - started
+            )
+            self._report()
+
+    def _do_return_conn(self, conn):
+        super()._do_return_conn(conn)
+        self._report()
+
+    def _report(self) -> None:
+        """
+        This method publishes the usage of the pool, under the name
+        of its engine (the primary, or a replica).
+        """
+
+        name = self.logging_name or "primary"
+        checked_out = self.checkedout()
+        capacity = self.size() + max(self._max_overflow, 0)
+
+        metrics.set_gauge(f"db.pool.{name}.checked_out", checked_out)
+        metrics.set_gauge(
+            f"db.pool.{name}.saturation",
+            checked_out / capacity if capacity else 1.0,
+        )
+
+
+def pool_options(database_url: str, name: str = "primary") -> dict:
+    """
+    This function returns the connection pool arguments of an engine,
+    as configured in the settings.
+
+    :param database_url: The database url of the engine
+    :type database_url: str
+
+    :param name: The name the pool reports its usage under
+    :type name: str
+
+    :return: The keyword arguments for `create_async_engine`.
+    """
+
+    if ledger_settings.DATABASE_NULL_POOL:
+        # connections can not move between event loops
+        return {"poolclass": NullPool}
+    if make_url(database_url).get_backend_name() == "sqlite":
+        # SQLite files are opened per session, there is nothing to size
+        return {}
+
+    return {
+        "poolclass": ObservedQueuePool,
+        "pool_logging_name": name,
+        "pool_size": ledger_settings.DATABASE_POOL_SIZE,
+        "max_overflow": ledger_settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": ledger_settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": ledger_settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": ledger_settings.DATABASE_POOL_PRE_PING,
+    }
+
+
+def current_scope() -> Any:
+    """
+    This function returns the key of the current database session: the
+    request being served, or else the running asyncio task.
+    """
+
+    return session_scope.get() or asyncio.current_task()
+
+
+# Set per request by `DatabaseSessionMiddleware`, so the tasks
+# a request spawns share its database session.
+session_scope: ContextVar[Optional[object]] = ContextVar(
+    "session_scope", default=None
+)
+
+# The blocking engine is only used by alembic.
 DB_ENGINE = create_engine(
     SQLALCHEMY_DATABASE_URL
 )  # connect_args={"check_same_thread": False} is needed only for SQLite.
 # It's not needed for other databases.
 
+ASYNC_DB_ENGINE = create_async_engine(
+    async_database_url(SQLALCHEMY_DATABASE_URL),
+    **pool_options(SQLALCHEMY_DATABASE_URL),
+)
+
 # Construct a session maker
-session_factory = sessionmaker(autocommit=False, autoflush=False, bind=DB_ENGINE)
-SessionLocal = scoped_session(session_factory)
+session_factory = sessionmaker(
+    ASYNC_DB_ENGINE,
+    class_=AsyncSession,
+    autoflush=False,
+    # attributes can not be lazy loaded once the transaction is over
+    expire_on_commit=False,
+)
+SessionLocal = async_scoped_session(session_factory, scopefunc=current_scope)
 
 # Construct a base class for declarative class definitions.
 Base = declarative_base()
-
-# Construct a db connector to connect, shutdown database
-db_connect = Database(SQLALCHEMY_DATABASE_URL)
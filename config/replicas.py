@@ -0,0 +1,191 @@
+# Stdlib Imports
+import random
+import asyncio
+from contextvars import ContextVar
+from typing import List, Optional
+
+# SQLAlchemy Imports
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+# Own Imports
+from core.cache import LRUCache
+from core.metrics import metrics
+from core.settings import ledger_settings
+from config.database import async_database_url, pool_options
+
+
+# The id of the user a request is served for, set on authentication.
+request_user: ContextVar[Optional[int]] = ContextVar(
+    "request_user", default=None
+)
+
+# Set while loading a value that is cached beyond the request, e.g a
+# balance: a lagging replica would have it served stale until expired.
+read_primary: ContextVar[bool] = ContextVar("read_primary", default=False)
+
+# Seconds a PostgreSQL standby is behind its primary; a standby that
+# replayed everything it received is not lagging, however old the last
+# transaction is.
+REPLICA_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()"
+    " THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+    " END"
+)
+
+
+class Replica:
+    """A read replica and its replication health."""
+
+    def __init__(self, name: str, database_url: str):
+        self.name = name
+        self.engine: AsyncEngine = create_async_engine(
+            async_database_url(database_url),
+            **pool_options(database_url, name),
+        )
+        self.lag: Optional[float] = None
+        # out of rotation until its lag has been measured
+        self.healthy = False
+
+
+class ReplicaRouter:
+    """
+    This service is responsible for sending read-only queries to the
+    read replicas, while everything that locks or writes stays on the
+    primary. A session reads from the primary once it has written, and
+    so does a user for `read_your_writes` seconds after their last write
+    (the `max_writers` most recent writers are remembered).
+
+    Replica lag is measured every `check_interval` seconds, a replica
+    lagging more than `max_lag` seconds (or unreachable) is taken out of
+    rotation until it catches up.
+    """
+
+    def __init__(
+        self,
+        database_urls: List[str],
+        read_your_writes: float = ledger_settings.READ_YOUR_WRITES_WINDOW,
+        max_lag: float = ledger_settings.REPLICA_MAX_LAG,
+        check_interval: float = ledger_settings.REPLICA_LAG_CHECK_INTERVAL,
+        max_writers: int = ledger_settings.READ_YOUR_WRITES_USERS,
+    ):
+        self.replicas = [
+            Replica(f"replica{index}", database_url)
+            for index, database_url in enumerate(database_urls)
+        ]
+        self.read_your_writes = read_your_writes
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        # the users who wrote within the window, expired by the cache
+        self._writes = LRUCache(max_writers, read_your_writes)
+        self._checker: Optional[asyncio.Task] = None
+
+    def read_bind(self, session: Session) -> Optional[dict]:
+        """
+        This method picks the database a read-only query runs on.
+
+        :param session: The (sync) session running the query
+        :type session: Session
+
+        :return: The bind arguments of a replica, or None for the primary.
+        """
+
+        if session.info.get("wrote") or read_primary.get():
+            return None
+
+        user_id = request_user.get()
+        if user_id is not None and self._writes.get(user_id):
+            return None
+
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+
+        metrics.increment("db.replicas.reads")
+        return {"bind": random.choice(healthy).engine.sync_engine}
+
+    def record_write(self, user_id: int) -> None:
+        """This method starts the read-your-writes window of a user."""
+
+        self._writes.set(user_id, True)
+
+    async def check_lag(self) -> None:
+        """This method measures the lag of the replicas."""
+
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as connection:
+                    if connection.dialect.name == "postgresql":
+                        replica.lag = float(
+                            await connection.scalar(REPLICA_LAG) or 0
+                        )
+                    else:
+                        replica.lag = 0.0
+            except Exception:
+                replica.lag = None
+
+            replica.healthy = (
+                replica.lag is not None and replica.lag <= self.max_lag
+            )
+            metrics.set_gauge(
+                f"db.replicas.{replica.name}.lag",
+                -1 if replica.lag is None else replica.lag,
+            )
+
+        metrics.set_gauge(
+            "db.replicas.healthy",
+            sum(replica.healthy for replica in self.replicas),
+        )
+
+    async def start(self) -> None:
+        """This method starts measuring the replica lag in the background."""
+
+        if not self.replicas or self._checker is not None:
+            return
+
+        await self.check_lag()
+        self._checker = asyncio.create_task(self._check_forever())
+
+    async def stop(self) -> None:
+        """This method stops the lag checks and closes the replicas."""
+
+        if self._checker is not None:
+            self._checker.cancel()
+            self._checker = None
+
+        for replica in self.replicas:
+            replica.healthy = False
+            await replica.engine.dispose()
+
+    async def _check_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_lag()
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement(state) -> None:
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session: Session, flush_context) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _track_commit(session: Session) -> None:
+    user_id = request_user.get()
+    if session.info.get("wrote") and user_id is not None:
+        replica_router.record_write(user_id)
+
+
+replica_router = ReplicaRouter(
+    [
+        database_url.strip()
+        for database_url in ledger_settings.DATABASE_REPLICA_URLS.split(",")
+        if database_url.strip()
+    ]
+)
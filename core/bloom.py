@@ -0,0 +1,55 @@
+# Stdlib Imports
+import math
+import hashlib
+from typing import Iterable, Iterator
+
+
+class BloomFilter:
+    """
+    Compact set of strings answering "maybe present" or "definitely
+    absent". Sized for `capacity` keys at a false positive rate of
+    `error_rate`; keys can be added but never removed.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = math.ceil(
+            -self.capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add(self, key: str) -> None:
+        """
+        This method adds a key to the filter. Keys already present are
+        not counted again, so `count` tells the distinct keys held.
+        """
+
+        if key in self:
+            return
+
+        for index in self._indexes(key):
+            self._bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+    def update(self, keys: Iterable[str]) -> None:
+        """This method adds many keys to the filter."""
+
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[index >> 3] & (1 << (index & 7))
+            for index in self._indexes(key)
+        )
+
+    def _indexes(self, key: str) -> Iterator[int]:
+        # double hashing: k indexes out of two 64 bit hashes
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
@@ -0,0 +1,204 @@
+# Stdlib Imports
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Bounded in-process cache. The least recently used entry is evicted
+    once `maxsize` entries are held, and every entry expires `ttl`
+    seconds after it was set (unless a ttl is given for the entry).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        This method returns the value cached for the key, or the default
+        if there is none or it has expired.
+
+        :param key: The cache key
+        :type key: Hashable
+
+        :param default: The value to return on a cache miss
+        :type default: Any
+
+        :return: The cached value | default.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        This method caches a value for the key.
+
+        :param key: The cache key
+        :type key: Hashable
+
+        :param value: The value to cache
+        :type value: Any
+
+        :param ttl: Seconds until the entry expires, defaults to self.ttl
+        :type ttl: float
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """This method removes the entry of the key, if any."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """This method removes every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LocalStore:
+    """
+    In-process stand-in for the redis client of `SharedCache`, for
+    development and tests. Only the commands the cache uses exist.
+    """
+
+    def __init__(self, maxsize: int):
+        self._entries = LRUCache(maxsize, ttl=float("inf"))
+
+    @property
+    def evictions(self) -> int:
+        return self._entries.evictions
+
+    async def get(self, name: str) -> Optional[bytes]:
+        return self._entries.get(name)
+
+    async def set(
+        self,
+        name: str,
+        value: Any,
+        ex: Optional[int] = None,
+        nx: bool = False,
+    ) -> Optional[bool]:
+        if nx and self._entries.get(name) is not None:
+            return None
+
+        self._entries.set(
+            name,
+            str(value).encode(),
+            ttl=float("inf") if ex is None else ex,
+        )
+        return True
+
+    async def delete(self, *names: str) -> None:
+        for name in names:
+            self._entries.delete(name)
+
+
+# Held in place of an invalidated entry, see `SharedCache.invalidate`
+TOMBSTONE = "-"
+
+
+class SharedCache:
+    """
+    Cache of integers held in a store shared by every worker (redis),
+    so an invalidation in one worker is seen by all of them.
+    """
+
+    def __init__(self, client: Any, ttl: float, prefix: str = ""):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def evictions(self) -> int:
+        # redis evicts on its own, see its `evicted_keys` stat
+        return getattr(self.client, "evictions", 0)
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        """This method returns the integer cached for the key."""
+
+        value = await self.client.get(self.prefix + key)
+        if value is None or value == TOMBSTONE.encode():
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return int(value)
+
+    async def set(self, key: str, value: int, ttl: Optional[float] = None):
+        """This method caches an integer for the key."""
+
+        await self.client.set(
+            self.prefix + key,
+            value,
+            ex=max(1, int(self.ttl if ttl is None else ttl)),
+        )
+
+    async def add(
+        self, key: str, value: int, ttl: Optional[float] = None
+    ) -> bool:
+        """
+        This method caches an integer for the key, unless the key
+        is cached or was invalidated recently.
+
+        :return: Whether the integer was cached.
+        """
+
+        added = await self.client.set(
+            self.prefix + key,
+            value,
+            ex=max(1, int(self.ttl if ttl is None else ttl)),
+            nx=True,
+        )
+        return bool(added)
+
+    async def delete(self, *keys: str) -> None:
+        """This method removes the entries of the keys, if any."""
+
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+    async def invalidate(self, *keys: str, hold: float) -> None:
+        """
+        This method removes the entries of the keys, and keeps them from
+        being `add`ed again for `hold` seconds: a value read before the
+        invalidation, by any worker, can not be put back.
+        """
+
+        for key in keys:
+            await self.client.set(
+                self.prefix + key, TOMBSTONE, ex=max(1, int(hold))
+            )
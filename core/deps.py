@@ -1,43 +1,48 @@
 # FastAPI Imports
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 
 # Own Imports Imports
-from models.user import User
-from orm.users import users_orm
+from schemas.user import Principal
 from auth.auth_bearer import jwt_bearer
+from auth.revocation import revoked_tokens, token_versions
+from config.replicas import request_user
 
-# 3rd Party Imports
-import jwt
-from decouple import config
 
-
-async def get_current_user(token: str = Depends(jwt_bearer)) -> User:
+async def get_current_user(
+    request: Request, token: str = Depends(jwt_bearer)
+) -> Principal:
     """
-    This function takes a JWT token,
-    and returns the user that the token belongs to.
+    This function takes a JWT token, and returns the principal
+    (id and flags, no wallets) of the user that the token belongs to,
+    as carried by the token itself.
+
+    :param request: The request, holding the claims of the verified token
+    :type request: Request
 
     :param token: str = Depends(JWTBearer())
     :type token: str
 
-    :return: The user object.
+    :return: The principal of the user.
     """
 
-    try:
-        payload = jwt.decode(
-            token, config("JWT_SECRET"), algorithms=[config("JWT_ALGORITHM")]
-        )
-    except (jwt.PyJWTError, Exception):
-        raise HTTPException(403, {"message": "Could not validate token."})
+    claims = request.state.claims
+    if claims["typ"] != "access":
+        raise HTTPException(403, {"message": "Token invalid."})
+
+    # route the reads and writes of the request as this user's
+    user_id = int(claims["sub"])
+    request_user.set(user_id)
 
-    user = await users_orm.get(payload["user_id"])
-    if not user:
-        raise HTTPException(404, {"message": "User does not exist!"})
-    return user
+    if not await token_versions.is_current(
+        user_id, claims["ver"]
+    ) or await revoked_tokens.is_revoked(claims["jti"]):
+        raise HTTPException(401, {"message": "Token has been revoked!"})
+    return Principal.from_claims(claims)
 
 
 async def get_admin_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     """
     This function returns an admin user based on the provided token;
     otherwise, raise an authorized exception.
@@ -0,0 +1,86 @@
+# Stdlib Imports
+import threading
+from collections import defaultdict
+from typing import Dict, Union
+
+
+Number = Union[int, float]
+
+
+class Metrics:
+    """
+    In-process registry of the service metrics. It keeps:
+
+    - counters, which only ever go up
+    - gauges, which hold the last value set
+    - timings, which summarise observed values (count, sum, max)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Number] = defaultdict(int)
+        self._gauges: Dict[str, Number] = {}
+        self._timings: Dict[str, Dict[str, Number]] = {}
+
+    def increment(self, name: str, value: Number = 1) -> None:
+        """
+        This method increments the counter with the given name.
+
+        :param name: The name of the counter
+        :type name: str
+
+        :param value: The amount to increment the counter by
+        :type value: Number
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: Number) -> None:
+        """
+        This method sets the gauge with the given name to a value.
+
+        :param name: The name of the gauge
+        :type name: str
+
+        :param value: The current value of the gauge
+        :type value: Number
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: Number) -> None:
+        """
+        This method records an observation, e.g a duration in seconds.
+
+        :param name: The name of the timing
+        :type name: str
+
+        :param value: The observed value
+        :type value: Number
+        """
+        with self._lock:
+            timing = self._timings.setdefault(
+                name, {"count": 0, "sum": 0, "max": 0}
+            )
+            timing["count"] += 1
+            timing["sum"] += value
+            timing["max"] = max(timing["max"], value)
+
+    def snapshot(self) -> dict:
+        """
+        This method returns a copy of every metric recorded so far.
+
+        :return: A dictionary of the counters, gauges and timings.
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": {
+                    name: dict(timing)
+                    for name, timing in self._timings.items()
+                },
+            }
+
+
+metrics = Metrics()
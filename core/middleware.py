@@ -0,0 +1,25 @@
+# Own Imports
+from orm.base import orm_session
+from config.database import session_scope
+
+
+class DatabaseSessionMiddleware:
+    """
+    ASGI middleware giving every request its own database session,
+    which is closed (and its connection released) once the request
+    has been answered.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        token = session_scope.set(object())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await orm_session.remove()
+            session_scope.reset(token)
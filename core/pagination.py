@@ -0,0 +1,128 @@
+# Stdlib Imports
+import base64
+import binascii
+import datetime
+from typing import Any, Callable, Optional, Sequence, Tuple
+
+# FastAPI Imports
+from fastapi import HTTPException, Response
+
+
+# The response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    This function returns the opaque cursor of the page
+    that starts after the given id.
+
+    :param last_id: The id of the last row of the current page
+    :type last_id: int
+
+    :return: An url safe cursor token.
+    """
+
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode()
+
+
+def encode_time_cursor(created_at: datetime.datetime, last_id: int) -> str:
+    """
+    This function returns the opaque cursor of the page that starts
+    after the given (creation time, id) pair, for listings ordered by
+    creation time.
+
+    :param created_at: The creation time of the last row of the page
+    :type created_at: datetime.datetime
+
+    :param last_id: The id of the last row of the page
+    :type last_id: int
+
+    :return: An url safe cursor token.
+    """
+
+    return base64.urlsafe_b64encode(
+        f"at:{created_at.isoformat()}|{last_id}".encode()
+    ).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """
+    This function returns the id a cursor token starts after.
+
+    :param cursor: The cursor token sent by the client
+    :type cursor: Optional[str]
+
+    :return: The last seen id, or None when there is no cursor.
+    """
+
+    if not cursor:
+        return None
+
+    try:
+        return int(_decode(cursor, "id"))
+    except ValueError:
+        raise HTTPException(400, {"message": "Invalid cursor!"})
+
+
+def decode_time_cursor(
+    cursor: Optional[str],
+) -> Optional[Tuple[datetime.datetime, int]]:
+    """
+    This function returns the (creation time, id) pair
+    a cursor token starts after.
+
+    :param cursor: The cursor token sent by the client
+    :type cursor: Optional[str]
+
+    :return: The last seen pair, or None when there is no cursor.
+    """
+
+    if not cursor:
+        return None
+
+    try:
+        created_at, _, last_id = _decode(cursor, "at").rpartition("|")
+        return datetime.datetime.fromisoformat(created_at), int(last_id)
+    except ValueError:
+        raise HTTPException(400, {"message": "Invalid cursor!"})
+
+
+def _decode(cursor: str, prefix: str) -> str:
+    try:
+        kind, _, value = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().partition(":")
+        )
+    except (binascii.Error, UnicodeDecodeError):
+        raise HTTPException(400, {"message": "Invalid cursor!"})
+
+    if kind != prefix:
+        raise HTTPException(400, {"message": "Invalid cursor!"})
+    return value
+
+
+def set_next_cursor(
+    response: Response,
+    rows: Sequence,
+    limit: int,
+    cursor: Callable[[Any], str] = lambda row: encode_cursor(row.id),
+) -> None:
+    """
+    This function sets the cursor of the next page on a response,
+    unless the page is the last one.
+
+    :param response: The response of the listing
+    :type response: Response
+
+    :param rows: The rows of the page, ordered by id
+    :type rows: Sequence
+
+    :param limit: The page size that was asked for
+    :type limit: int
+
+    :param cursor: Returns the cursor of the page after a row
+    :type cursor: Callable[[Any], str]
+    """
+
+    if rows and len(rows) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = cursor(rows[-1])
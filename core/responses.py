@@ -0,0 +1,38 @@
+# Stdlib Imports
+from typing import AsyncIterator, Iterable, Type
+
+# Pydantic Imports
+from pydantic import BaseModel
+
+# FastAPI Imports
+from fastapi.responses import StreamingResponse
+
+
+async def json_array(
+    rows: Iterable, schema: Type[BaseModel]
+) -> AsyncIterator[str]:
+    """
+    This function serializes rows to a JSON array one row at a time,
+    so the response is sent as it is serialized.
+
+    :param rows: The ORM objects to serialize
+    :type rows: Iterable
+
+    :param schema: The (orm_mode) schema to serialize them with
+    :type schema: Type[BaseModel]
+    """
+
+    separator = ""
+    yield "["
+    for row in rows:
+        yield separator + schema.from_orm(row).json()
+        separator = ","
+    yield "]"
+
+
+def stream_json(rows: Iterable, schema: Type[BaseModel]) -> StreamingResponse:
+    """This function returns a streamed JSON array response of rows."""
+
+    return StreamingResponse(
+        json_array(rows, schema), media_type="application/json"
+    )
@@ -11,8 +11,177 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str = config("JWT_SECRET", cast=str)
     JWT_ALGORITHM: str = config("JWT_ALGORITHM", cast=str)
     TOKEN_LIFETIME: int = config("TOKEN_LIFETIME", cast=int)
+    # Lifetime of the refresh tokens, in minutes (a week)
+    REFRESH_TOKEN_LIFETIME: int = config(
+        "REFRESH_TOKEN_LIFETIME", default=10080, cast=int
+    )
     USE_TEST_DB: bool = config("USE_TEST_DB", cast=bool)
 
+    # Open a new connection per session instead of pooling them, for
+    # processes that run more than one event loop (e.g the test client).
+    DATABASE_NULL_POOL: bool = config(
+        "DATABASE_NULL_POOL", default=False, cast=bool
+    )
+
+    # Connection pool of every worker (timeout and recycle in seconds)
+    DATABASE_POOL_SIZE: int = config(
+        "DATABASE_POOL_SIZE", default=5, cast=int
+    )
+    DATABASE_MAX_OVERFLOW: int = config(
+        "DATABASE_MAX_OVERFLOW", default=10, cast=int
+    )
+    DATABASE_POOL_TIMEOUT: float = config(
+        "DATABASE_POOL_TIMEOUT", default=30, cast=float
+    )
+    DATABASE_POOL_RECYCLE: int = config(
+        "DATABASE_POOL_RECYCLE", default=1800, cast=int
+    )
+    DATABASE_POOL_PRE_PING: bool = config(
+        "DATABASE_POOL_PRE_PING", default=True, cast=bool
+    )
+
+    # Comma separated urls of the read replicas. After a write, a user
+    # reads from the primary for READ_YOUR_WRITES_WINDOW seconds (for up
+    # to READ_YOUR_WRITES_USERS recent writers), and a replica lagging
+    # more than REPLICA_MAX_LAG seconds gets no reads.
+    DATABASE_REPLICA_URLS: str = config("DATABASE_REPLICA_URLS", default="")
+    READ_YOUR_WRITES_WINDOW: float = config(
+        "READ_YOUR_WRITES_WINDOW", default=5, cast=float
+    )
+    READ_YOUR_WRITES_USERS: int = config(
+        "READ_YOUR_WRITES_USERS", default=100000, cast=int
+    )
+    REPLICA_MAX_LAG: float = config("REPLICA_MAX_LAG", default=1, cast=float)
+    REPLICA_LAG_CHECK_INTERVAL: float = config(
+        "REPLICA_LAG_CHECK_INTERVAL", default=5, cast=float
+    )
+
+    # Transfers that hit a deadlock or serialization failure are retried
+    # with a jittered exponential backoff (delays in seconds).
+    TRANSFER_MAX_RETRIES: int = config(
+        "TRANSFER_MAX_RETRIES", default=5, cast=int
+    )
+    TRANSFER_RETRY_BASE_DELAY: float = config(
+        "TRANSFER_RETRY_BASE_DELAY", default=0.01, cast=float
+    )
+    TRANSFER_RETRY_MAX_DELAY: float = config(
+        "TRANSFER_RETRY_MAX_DELAY", default=0.5, cast=float
+    )
+    TRANSFER_BATCH_MAX_ITEMS: int = config(
+        "TRANSFER_BATCH_MAX_ITEMS", default=1000, cast=int
+    )
+
+    # Processes hashing passwords (0 for one per core), and the number of
+    # hashing calls that can be queued before callers get a 503
+    HASHER_WORKERS: int = config("HASHER_WORKERS", default=0, cast=int)
+    HASHER_MAX_PENDING: int = config(
+        "HASHER_MAX_PENDING", default=64, cast=int
+    )
+
+    # bcrypt cost factor of the password hashes. 0 picks the highest cost
+    # hashing within BCRYPT_LATENCY_BUDGET seconds on this host, measured
+    # at startup and persisted to BCRYPT_ROUNDS_FILE; set to the chosen
+    # cost once calibrated.
+    BCRYPT_ROUNDS: int = config("BCRYPT_ROUNDS", default=0, cast=int)
+    BCRYPT_LATENCY_BUDGET: float = config(
+        "BCRYPT_LATENCY_BUDGET", default=0.25, cast=float
+    )
+    BCRYPT_MIN_ROUNDS: int = config("BCRYPT_MIN_ROUNDS", default=10, cast=int)
+    BCRYPT_MAX_ROUNDS: int = config("BCRYPT_MAX_ROUNDS", default=16, cast=int)
+    BCRYPT_ROUNDS_FILE: str = config(
+        "BCRYPT_ROUNDS_FILE", default=".bcrypt-rounds.json"
+    )
+
+    # Verified tokens are cached (until they expire), at most this many
+    TOKEN_CACHE_SIZE: int = config("TOKEN_CACHE_SIZE", default=10000, cast=int)
+
+    # Seconds between reloads of the token versions of the users
+    # whose tokens were revoked
+    TOKEN_VERSION_REFRESH: float = config(
+        "TOKEN_VERSION_REFRESH", default=5, cast=float
+    )
+
+    # The ids of the revoked tokens are held in a Bloom filter sized for
+    # this many tokens at this false positive rate, picking up the new
+    # revocations every REVOCATION_REFRESH seconds and dropping the
+    # expired ones every REVOCATION_COMPACT_INTERVAL seconds
+    REVOCATION_FILTER_CAPACITY: int = config(
+        "REVOCATION_FILTER_CAPACITY", default=100000, cast=int
+    )
+    REVOCATION_FILTER_ERROR_RATE: float = config(
+        "REVOCATION_FILTER_ERROR_RATE", default=0.001, cast=float
+    )
+    REVOCATION_REFRESH: float = config(
+        "REVOCATION_REFRESH", default=5, cast=float
+    )
+    REVOCATION_COMPACT_INTERVAL: float = config(
+        "REVOCATION_COMPACT_INTERVAL", default=3600, cast=float
+    )
+
+    # The authenticated principals (id, flags, token version) are cached
+    # in-process for this many seconds, at most this many users
+    PRINCIPAL_CACHE_TTL: float = config(
+        "PRINCIPAL_CACHE_TTL", default=60, cast=float
+    )
+    PRINCIPAL_CACHE_SIZE: int = config(
+        "PRINCIPAL_CACHE_SIZE", default=10000, cast=int
+    )
+
+    # Maximum number of wallets a user can have
+    WALLET_LIMIT: int = config("WALLET_LIMIT", default=10, cast=int)
+
+    # Number of rows applied per transaction by the bulk deposit import
+    IMPORT_CHUNK_SIZE: int = config(
+        "IMPORT_CHUNK_SIZE", default=1000, cast=int
+    )
+    # Number of rows fetched per round trip by the streaming exports
+    EXPORT_BATCH_SIZE: int = config(
+        "EXPORT_BATCH_SIZE", default=1000, cast=int
+    )
+
+    # Idempotency keys are kept for a day (in seconds), the most recently
+    # used ones are also cached in-process.
+    IDEMPOTENCY_KEY_TTL: int = config(
+        "IDEMPOTENCY_KEY_TTL", default=86400, cast=int
+    )
+    IDEMPOTENCY_CACHE_SIZE: int = config(
+        "IDEMPOTENCY_CACHE_SIZE", default=10000, cast=int
+    )
+    # "direct" applies every deposit in its own transaction, "coalesced"
+    # group commits the deposits queued within a few milliseconds
+    DEPOSIT_MODE: str = config("DEPOSIT_MODE", default="direct")
+    DEPOSIT_COALESCE_MAX_BATCH: int = config(
+        "DEPOSIT_COALESCE_MAX_BATCH", default=500, cast=int
+    )
+    DEPOSIT_COALESCE_MAX_DELAY: float = config(
+        "DEPOSIT_COALESCE_MAX_DELAY", default=0.005, cast=float
+    )
+    # "memory" caches balances in-process, "shared" in redis at
+    # BALANCE_CACHE_URL (or an in-process stand-in when it is not set).
+    # "memory" is only allowed with a single worker (WEB_CONCURRENCY),
+    # and invalidated balances are not cached again (by any worker) for
+    # BALANCE_CACHE_INVALIDATION_HOLD seconds.
+    BALANCE_CACHE_BACKEND: str = config(
+        "BALANCE_CACHE_BACKEND", default="memory"
+    )
+    WEB_CONCURRENCY: int = config("WEB_CONCURRENCY", default=1, cast=int)
+    BALANCE_CACHE_INVALIDATION_HOLD: float = config(
+        "BALANCE_CACHE_INVALIDATION_HOLD", default=2, cast=float
+    )
+    BALANCE_CACHE_URL: str = config("BALANCE_CACHE_URL", default="")
+    BALANCE_CACHE_TTL: float = config(
+        "BALANCE_CACHE_TTL", default=30, cast=float
+    )
+    BALANCE_CACHE_SIZE: int = config(
+        "BALANCE_CACHE_SIZE", default=100000, cast=int
+    )
+    WALLET_MAX_STRIPES: int = config(
+        "WALLET_MAX_STRIPES", default=64, cast=int
+    )
+    STRIPE_REGISTRY_REFRESH: float = config(
+        "STRIPE_REGISTRY_REFRESH", default=30, cast=float
+    )
+
     TITLE: str = "Ledger System"
     DESCRIPTION: str = "A fintech backend ledger system built with FastAPI."
     CONTACT: dict = {
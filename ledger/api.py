@@ -1,21 +1,37 @@
+# Stdlib Imports
+import datetime
+from typing import List, Optional
+
 # FastAPI Imports
-from fastapi import HTTPException, Depends
+from fastapi import HTTPException, Depends, Header, Query, Request, Response
 
 # Own Imports
 from ledger.router import router
 from core.deps import get_current_user
-from models.user import User as UserModel
+from core.pagination import (
+    decode_cursor,
+    decode_time_cursor,
+    encode_time_cursor,
+    set_next_cursor,
+)
+from core.settings import ledger_settings
+from schemas.user import Principal
+from models.ledger import TransactionType
 from ledger.services.operations import ledger_operations
+from ledger.services.idempotency import idempotent_requests
 from ledger.services.functions import (
     get_all_wallets_by_user,
+    get_wallet_transactions,
     create_wallet as create_user_wallet,
 )
 from schemas.ledger import (
+    TransferResult,
     Wallet,
     Wallet2UserWalletTransfer,
     Wallet2WalletTransfer,
     WalletCreate,
     WalletDeposit,
+    WalletTransaction,
     WalletWithdraw,
 )
 
@@ -23,7 +39,7 @@ from schemas.ledger import (
 @router.post("/wallets/", response_model=Wallet)
 async def create_wallet(
     wallet: WalletCreate,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     if current_user.id != wallet.user:
         raise HTTPException(
@@ -36,15 +52,22 @@ async def create_wallet(
 
 @router.get("/wallets/", response_model=list[Wallet])
 async def get_wallets(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    current_user: UserModel = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
 ):
+    """
+    List the wallets of the current user. Pass the `X-Next-Cursor`
+    header of a page as `cursor` to get the next one.
+    """
 
     if current_user:
         db_wallets = await get_all_wallets_by_user(
-            skip, limit, current_user.id
+            skip, limit, current_user.id, decode_cursor(cursor)
         )
+        set_next_cursor(response, db_wallets, limit)
         return db_wallets
 
     raise HTTPException(
@@ -52,10 +75,50 @@ async def get_wallets(
     )
 
 
+@router.get(
+    "/wallets/{wallet_id}/transactions/",
+    response_model=list[WalletTransaction],
+)
+async def get_transactions(
+    wallet_id: int,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    start: Optional[datetime.datetime] = Query(None, alias="from"),
+    end: Optional[datetime.datetime] = Query(None, alias="to"),
+    type: Optional[List[TransactionType]] = Query(None),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    List the transactions of a wallet, newest first, created in
+    [`from`, `to`) and of the given `type`s. Pass the `X-Next-Cursor`
+    header of a page as `cursor` to get the next one.
+    """
+
+    entries = await get_wallet_transactions(
+        current_user,
+        wallet_id,
+        limit,
+        decode_time_cursor(cursor),
+        start,
+        end,
+        type,
+    )
+    set_next_cursor(
+        response,
+        entries,
+        limit,
+        lambda entry: encode_time_cursor(entry.created_at, entry.id),
+    )
+    return entries
+
+
 @router.post("/deposit/")
 async def deposit_money(
     deposit: WalletDeposit,
-    current_user: UserModel = Depends(get_current_user),
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_user),
 ) -> dict:
 
     if current_user.id != deposit.user:
@@ -63,14 +126,28 @@ async def deposit_money(
             401, {"message": "Unauthorized to perform this action!"}
         )
 
-    await ledger_operations.deposit_money_to_wallet(deposit)
-    return {"message": f"NGN{deposit.amount} deposit successful!"}
+    response = {"message": f"NGN{deposit.amount} deposit successful!"}
+
+    async def deposit_money_to_wallet() -> dict:
+        await ledger_operations.deposit_money_to_wallet(deposit)
+        return response
+
+    return await idempotent_requests.run(
+        current_user.id,
+        idempotency_key,
+        request.url.path,
+        deposit,
+        deposit_money_to_wallet,
+        response,
+    )
 
 
 @router.post("/withdraw/")
 async def withdraw_money(
     withdraw: WalletWithdraw,
-    current_user: UserModel = Depends(get_current_user),
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_user),
 ) -> dict:
 
     if current_user.id != withdraw.user:
@@ -78,14 +155,28 @@ async def withdraw_money(
             401, {"message": "Unauthorized to perform this action!"}
         )
 
-    await ledger_operations.withdraw_money_from_wallet(withdraw)
-    return {"message": f"NGN{withdraw.amount} withdrawn successful!"}
+    response = {"message": f"NGN{withdraw.amount} withdrawn successful!"}
+
+    async def withdraw_money_from_wallet() -> dict:
+        await ledger_operations.withdraw_money_from_wallet(withdraw)
+        return response
+
+    return await idempotent_requests.run(
+        current_user.id,
+        idempotency_key,
+        request.url.path,
+        withdraw,
+        withdraw_money_from_wallet,
+        response,
+    )
 
 
 @router.post("/transfer/wallet-to-wallet/")
 async def wallet_to_wallet_transfer(
     withdraw: Wallet2WalletTransfer,
-    current_user: UserModel = Depends(get_current_user),
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_user),
 ) -> dict:
 
     if current_user.id != withdraw.user:
@@ -93,17 +184,31 @@ async def wallet_to_wallet_transfer(
             401, {"message": "Unauthorized to perform this action!"}
         )
 
-    await ledger_operations.withdraw_from_to_wallet_transfer(withdraw)
-    return {
+    response = {
         "message": f"NGN{withdraw.amount} was transfered from \
             W#{withdraw.wallet_from} wallet to W#{withdraw.wallet_to} wallet!"
     }
 
+    async def withdraw_from_to_wallet_transfer() -> dict:
+        await ledger_operations.withdraw_from_to_wallet_transfer(withdraw)
+        return response
+
+    return await idempotent_requests.run(
+        current_user.id,
+        idempotency_key,
+        request.url.path,
+        withdraw,
+        withdraw_from_to_wallet_transfer,
+        response,
+    )
+
 
 @router.post("/transfer/wallet-to-user/")
 async def wallet_to_user_transfer(
     withdraw: Wallet2UserWalletTransfer,
-    current_user: UserModel = Depends(get_current_user),
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_user),
 ) -> dict:
 
     if current_user.id != withdraw.user:
@@ -111,16 +216,62 @@ async def wallet_to_user_transfer(
             401, {"message": "Unauthorized to perform this action!"}
         )
 
-    await ledger_operations.withdraw_from_to_user_wallet_transfer(withdraw)
-    return {
+    response = {
         "message": f"Transferred NGN{withdraw.amount} \
             to U#{withdraw.user_to} W#{withdraw.wallet_to} wallet."
     }
 
+    async def withdraw_from_to_user_wallet_transfer() -> dict:
+        await ledger_operations.withdraw_from_to_user_wallet_transfer(withdraw)
+        return response
+
+    return await idempotent_requests.run(
+        current_user.id,
+        idempotency_key,
+        request.url.path,
+        withdraw,
+        withdraw_from_to_user_wallet_transfer,
+        response,
+    )
+
+
+@router.post("/transfer/batch/", response_model=list[TransferResult])
+async def batch_transfer(
+    transfers: list[Wallet2UserWalletTransfer],
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: Principal = Depends(get_current_user),
+):
+
+    if any(transfer.user != current_user.id for transfer in transfers):
+        raise HTTPException(
+            401, {"message": "Unauthorized to perform this action!"}
+        )
+
+    if not 0 < len(transfers) <= ledger_settings.TRANSFER_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            400,
+            {
+                "message": "A batch must hold between 1 and "
+                f"{ledger_settings.TRANSFER_BATCH_MAX_ITEMS} transfers!"
+            },
+        )
+
+    async def batch_transfer() -> list:
+        return await ledger_operations.batch_transfer(transfers)
+
+    return await idempotent_requests.run(
+        current_user.id,
+        idempotency_key,
+        request.url.path,
+        transfers,
+        batch_transfer,
+    )
+
 
 @router.get("/balance/")
 async def total_wallet_balance(
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> dict:
 
     balance = await ledger_operations.get_total_wallet_balance(current_user.id)
@@ -130,7 +281,7 @@ async def total_wallet_balance(
 @router.get("/balance/wallet/")
 async def wallet_balance(
     wallet_id: int,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ) -> dict:
 
     balance = await ledger_operations.get_wallet_balance(
@@ -139,4 +290,4 @@ async def wallet_balance(
 
     if balance is None:
         raise HTTPException(404, {"message": "Wallet does not exist!"})
-    return {"message": f"Wallet balance is NGN{balance.amount}"}
+    return {"message": f"Wallet balance is NGN{balance}"}
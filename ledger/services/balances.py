@@ -0,0 +1,181 @@
+# Stdlib Imports
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+
+# Own Imports
+from core.metrics import metrics
+from core.settings import ledger_settings
+from core.cache import LRUCache, LocalStore, SharedCache
+from config.replicas import read_primary
+
+# Third Party Imports
+try:
+    from redis import asyncio as redis
+except ImportError:  # redis is only needed for a shared cache server
+    redis = None
+
+
+class BalanceCache:
+    """
+    This service is responsible for caching the balance of every wallet
+    (keyed by owner and wallet id) and the total balance of every user.
+
+    It is invalidated by the money movement services once their changes
+    are committed, and loaded again (from the primary) on the next read.
+    Balances are never written through: concurrent writes may finish in
+    any order, so only the database knows the latest balance.
+
+    The cache lives either in-process (LRU with a TTL), which is only
+    consistent with a single worker, or in a store shared by every
+    worker. There an invalidated entry is held off for `hold` seconds,
+    so a worker loading the balance before the write can not cache it.
+    """
+
+    def __init__(
+        self,
+        local: Optional[LRUCache] = None,
+        shared: Optional[SharedCache] = None,
+        hold: float = ledger_settings.BALANCE_CACHE_INVALIDATION_HOLD,
+    ):
+        self.local = local
+        self.shared = shared
+        self.hold = hold
+        # bumped on every invalidation, so a read racing with a write
+        # does not put back the balance from before the write
+        self._version = 0
+
+    async def wallet_balance(
+        self,
+        user_id: int,
+        wallet_id: int,
+        load: Callable[[], Awaitable[Optional[int]]],
+    ) -> Optional[int]:
+        """
+        This method returns the cached balance of a wallet, loading
+        (and caching) it on a cache miss.
+
+        :param user_id: The id of the wallet owner
+        :type user_id: int
+
+        :param wallet_id: The id of the wallet
+        :type wallet_id: int
+
+        :param load: Reads the balance from the database
+        :type load: Callable[[], Awaitable[Optional[int]]]
+
+        :return: The balance, or None if the user has no such wallet.
+        """
+
+        return await self._get_or_load(f"wallet:{user_id}:{wallet_id}", load)
+
+    async def total_balance(
+        self, user_id: int, load: Callable[[], Awaitable[Optional[int]]]
+    ) -> Optional[int]:
+        """
+        This method returns the cached total balance of a user, loading
+        (and caching) it on a cache miss.
+        """
+
+        return await self._get_or_load(f"user:{user_id}", load)
+
+    async def wallet_changed(self, user_id: int, wallet_id: int) -> None:
+        """
+        This method records a committed change to a wallet: its balance
+        and the owner total are dropped.
+        """
+
+        await self.wallets_changed([(user_id, wallet_id)])
+
+    async def wallets_changed(
+        self, wallets: Iterable[Tuple[int, int]]
+    ) -> None:
+        """
+        This method invalidates the balances of many (user id, wallet id)
+        pairs and the totals of their owners.
+        """
+
+        self._version += 1
+        keys = set()
+        for user_id, wallet_id in wallets:
+            keys.update((f"wallet:{user_id}:{wallet_id}", f"user:{user_id}"))
+        await self._delete(*keys)
+
+    async def _get_or_load(
+        self, key: str, load: Callable[[], Awaitable[Optional[int]]]
+    ) -> Optional[int]:
+        value = await self._get(key)
+        if value is not None:
+            metrics.increment("balance_cache.hits")
+            return value
+
+        metrics.increment("balance_cache.misses")
+        version = self._version
+        # served to every user afterwards, while only the writer of a
+        # change has its own reads pinned to the primary
+        token = read_primary.set(True)
+        try:
+            value = await load()
+        finally:
+            read_primary.reset(token)
+        if value is not None and version == self._version:
+            await self._set(key, value)
+
+        return value
+
+    async def _get(self, key: str) -> Optional[int]:
+        if self.shared is not None:
+            return await self.shared.get(key)
+        return self.local.get(key)
+
+    async def _set(self, key: str, value: int) -> None:
+        if self.shared is not None:
+            await self.shared.add(key, value)
+        else:
+            self.local.set(key, value)
+
+        backend = self.shared if self.shared is not None else self.local
+        metrics.set_gauge("balance_cache.evictions", backend.evictions)
+
+    async def _delete(self, *keys: str) -> None:
+        if self.shared is not None:
+            await self.shared.invalidate(*keys, hold=self.hold)
+        else:
+            for key in keys:
+                self.local.delete(key)
+
+
+def balance_cache_from_settings() -> BalanceCache:
+    """
+    This function builds the balance cache configured in the settings:
+    an in-process cache, or a cache shared through redis (replaced by
+    an in-process stand-in when no redis url is set).
+    """
+
+    if ledger_settings.BALANCE_CACHE_BACKEND != "shared":
+        if ledger_settings.WEB_CONCURRENCY > 1:
+            # the invalidations of a worker would not reach the others
+            raise RuntimeError(
+                "An in-process balance cache can not be used with several "
+                "workers, set BALANCE_CACHE_BACKEND=shared."
+            )
+        return BalanceCache(
+            local=LRUCache(
+                ledger_settings.BALANCE_CACHE_SIZE,
+                ledger_settings.BALANCE_CACHE_TTL,
+            )
+        )
+
+    if not ledger_settings.BALANCE_CACHE_URL:
+        client = LocalStore(ledger_settings.BALANCE_CACHE_SIZE)
+    elif redis is None:
+        raise RuntimeError("A shared balance cache requires `redis`.")
+    else:
+        client = redis.from_url(ledger_settings.BALANCE_CACHE_URL)
+
+    return BalanceCache(
+        shared=SharedCache(
+            client, ledger_settings.BALANCE_CACHE_TTL, prefix="balance:"
+        )
+    )
+
+
+balance_cache = balance_cache_from_settings()
@@ -0,0 +1,199 @@
+# Stdlib Imports
+import time
+import asyncio
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+# SQLAlchemy Imports
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# FastAPI Imports
+from fastapi import HTTPException
+
+# Own Imports
+from core.metrics import metrics
+from config.database import session_scope
+from config.replicas import replica_router, request_user
+from orm.ledger import ledger_orm
+from orm.journal import journal_orm
+from orm.idempotency import StagedResponse, idempotency_keys_orm
+from core.settings import ledger_settings
+from models.ledger import TransactionType
+from schemas.ledger import WalletDeposit
+
+
+Pending = Tuple[WalletDeposit, asyncio.Future, List[StagedResponse]]
+
+
+class DepositQueue:
+    """
+    This service is responsible for group committing deposits. Deposits
+    are queued in-process and a background flusher applies everything
+    that arrived within `max_delay` seconds (or `max_batch` deposits) in
+    one transaction, coalescing the credits of every wallet into a single
+    balance update. Callers are only answered once that commit is done.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        max_batch: int = ledger_settings.DEPOSIT_COALESCE_MAX_BATCH,
+        max_delay: float = ledger_settings.DEPOSIT_COALESCE_MAX_DELAY,
+    ):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def submit(self, deposit: WalletDeposit) -> Optional[int]:
+        """
+        This method queues a deposit and waits for its batch to commit.
+
+        :param deposit: schemas.WalletDeposit
+        :type deposit: schemas.WalletDeposit
+
+        :return: The wallet balance after the deposit,
+        None for a striped wallet.
+        """
+
+        queue = self._start()
+        future = asyncio.get_running_loop().create_future()
+
+        # the idempotency key of the request is completed
+        # by the commit of the batch applying the deposit
+        await queue.put((deposit, future, idempotency_keys_orm.staged()))
+        metrics.set_gauge("deposits.queue_depth", queue.qsize())
+
+        return await future
+
+    async def close(self) -> None:
+        """This method flushes the queued deposits and stops the flusher."""
+
+        if self._flusher is None:
+            return
+
+        await self._queue.join()
+        self._flusher.cancel()
+        self._queue, self._flusher = None, None
+
+    def _start(self) -> asyncio.Queue:
+        """
+        This method starts the flusher on the running event loop, the
+        queue and the flusher are bound to the loop they were made on.
+        """
+
+        loop = asyncio.get_running_loop()
+        if (
+            self._flusher is None
+            or self._flusher.done()
+            or self._flusher.get_loop() is not loop
+        ):
+            self._queue = asyncio.Queue()
+            self._flusher = loop.create_task(self._flush_forever(self._queue))
+
+        return self._queue
+
+    async def _flush_forever(self, queue: asyncio.Queue) -> None:
+        """This method flushes batches of deposits as they arrive."""
+
+        # use a session of its own, not the one of the request
+        # that happened to start the flusher, nor its user
+        session_scope.set(None)
+        request_user.set(None)
+
+        while True:
+            batch = [await queue.get()]
+            deadline = time.monotonic() + self.max_delay
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            metrics.set_gauge("deposits.queue_depth", queue.qsize())
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _flush(self, batch: List[Pending]) -> None:
+        """
+        This method applies a batch of deposits in one transaction and
+        resolves the future of every deposit once it is committed.
+
+        :param batch: The queued deposits and their futures
+        :type batch: List[Pending]
+        """
+
+        started = time.perf_counter()
+        try:
+            wallets = await ledger_orm.lock_wallets(
+                [deposit.id for deposit, _, _ in batch]
+            )
+            balances = await ledger_orm.lock_balances(wallets)
+
+            deltas = defaultdict(int)
+            results, applied = [], []
+            for deposit, _, staged in batch:
+                wallet = wallets.get(deposit.id)
+                if wallet is None or wallet.user != deposit.user:
+                    results.append(
+                        HTTPException(
+                            404,
+                            {
+                                "message": f"Wallet ID:{deposit.id} "
+                                "does not exist!"
+                            },
+                        )
+                    )
+                    continue
+
+                deltas[deposit.id] += deposit.amount
+                balances[deposit.id] += deposit.amount
+                results.append(
+                    balances[deposit.id] if wallet.stripes == 1 else None
+                )
+                applied.append(deposit)
+                idempotency_keys_orm.stage_many(staged)
+
+            if applied:
+                await ledger_orm.apply_deltas(deltas, wallets)
+                await journal_orm.record_many(
+                    TransactionType.DEPOSIT,
+                    [
+                        [(deposit.id, deposit.amount), (None, -deposit.amount)]
+                        for deposit in applied
+                    ],
+                )
+            await self.db.commit()
+
+            # the owners of the credited wallets read their writes
+            for user_id in {deposit.user for deposit in applied}:
+                replica_router.record_write(user_id)
+        except Exception as error:
+            await self.db.rollback()
+            idempotency_keys_orm.unstage(
+                *(pending for _, _, staged in batch for pending in staged)
+            )
+            results = [error] * len(batch)
+
+        metrics.observe("deposits.batch_size", len(batch))
+        metrics.observe("deposits.flush_latency", time.perf_counter() - started)
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+# share the session the ORMs work on, so commits cover their changes
+deposit_queue = DepositQueue(ledger_orm.orm)
@@ -0,0 +1,133 @@
+# Stdlib Imports
+import io
+import csv
+import json
+import zlib
+import datetime
+from typing import AsyncIterator, Optional
+
+# SQLAlchemy Imports
+from sqlalchemy.engine import Row
+
+# Own Imports
+from core.metrics import metrics
+from orm.exports import export_orm
+
+
+EXPORTS = ("users", "entries")
+# The export formats and their media types
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Bytes gathered before a chunk is sent (or compressed)
+CHUNK_SIZE = 64 * 1024
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+async def serialize(rows: AsyncIterator[Row], format: str) -> AsyncIterator[str]:
+    """
+    This function serializes rows to csv lines (after a header row) or
+    to newline delimited json, one row at a time.
+
+    :param rows: The rows to serialize
+    :type rows: AsyncIterator[Row]
+
+    :param format: Either `ndjson` or `csv`
+    :type format: str
+
+    :return: An async iterator of lines, with their line endings.
+    """
+
+    if format == "ndjson":
+        async for row in rows:
+            yield json.dumps(row._asdict(), default=_json_default) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header = False
+    async for row in rows:
+        if not header:
+            writer.writerow(row._fields)
+            header = True
+        writer.writerow(
+            value.isoformat() if isinstance(value, datetime.date) else value
+            for value in row
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+async def encode(lines: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """
+    This function encodes lines to utf-8, gathering them into chunks of
+    about `CHUNK_SIZE` bytes so every row is not sent on its own.
+    """
+
+    chunk, size, rows = [], 0, 0
+    async for line in lines:
+        data = line.encode("utf-8")
+        chunk.append(data)
+        size += len(data)
+        rows += 1
+        if size >= CHUNK_SIZE:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+
+    if chunk:
+        yield b"".join(chunk)
+    metrics.increment("exports.rows", rows)
+
+
+async def gzipped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """This function gzips a stream of bytes on the fly."""
+
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(
+    kind: str,
+    format: str,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    compress: bool = False,
+) -> AsyncIterator[bytes]:
+    """
+    This function returns the byte stream of an export: every user and
+    wallet, or every journal entry created in [start, end).
+
+    :param kind: Either `users` or `entries`
+    :type kind: str
+
+    :param format: Either `ndjson` or `csv`
+    :type format: str
+
+    :param start: The earliest entry creation time (entries only)
+    :type start: Optional[datetime.datetime]
+
+    :param end: The entry creation time to stop at (entries only)
+    :type end: Optional[datetime.datetime]
+
+    :param compress: Gzip the stream
+    :type compress: bool
+
+    :return: An async iterator of bytes.
+    """
+
+    if kind == "users":
+        rows = export_orm.users()
+    else:
+        rows = export_orm.entries(start, end)
+
+    chunks = encode(serialize(rows, format))
+    return gzipped(chunks) if compress else chunks
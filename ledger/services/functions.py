@@ -1,10 +1,20 @@
 # Stdlib Imports
-from typing import List
+import datetime
+from typing import List, Optional, Tuple
+
+# FastAPI Imports
+from fastapi import HTTPException
+
+# SQLAlchemy Imports
+from sqlalchemy.engine import Row
 
 # ORM Imports
 from orm.ledger import ledger_orm
+from orm.journal import journal_orm
 from schemas.ledger import WalletCreate
-from models.ledger import Wallet as UserWallet
+from schemas.user import Principal
+from models.ledger import TransactionType, Wallet as UserWallet
+from ledger.services.balances import balance_cache
 
 
 async def create_wallet(wallet: WalletCreate) -> UserWallet:
@@ -18,13 +28,15 @@ async def create_wallet(wallet: WalletCreate) -> UserWallet:
     """
 
     wallet = await ledger_orm.create(wallet)
+    await balance_cache.wallets_changed([(wallet.user, wallet.id)])
     return wallet
 
 
 async def get_all_wallets_by_user(
     skip: int, 
     limit: int, 
-    user_id: int
+    user_id: int,
+    after: Optional[int] = None,
 ) -> List[UserWallet]:
     """
     This function gets all wallets for a user.
@@ -38,8 +50,57 @@ async def get_all_wallets_by_user(
     :param user_id: The id of the user whose wallets you want to retrieve
     :type user_id: int
 
+    :param after: The id of the last wallet of the previous page
+    :type after: Optional[int]
+
     :return: A list of all wallets for a given user.
     """
     return await ledger_orm.filter(
-        **{"skip": skip, "limit": limit, "user_id": user_id}
+        **{"skip": skip, "limit": limit, "user_id": user_id, "after": after}
     )
+
+
+async def get_wallet_transactions(
+    user: Principal,
+    wallet_id: int,
+    limit: int,
+    before: Optional[Tuple[datetime.datetime, int]] = None,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    types: Optional[List[TransactionType]] = None,
+) -> List[Row]:
+    """
+    This function gets a page of the transaction history of a wallet,
+    newest first. Only the wallet owner (or an admin) can read it.
+
+    :param user: The user asking for the history
+    :type user: Principal
+
+    :param wallet_id: The id of the wallet
+    :type wallet_id: int
+
+    :param limit: The maximum number of entries to return
+    :type limit: int
+
+    :param before: The (creation time, id) of the last entry of the previous page
+    :type before: Optional[Tuple[datetime.datetime, int]]
+
+    :param start: The earliest creation time
+    :type start: Optional[datetime.datetime]
+
+    :param end: The creation time to stop at
+    :type end: Optional[datetime.datetime]
+
+    :param types: The transaction types to keep
+    :type types: Optional[List[TransactionType]]
+
+    :return: A list of the wallet journal entries.
+    """
+
+    owner = await ledger_orm.owner(wallet_id)
+    if owner is None or (owner != user.id and not user.is_admin):
+        raise HTTPException(
+            404, {"message": f"Wallet ID:{wallet_id} does not exist!"}
+        )
+
+    return await journal_orm.history(wallet_id, limit, before, start, end, types)
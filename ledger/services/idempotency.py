@@ -0,0 +1,249 @@
+# Stdlib Imports
+import json
+import hashlib
+import datetime
+from typing import Any, Awaitable, Callable, Optional, Union
+
+# FastAPI Imports
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Own Imports
+from core.cache import LRUCache
+from core.metrics import metrics
+from core.settings import ledger_settings
+from models.ledger import IdempotencyKey
+from orm.idempotency import StagedResponse, idempotency_keys_orm
+
+
+class IdempotentRequests:
+    """
+    This service is responsible for making money movement requests
+    safe to retry. The first request made with an `Idempotency-Key`
+    claims the key and its response is stored; a retry with the same
+    key gets the stored response back without moving money again.
+
+    Completed keys are also held in an in-process LRU cache, so hot
+    keys are replayed without a database round trip.
+    """
+
+    def __init__(
+        self,
+        ttl: int = ledger_settings.IDEMPOTENCY_KEY_TTL,
+        cache_size: int = ledger_settings.IDEMPOTENCY_CACHE_SIZE,
+    ):
+        self.ttl = ttl
+        self.cache = LRUCache(cache_size, ttl)
+
+    async def run(
+        self,
+        user_id: int,
+        key: Optional[str],
+        path: str,
+        payload: Any,
+        operation: Callable[[], Awaitable[Any]],
+        response: Any = None,
+    ) -> Any:
+        """
+        This method runs the operation of a request at most once
+        per idempotency key.
+
+        The response is stored by the commit that moves the money, so a
+        key is never left claimed (or released for a second attempt)
+        once the money moved. Operations only knowing their response
+        once they ran set it with `idempotency_keys_orm.respond` before
+        they commit.
+
+        :param user_id: The id of the user making the request
+        :type user_id: int
+
+        :param key: The `Idempotency-Key` header, if any
+        :type key: Optional[str]
+
+        :param path: The path of the request
+        :type path: str
+
+        :param payload: The body of the request
+        :type payload: Any
+
+        :param operation: Runs the request and returns its response body
+        :type operation: Callable[[], Awaitable[Any]]
+
+        :param response: The response body of the operation, when known
+        before it runs
+        :type response: Any
+
+        :return: The response body | the replayed response.
+        """
+
+        if key is None:
+            return await operation()
+
+        if not 0 < len(key) <= 255:
+            raise HTTPException(
+                400, {"message": "Idempotency-Key must be 1-255 characters!"}
+            )
+
+        fingerprint = hashlib.sha256(
+            json.dumps(
+                [path, jsonable_encoder(payload)], sort_keys=True
+            ).encode()
+        ).hexdigest()
+
+        cached = self.cache.get((user_id, key))
+        if cached is not None:
+            metrics.increment("idempotency.cache_hits")
+            return self._replay(fingerprint, *cached)
+
+        claimed = await self._claim(user_id, key, fingerprint)
+        if isinstance(claimed, JSONResponse):
+            return claimed
+
+        staged = idempotency_keys_orm.stage(
+            claimed,
+            200,
+            None if response is None else json.dumps(jsonable_encoder(response)),
+        )
+        try:
+            response = await operation()
+        except HTTPException as error:
+            idempotency_keys_orm.unstage(staged)
+            if staged.committed:
+                # the money moved, retries replay the stored response
+                self._cached_stored(claimed, staged)
+            elif error.status_code >= 500:
+                await idempotency_keys_orm.delete(claimed)
+            else:
+                await self._complete(
+                    claimed, error.status_code, {"detail": error.detail}
+                )
+            raise
+        except Exception:
+            idempotency_keys_orm.unstage(staged)
+            if staged.committed:
+                self._cached_stored(claimed, staged)
+            else:
+                await idempotency_keys_orm.delete(claimed)
+            raise
+
+        idempotency_keys_orm.unstage(staged)
+        if staged.committed:
+            self._cached_stored(claimed, staged)
+        else:
+            # nothing was committed, e.g. nothing had to move
+            await self._complete(claimed, 200, jsonable_encoder(response))
+        return response
+
+    async def _claim(
+        self, user_id: int, key: str, fingerprint: str
+    ) -> Union[IdempotencyKey, JSONResponse]:
+        """
+        This method claims the key for the current request, replacing
+        an expired claim. The key of a completed earlier request is not
+        claimed, its stored response is returned instead.
+        """
+
+        for _ in range(2):
+            now = datetime.datetime.now()
+            claimed = await idempotency_keys_orm.claim(
+                user_id,
+                key,
+                fingerprint,
+                now + datetime.timedelta(seconds=self.ttl),
+            )
+            if claimed is not None:
+                return claimed
+
+            existing = await idempotency_keys_orm.get(user_id, key)
+            if existing is None:
+                continue
+            if existing.expires_at <= now:
+                await idempotency_keys_orm.delete(existing)
+                continue
+
+            if existing.status_code is None:
+                metrics.increment("idempotency.conflicts")
+                raise HTTPException(
+                    409,
+                    {
+                        "message": "A request with this Idempotency-Key "
+                        "is still in progress!"
+                    },
+                )
+
+            entry = (
+                existing.fingerprint,
+                existing.status_code,
+                existing.response,
+            )
+            self._cache(user_id, key, existing.expires_at, entry)
+            return self._replay(fingerprint, *entry)
+
+        raise HTTPException(
+            409, {"message": "Idempotency-Key could not be claimed!"}
+        )
+
+    async def _complete(
+        self, claimed: IdempotencyKey, status_code: int, body: Any
+    ) -> None:
+        """This method stores the response of a claimed key."""
+
+        response = json.dumps(body)
+        await idempotency_keys_orm.complete(claimed, status_code, response)
+        self._cache(
+            claimed.user_id,
+            claimed.key,
+            claimed.expires_at,
+            (claimed.fingerprint, status_code, response),
+        )
+
+    def _cached_stored(
+        self, claimed: IdempotencyKey, staged: StagedResponse
+    ) -> None:
+        """This method caches the response stored with a money movement."""
+
+        if staged.response is not None:
+            self._cache(
+                claimed.user_id,
+                claimed.key,
+                claimed.expires_at,
+                (claimed.fingerprint, staged.status_code, staged.response),
+            )
+
+    def _cache(
+        self, user_id: int, key: str, expires_at: datetime.datetime, entry
+    ) -> None:
+        """This method caches a stored response until its key expires."""
+
+        ttl = (expires_at - datetime.datetime.now()).total_seconds()
+        if ttl > 0:
+            self.cache.set((user_id, key), entry, ttl)
+
+    def _replay(
+        self,
+        fingerprint: str,
+        stored_fingerprint: str,
+        status_code: int,
+        response: str,
+    ) -> JSONResponse:
+        """This method rebuilds a stored response."""
+
+        if fingerprint != stored_fingerprint:
+            raise HTTPException(
+                422,
+                {
+                    "message": "Idempotency-Key was already used "
+                    "for a different request!"
+                },
+            )
+
+        metrics.increment("idempotency.replayed")
+        return JSONResponse(
+            json.loads(response),
+            status_code=status_code,
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+
+idempotent_requests = IdempotentRequests()
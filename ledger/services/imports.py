@@ -0,0 +1,208 @@
+# Stdlib Imports
+import csv
+import json
+import time
+import codecs
+from typing import AsyncIterator, Callable, Iterable, List, Optional
+
+# FastAPI Imports
+from fastapi import HTTPException
+
+# Pydantic Imports
+from pydantic import ValidationError
+
+# Own Imports
+from core.metrics import metrics
+from core.settings import ledger_settings
+from models.ledger import ImportJob
+from orm.imports import import_jobs_orm
+from schemas.ledger import WalletDeposit
+from ledger.services.operations import ledger_operations
+
+
+FORMATS = ("csv", "ndjson")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    This function splits a stream of utf-8 encoded bytes into lines,
+    holding no more than one partial line in memory.
+
+    :param chunks: The byte chunks, e.g a request body stream
+    :type chunks: AsyncIterator[bytes]
+
+    :return: An async iterator of lines, without their line endings.
+    """
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_file(lines: Iterable[str]) -> AsyncIterator[str]:
+    """
+    This function adapts the lines of an open (text) file to the
+    async iterator the importer reads.
+    """
+
+    for line in lines:
+        yield line.rstrip("\r\n")
+
+
+async def parse_rows(
+    lines: AsyncIterator[str], format: str
+) -> AsyncIterator[dict]:
+    """
+    This function parses lines of a csv file (with a header row) or of
+    a newline delimited json file into rows. Blank lines are skipped.
+
+    :param lines: The lines of the file
+    :type lines: AsyncIterator[str]
+
+    :param format: Either `csv` or `ndjson`
+    :type format: str
+
+    :return: An async iterator of rows.
+    """
+
+    header = None
+    async for line in lines:
+        if not line.strip():
+            continue
+
+        if format == "ndjson":
+            yield json.loads(line)
+        elif header is None:
+            header = [name.strip() for name in next(csv.reader([line]))]
+        else:
+            yield dict(zip(header, next(csv.reader([line]))))
+
+
+class DepositImporter:
+    """
+    This service is responsible for importing deposit files:
+
+    - the file is read as a stream, one chunk of rows at a time
+    - every row is validated with schemas.WalletDeposit
+    - each chunk is applied in its own transaction, together with the
+      job progress, so an import can resume after the last good chunk
+    """
+
+    def __init__(self, chunk_size: int = ledger_settings.IMPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    async def run(
+        self,
+        job: ImportJob,
+        lines: AsyncIterator[str],
+        on_progress: Optional[Callable[[ImportJob, float], None]] = None,
+    ) -> ImportJob:
+        """
+        This method imports the deposits of a file into the ledger,
+        skipping the rows an earlier run of the job already committed.
+
+        :param job: The import job to run or resume
+        :type job: ImportJob
+
+        :param lines: The lines of the file
+        :type lines: AsyncIterator[str]
+
+        :param on_progress: Called with the job and the throughput
+            (rows per second) after every committed chunk
+        :type on_progress: Callable[[ImportJob, float], None]
+
+        :return: The finished import job.
+        """
+
+        started_at = time.monotonic()
+        skip, chunk = job.rows_committed, []
+        # a refused chunk rolls back and expires the job, so the
+        # committed rows are read off it only after a commit
+        committed = skip
+
+        try:
+            row_number = 0
+            async for row in parse_rows(lines, job.format):
+                row_number += 1
+                if row_number <= skip:
+                    continue
+
+                chunk.append(self._validate(row_number, row))
+                if len(chunk) < self.chunk_size:
+                    continue
+
+                await self._commit(job, chunk)
+                committed = job.rows_committed
+                self._report(job, len(chunk), skip, started_at, on_progress)
+                chunk = []
+
+            if chunk:
+                await self._commit(job, chunk)
+                committed = job.rows_committed
+                self._report(job, len(chunk), skip, started_at, on_progress)
+        except (HTTPException, ValueError) as error:
+            message = (
+                error.detail["message"]
+                if isinstance(error, HTTPException)
+                else str(error)
+            )
+            return await import_jobs_orm.finish(
+                job,
+                "failed",
+                f"Chunk after row {committed}: {message}",
+            )
+
+        return await import_jobs_orm.finish(job, "completed")
+
+    def _validate(self, row_number: int, row: dict) -> WalletDeposit:
+        """This method validates a single row of the file."""
+
+        if not isinstance(row, dict):
+            raise ValueError(f"Row {row_number} is not an object.")
+
+        try:
+            deposit = WalletDeposit(**row)
+        except ValidationError as error:
+            raise ValueError(f"Row {row_number} is invalid: {error}")
+
+        if deposit.amount <= 0:
+            raise ValueError(f"Row {row_number} amount must be positive.")
+        return deposit
+
+    async def _commit(self, job: ImportJob, chunk: List[WalletDeposit]):
+        """This method applies a chunk of deposits and the job progress."""
+
+        await import_jobs_orm.advance(job, len(chunk))
+        await ledger_operations.deposit_many(chunk)
+
+    def _report(
+        self,
+        job: ImportJob,
+        rows: int,
+        skipped: int,
+        started_at: float,
+        on_progress: Optional[Callable[[ImportJob, float], None]],
+    ) -> None:
+        """This method publishes the progress of a running import."""
+
+        elapsed = max(time.monotonic() - started_at, 1e-9)
+        rate = (job.rows_committed - skipped) / elapsed
+
+        metrics.increment("imports.chunks")
+        metrics.increment("imports.rows", rows)
+        metrics.set_gauge("imports.rows_per_second", round(rate, 2))
+
+        if on_progress is not None:
+            on_progress(job, rate)
+
+
+deposit_importer = DepositImporter()
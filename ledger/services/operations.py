@@ -1,9 +1,15 @@
+# Stdlib Imports
+from collections import defaultdict
+from typing import List, Optional
+
+# FastAPI Imports
+from fastapi import HTTPException
+
 # SQLAlchemy Imports
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Own Imports
-from config.database import SessionLocal
-from models.ledger import Wallet as UserWallet
+from models.ledger import TransactionType
 from schemas.ledger import (
     Wallet2UserWalletTransfer,
     WalletWithdraw,
@@ -11,7 +17,12 @@ from schemas.ledger import (
     Wallet2WalletTransfer,
 )
 from orm.ledger import ledger_orm
+from orm.journal import journal_orm
 from orm.aggregate import ledger_aggregate_orm
+from core.settings import ledger_settings
+from ledger.services.transfers import transfer_engine
+from ledger.services.balances import balance_cache
+from ledger.services.coalescing import deposit_queue
 
 
 class LedgerOperations:
@@ -19,49 +30,130 @@ class LedgerOperations:
     This service is responsible for:
 
     - depositing money to wallet
+    - depositing money to many wallets at once
     - withdrawing money from wallet
     - wallet to wallet withdraw transfer
     - wallet to user wallet transfer
+    - batch of wallet to user wallet transfers
     - get total wallet balance
     - get wallet balance
+
+    Every money movement is written to the journal as balanced entries
+    in the same database transaction as the wallet balance change.
     """
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
     async def deposit_money_to_wallet(
         self, deposit: WalletDeposit
-    ) -> None:
+    ) -> Optional[int]:
         """
         This function deposit x amount to the user wallet.
 
         :param deposit: schemas.WalletDeposit
         :type deposit: schemas.WalletDeposit
+
+        :return: The new wallet balance, None for a striped wallet.
         """
 
-        topup_wallet = ledger_orm.partial_filter(
-            {"wallet_id": deposit.id, "user_id": deposit.user}
+        if ledger_settings.DEPOSIT_MODE == "coalesced":
+            balance = await deposit_queue.submit(deposit)
+            await balance_cache.wallet_changed(deposit.user, deposit.id)
+            return balance
+
+        try:
+            balance = await ledger_orm.adjust_balance(
+                deposit.id, deposit.user, deposit.amount
+            )
+        except HTTPException:
+            await self.db.rollback()
+            raise
+
+        await journal_orm.record(
+            TransactionType.DEPOSIT,
+            [(deposit.id, deposit.amount), (None, -deposit.amount)],
         )
-        topup_wallet.amount += deposit.amount
+        await self.db.commit()
+
+        await balance_cache.wallet_changed(deposit.user, deposit.id)
+        return balance
 
-        self.db.commit()
+    async def deposit_many(self, deposits: List[WalletDeposit]) -> None:
+        """
+        This function deposits a batch of amounts in one transaction: the
+        wallets are locked once, credited with a set-based update and
+        every deposit is journaled. Nothing is applied if any of the
+        wallets does not exist.
+
+        :param deposits: A list of schemas.WalletDeposit
+        :type deposits: List[schemas.WalletDeposit]
+        """
+
+        try:
+            wallets = await ledger_orm.lock_wallets(
+                [deposit.id for deposit in deposits]
+            )
+
+            deltas = defaultdict(int)
+            for deposit in deposits:
+                wallet = wallets.get(deposit.id)
+                if wallet is None or wallet.user != deposit.user:
+                    raise HTTPException(
+                        404,
+                        {"message": f"Wallet ID:{deposit.id} does not exist!"},
+                    )
+                deltas[deposit.id] += deposit.amount
+
+            await ledger_orm.apply_deltas(deltas, wallets)
+            await journal_orm.record_many(
+                TransactionType.DEPOSIT,
+                [
+                    [(deposit.id, deposit.amount), (None, -deposit.amount)]
+                    for deposit in deposits
+                ],
+            )
+        except Exception:
+            await self.db.rollback()
+            raise
+
+        await self.db.commit()
+        await balance_cache.wallets_changed(
+            (deposit.user, deposit.id) for deposit in deposits
+        )
 
     async def withdraw_money_from_wallet(
         self, withdraw: WalletWithdraw
-    ) -> None:
+    ) -> Optional[int]:
         """
-        The function withdraws x amount from the user wallet.
+        The function withdraws x amount from the user wallet,
+        provided the wallet holds enough funds.
 
         :param withdraw: schemas.WalletWithdraw
         :type withdraw: schemas.WalletWithdraw
+
+        :return: The new wallet balance, None for a striped wallet.
         """
 
-        withdraw_wallet = ledger_orm.partial_filter(
-            {"wallet_id": withdraw.id, "user_id": withdraw.user}
+        try:
+            balance = await ledger_orm.adjust_balance(
+                withdraw.id,
+                withdraw.user,
+                -withdraw.amount,
+                overdraft_guard=True,
+            )
+        except HTTPException:
+            await self.db.rollback()
+            raise
+
+        await journal_orm.record(
+            TransactionType.WITHDRAWAL,
+            [(withdraw.id, -withdraw.amount), (None, withdraw.amount)],
         )
-        withdraw_wallet.amount -= withdraw.amount
+        await self.db.commit()
 
-        self.db.commit()
+        await balance_cache.wallet_changed(withdraw.user, withdraw.id)
+        return balance
 
     async def withdraw_from_to_wallet_transfer(
         self, withdraw: Wallet2WalletTransfer
@@ -74,18 +166,20 @@ class LedgerOperations:
         :type withdraw: schemas.Wallet2WalletTransfer
         """
 
-        from_wallet = ledger_orm.partial_filter(
-            {"wallet_id": withdraw.wallet_from, "user_id": withdraw.user}
+        await transfer_engine.transfer(
+            withdraw.user,
+            withdraw.wallet_from,
+            withdraw.user,
+            withdraw.wallet_to,
+            withdraw.amount,
         )
-        to_wallet = ledger_orm.partial_filter(
-            {"wallet_id": withdraw.wallet_to, "user_id": withdraw.user}
+        await balance_cache.wallets_changed(
+            [
+                (withdraw.user, withdraw.wallet_from),
+                (withdraw.user, withdraw.wallet_to),
+            ]
         )
 
-        from_wallet.amount -= withdraw.amount
-        to_wallet.amount += withdraw.amount
-
-        self.db.commit()
-
     async def withdraw_from_to_user_wallet_transfer(
         self, withdraw: Wallet2UserWalletTransfer
     ) -> None:
@@ -97,17 +191,43 @@ class LedgerOperations:
         :type withdraw: schemas.Wallet2UserWalletTransfer
         """
 
-        from_wallet = ledger_orm.partial_filter(
-            {"wallet_id": withdraw.wallet_from, "user_id": withdraw.user}
+        await transfer_engine.transfer(
+            withdraw.user,
+            withdraw.wallet_from,
+            withdraw.user_to,
+            withdraw.wallet_to,
+            withdraw.amount,
         )
-        to_wallet = ledger_orm.partial_filter(
-            {"wallet_id": withdraw.wallet_to, "user_id": withdraw.user_to}
+        await balance_cache.wallets_changed(
+            [
+                (withdraw.user, withdraw.wallet_from),
+                (withdraw.user_to, withdraw.wallet_to),
+            ]
         )
 
-        from_wallet.amount -= withdraw.amount
-        to_wallet.amount += withdraw.amount
+    async def batch_transfer(
+        self, transfers: List[Wallet2UserWalletTransfer]
+    ) -> List[dict]:
+        """
+        This function is responsible for applying a batch of
+        wallet to user wallet transfers in one transaction.
+
+        :param transfers: A list of schemas.Wallet2UserWalletTransfer
+        :type transfers: List[schemas.Wallet2UserWalletTransfer]
 
-        self.db.commit()
+        :return: The result of every transfer, in the order given.
+        """
+
+        results = await transfer_engine.transfer_batch(transfers)
+        await balance_cache.wallets_changed(
+            (user_id, wallet_id)
+            for transfer in transfers
+            for user_id, wallet_id in (
+                (transfer.user, transfer.wallet_from),
+                (transfer.user_to, transfer.wallet_to),
+            )
+        )
+        return results
 
     async def get_total_wallet_balance(self, user_id: int) -> int:
         """
@@ -119,12 +239,16 @@ class LedgerOperations:
         :return: The total balance of all wallets for a user.
         """
 
-        wallet = await ledger_aggregate_orm.total_sum(user_id)
-        return wallet[0][0]
+        async def total_sum() -> Optional[int]:
+            total = await ledger_aggregate_orm.total_sum(user_id)
+            # a user without a row has no wallets either
+            return total[0][0] if total else 0
+
+        return await balance_cache.total_balance(user_id, total_sum)
 
     async def get_wallet_balance(
         self, user_id: int, wallet_id: int
-    ) -> UserWallet:
+    ) -> Optional[int]:
         """
         This function gets the balance of a single wallet.
 
@@ -134,11 +258,17 @@ class LedgerOperations:
         :param wallet_id: The id of the wallet you want to get the balance of
         :type wallet_id: int
 
-        :return: The balance of the wallet
+        :return: The balance of the wallet, None if it does not exist.
         """
 
-        wallet = await ledger_orm.get(user_id, wallet_id)
-        return wallet
+        async def wallet_amount() -> Optional[int]:
+            wallet = await ledger_orm.get(user_id, wallet_id)
+            return None if wallet is None else wallet.amount
+
+        return await balance_cache.wallet_balance(
+            user_id, wallet_id, wallet_amount
+        )
 
 
-ledger_operations = LedgerOperations(SessionLocal)
+# share the session the ORMs work on, so commits cover their changes
+ledger_operations = LedgerOperations(ledger_orm.orm)
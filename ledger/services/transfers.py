@@ -0,0 +1,306 @@
+# Stdlib Imports
+import json
+import random
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+# FastAPI Imports
+from fastapi import HTTPException
+
+# SQLAlchemy Imports
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Own Imports
+from core.metrics import metrics
+from core.settings import ledger_settings
+from models.ledger import TransactionType, Wallet as UserWallet
+from schemas.ledger import Wallet2UserWalletTransfer
+from orm.ledger import ledger_orm
+from orm.journal import journal_orm
+from orm.idempotency import idempotency_keys_orm
+
+
+T = TypeVar("T")
+
+# SQLSTATE codes of the failures that are safe to retry
+SERIALIZATION_FAILURE = "40001"
+DEADLOCK_DETECTED = "40P01"
+
+
+def retry_reason(error: DBAPIError) -> Optional[str]:
+    """
+    This function tells whether a database error is transient, i.e
+    the transaction was aborted by the database and can be replayed.
+
+    :param error: The error raised by the database driver
+    :type error: DBAPIError
+
+    :return: The reason to retry for, or None if the error is fatal.
+    """
+
+    code = getattr(error.orig, "pgcode", None) or getattr(
+        error.orig, "sqlstate", None
+    )
+    if code == DEADLOCK_DETECTED:
+        return "deadlock"
+    if code == SERIALIZATION_FAILURE:
+        return "serialization"
+    if "database is locked" in str(error.orig):
+        return "locked"
+    return None
+
+
+class TransferEngine:
+    """
+    This service is responsible for moving money between wallets:
+
+    - the wallets are locked in one statement, in id order
+    - batches of transfers are applied with set-based updates
+    - deadlocks and serialization failures are retried with a
+      bounded, jittered exponential backoff
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        max_retries: int = ledger_settings.TRANSFER_MAX_RETRIES,
+        base_delay: float = ledger_settings.TRANSFER_RETRY_BASE_DELAY,
+        max_delay: float = ledger_settings.TRANSFER_RETRY_MAX_DELAY,
+    ):
+        self.db = db
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def run(self, operation: Callable[..., Awaitable[T]], *args) -> T:
+        """
+        This method runs a transactional operation, rolling back and
+        replaying it when the database aborts it with a transient error.
+
+        :param operation: The coroutine function running the transaction
+        :type operation: Callable[..., Awaitable[T]]
+
+        :return: Whatever the operation returns.
+        """
+
+        attempt = 0
+        while True:
+            try:
+                return await operation(*args)
+            except DBAPIError as error:
+                await self.db.rollback()
+
+                reason = retry_reason(error)
+                if reason is None:
+                    raise
+                if attempt >= self.max_retries:
+                    metrics.increment("transfers.retries_exhausted")
+                    raise HTTPException(
+                        503,
+                        {"message": "Transfer conflicted, please retry!"},
+                    )
+
+                metrics.increment(f"transfers.retried.{reason}")
+                await asyncio.sleep(
+                    random.uniform(
+                        0, min(self.max_delay, self.base_delay * 2**attempt)
+                    )
+                )
+                attempt += 1
+            except Exception:
+                await self.db.rollback()
+                raise
+
+    async def transfer(
+        self,
+        user_from: int,
+        wallet_from: int,
+        user_to: int,
+        wallet_to: int,
+        amount: int,
+    ) -> None:
+        """
+        This method transfers x amount from wallet y of user a
+        to wallet z of user b.
+
+        :param user_from: The owner of the wallet to debit
+        :type user_from: int
+
+        :param wallet_from: The id of the wallet to debit
+        :type wallet_from: int
+
+        :param user_to: The owner of the wallet to credit
+        :type user_to: int
+
+        :param wallet_to: The id of the wallet to credit
+        :type wallet_to: int
+
+        :param amount: The amount to transfer
+        :type amount: int
+        """
+
+        transfer = Wallet2UserWalletTransfer(
+            user=user_from,
+            amount=amount,
+            wallet_from=wallet_from,
+            wallet_to=wallet_to,
+            user_to=user_to,
+        )
+
+        async def apply() -> None:
+            [error] = await self._transfer([transfer])
+            if error is not None:
+                # rolled back by `run`, a refused transfer commits nothing
+                raise error
+            await self.db.commit()
+
+        await self.run(apply)
+        metrics.increment("transfers.completed")
+
+    async def transfer_batch(
+        self, transfers: List[Wallet2UserWalletTransfer]
+    ) -> List[dict]:
+        """
+        This method applies a batch of transfers in a single database
+        transaction. Transfers are applied in order, a transfer that can
+        not be made (e.g insufficient funds) is skipped and reported
+        without failing the rest of the batch.
+
+        :param transfers: The transfers to apply
+        :type transfers: List[Wallet2UserWalletTransfer]
+
+        :return: The result of every transfer, in the order given.
+        """
+
+        async def apply() -> Tuple[List[Optional[HTTPException]], List[dict]]:
+            errors = await self._transfer(transfers)
+            results = self._results(transfers, errors)
+            # stored with the transfers by the same commit, when the
+            # batch was made with an idempotency key
+            idempotency_keys_orm.respond(json.dumps(results))
+            await self.db.commit()
+            return errors, results
+
+        errors, results = await self.run(apply)
+
+        completed = errors.count(None)
+        metrics.increment("transfers.batches")
+        metrics.increment("transfers.completed", completed)
+        metrics.increment("transfers.failed", len(errors) - completed)
+        return results
+
+    def _results(
+        self,
+        transfers: List[Wallet2UserWalletTransfer],
+        errors: List[Optional[HTTPException]],
+    ) -> List[dict]:
+        """This method reports the outcome of every transfer of a batch."""
+
+        results = []
+        for index, (transfer, error) in enumerate(zip(transfers, errors)):
+            if error is None:
+                results.append(
+                    {
+                        "index": index,
+                        "status": "completed",
+                        "message": f"Transferred NGN{transfer.amount} to "
+                        f"U#{transfer.user_to} W#{transfer.wallet_to} wallet.",
+                    }
+                )
+            else:
+                results.append(
+                    {
+                        "index": index,
+                        "status": "failed",
+                        "message": error.detail["message"],
+                    }
+                )
+        return results
+
+    async def _transfer(
+        self, transfers: List[Wallet2UserWalletTransfer]
+    ) -> List[Optional[HTTPException]]:
+        """
+        This method locks every wallet involved once, checks and applies
+        the transfers against the locked balances, and writes the balance
+        changes and the journal, for the caller to commit at once.
+
+        :param transfers: The transfers to apply
+        :type transfers: List[Wallet2UserWalletTransfer]
+
+        :return: The error of every refused transfer, None otherwise.
+        """
+
+        wallets = await ledger_orm.lock_wallets(
+            [
+                wallet_id
+                for transfer in transfers
+                for wallet_id in (transfer.wallet_from, transfer.wallet_to)
+            ]
+        )
+        balances = await ledger_orm.lock_balances(wallets)
+
+        deltas = defaultdict(int)
+        movements, errors = [], []
+        for transfer in transfers:
+            error = self._refuse(wallets, balances, transfer)
+            errors.append(error)
+            if error is not None:
+                continue
+
+            balances[transfer.wallet_from] -= transfer.amount
+            balances[transfer.wallet_to] += transfer.amount
+            deltas[transfer.wallet_from] -= transfer.amount
+            deltas[transfer.wallet_to] += transfer.amount
+            movements.append(
+                [
+                    (transfer.wallet_from, -transfer.amount),
+                    (transfer.wallet_to, transfer.amount),
+                ]
+            )
+
+        await ledger_orm.apply_deltas(deltas, wallets)
+        await journal_orm.record_many(TransactionType.TRANSFER, movements)
+
+        return errors
+
+    def _refuse(
+        self,
+        wallets: Dict[int, UserWallet],
+        balances: Dict[int, int],
+        transfer: Wallet2UserWalletTransfer,
+    ) -> Optional[HTTPException]:
+        """
+        This method checks a transfer against the locked wallets.
+
+        :return: Why the transfer can not be made, or None if it can.
+        """
+
+        if transfer.amount <= 0:
+            return HTTPException(
+                400, {"message": "Transfer amount must be positive!"}
+            )
+
+        for wallet_id, user_id in (
+            (transfer.wallet_from, transfer.user),
+            (transfer.wallet_to, transfer.user_to),
+        ):
+            if wallet_id not in wallets or wallets[wallet_id].user != user_id:
+                return HTTPException(
+                    404, {"message": f"Wallet ID:{wallet_id} does not exist!"}
+                )
+
+        if balances[transfer.wallet_from] < transfer.amount:
+            return HTTPException(
+                400,
+                {
+                    "message": "Insufficient funds in wallet "
+                    f"ID:{transfer.wallet_from}!"
+                },
+            )
+        return None
+
+
+transfer_engine = TransferEngine(ledger_orm.orm)
@@ -1,3 +1,6 @@
+# Stdlib Imports
+import asyncio
+
 # Uvicorn Imports
 import uvicorn
 
@@ -6,13 +9,19 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 # Own Imports
-from config.database import db_connect
+from config.database import ASYNC_DB_ENGINE
+from config.replicas import replica_router
+from auth.hashers import pwd_hasher
+from auth.revocation import revoked_tokens, token_versions
 from core.settings import ledger_settings
+from core.middleware import DatabaseSessionMiddleware
+from ledger.services.coalescing import deposit_queue
 
 # Routers Imports
 from users.auth import router as auth_router
 from users.api import router as users_router
 from ledger.api import router as ledger_router
+from admin.api import router as admin_router
 
 
 # Initialize fastapi
@@ -30,21 +39,32 @@ app.add_middleware(
     allow_headers=["*"],
     allow_credentials=True,
 )
+app.add_middleware(DatabaseSessionMiddleware)
 
 # Include routers to base router
 app.include_router(auth_router)
 app.include_router(users_router, tags=["Users"])
 app.include_router(ledger_router, tags=["Ledger"])
+app.include_router(admin_router, tags=["Admin"])
 
 
 @app.on_event("startup")
 async def startup():
-    await db_connect.connect()
+    await replica_router.start()
+    await token_versions.start()
+    await revoked_tokens.start()
+    # pick the bcrypt cost of this host, off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, pwd_hasher.calibrate)
 
 
 @app.on_event("shutdown")
 async def disconnect():
-    await db_connect.disconnect()
+    await deposit_queue.close()
+    await replica_router.stop()
+    await token_versions.stop()
+    await revoked_tokens.stop()
+    pwd_hasher.close()
+    await ASYNC_DB_ENGINE.dispose()
 
 
 @app.get("/", tags=["Root"])
@@ -0,0 +1,185 @@
+# Stdlib Imports
+import sys
+import asyncio
+import argparse
+import datetime
+
+# Own Imports
+from config.database import ASYNC_DB_ENGINE
+from orm.imports import import_jobs_orm
+from orm.idempotency import idempotency_keys_orm
+from orm.revocations import revoked_tokens_orm
+from orm.aggregate import ledger_aggregate_orm
+from ledger.services.imports import FORMATS, DepositImporter, iter_file
+from core.settings import ledger_settings
+from ledger.services import exports
+
+
+async def import_deposits(args: argparse.Namespace) -> int:
+    """
+    This command imports a csv or newline delimited json file of
+    deposits, resuming the given job when a job id is passed.
+    """
+
+    if args.job_id is None:
+        job = await import_jobs_orm.create(args.format)
+    else:
+        job = await import_jobs_orm.get(args.job_id)
+        if job is None or job.status == "completed":
+            print(f"Import job #{args.job_id} can not be resumed.")
+            return 1
+
+    def report(job, rate: float) -> None:
+        print(
+            f"job #{job.id}: {job.rows_committed} rows committed "
+            f"({rate:.0f} rows/s)"
+        )
+
+    print(f"job #{job.id}: importing {args.path}")
+    with open(args.path, encoding="utf-8", newline="") as lines:
+        job = await DepositImporter(args.chunk_size).run(
+            job, iter_file(lines), on_progress=report
+        )
+
+    print(f"job #{job.id}: {job.status} {job.error or ''}".strip())
+    return 0 if job.status == "completed" else 1
+
+
+async def purge_idempotency_keys(args: argparse.Namespace) -> int:
+    """This command deletes the expired idempotency keys."""
+
+    purged = await idempotency_keys_orm.purge_expired()
+    print(f"purged {purged} expired idempotency keys")
+    return 0
+
+
+async def purge_revoked_tokens(args: argparse.Namespace) -> int:
+    """This command deletes the revoked tokens that have expired."""
+
+    purged = await revoked_tokens_orm.purge_expired()
+    print(f"purged {purged} expired revoked tokens")
+    return 0
+
+
+async def verify_balances(args: argparse.Namespace) -> int:
+    """
+    This command recomputes the total balance of every user from their
+    wallets, chunk by chunk, and reports (or repairs) the drifted ones.
+    """
+
+    after, drifted = 0, 0
+    while after is not None:
+        after, drifts = await ledger_aggregate_orm.verify_totals(
+            after, args.chunk_size, repair=args.repair
+        )
+        for user_id, stored, actual in drifts:
+            print(
+                f"user #{user_id}: stored {stored}, actual {actual} "
+                f"(drift {stored - actual})"
+            )
+        drifted += len(drifts)
+
+    action = "repaired" if args.repair else "found"
+    print(f"{action} {drifted} drifted user balances")
+    return 0 if args.repair or not drifted else 1
+
+
+async def export(args: argparse.Namespace) -> int:
+    """
+    This command streams every user and wallet, or the journal entries
+    of a date range, to a file (or to stdout).
+    """
+
+    stream = exports.export_stream(
+        args.kind, args.format, args.start, args.end, compress=args.gzip
+    )
+    if args.output == "-":
+        output = sys.stdout.buffer
+    else:
+        output = open(args.output, "wb")
+
+    try:
+        async for chunk in stream:
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    return 0
+
+
+async def run(args: argparse.Namespace) -> int:
+    """This function runs a command, then closes the database connections."""
+
+    try:
+        return await args.handler(args)
+    finally:
+        await ASYNC_DB_ENGINE.dispose()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ledger management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    deposits = commands.add_parser(
+        "import-deposits", help="import a deposit/settlement file"
+    )
+    deposits.add_argument("path", help="path of the file to import")
+    deposits.add_argument("--format", choices=FORMATS, default="csv")
+    deposits.add_argument(
+        "--chunk-size", type=int, default=ledger_settings.IMPORT_CHUNK_SIZE
+    )
+    deposits.add_argument(
+        "--job-id", type=int, help="resume a failed or interrupted import"
+    )
+    deposits.set_defaults(handler=import_deposits)
+
+    purge = commands.add_parser(
+        "purge-idempotency-keys", help="delete expired idempotency keys"
+    )
+    purge.set_defaults(handler=purge_idempotency_keys)
+
+    purge_tokens = commands.add_parser(
+        "purge-revoked-tokens", help="delete expired revoked tokens"
+    )
+    purge_tokens.set_defaults(handler=purge_revoked_tokens)
+
+    verify = commands.add_parser(
+        "verify-balances", help="check the user totals against the wallets"
+    )
+    verify.add_argument(
+        "--repair", action="store_true", help="fix the drifted totals"
+    )
+    verify.add_argument("--chunk-size", type=int, default=1000)
+    verify.set_defaults(handler=verify_balances)
+
+    export_parser = commands.add_parser(
+        "export", help="stream the users and wallets, or the journal"
+    )
+    export_parser.add_argument("kind", choices=exports.EXPORTS)
+    export_parser.add_argument(
+        "--format", choices=list(exports.FORMATS), default="ndjson"
+    )
+    export_parser.add_argument(
+        "--start",
+        type=datetime.datetime.fromisoformat,
+        help="export the entries created from this (ISO) time",
+    )
+    export_parser.add_argument(
+        "--end",
+        type=datetime.datetime.fromisoformat,
+        help="export the entries created before this (ISO) time",
+    )
+    export_parser.add_argument(
+        "--gzip", action="store_true", help="gzip the export"
+    )
+    export_parser.add_argument(
+        "--output", default="-", help="path of the file to write, - for stdout"
+    )
+    export_parser.set_defaults(handler=export)
+
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
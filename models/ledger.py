@@ -1,22 +1,157 @@
 # Stdlib Imports
+import enum
 import datetime
 
 # SQLAlchemy Imports
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    text,
+)
 from sqlalchemy.orm import relationship
 
 # Core Imports
 from config.database import Base
 
 
+class TransactionType(str, enum.Enum):
+    """The kinds of money movement recorded in the journal."""
+
+    DEPOSIT = "deposit"
+    WITHDRAWAL = "withdrawal"
+    TRANSFER = "transfer"
+
+
 class Wallet(Base):
     __tablename__ = "users_wallet"
+    __table_args__ = (
+        # only striped wallets are indexed, to keep the lookup of the
+        # few striped wallets cheap
+        Index(
+            "ix_users_wallet_striped",
+            "stripes",
+            postgresql_where=text("stripes > 1"),
+            sqlite_where=text("stripes > 1"),
+        ),
+        # wallets are looked up, listed and counted by owner
+        Index("ix_users_wallet_user_id", "user", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user = Column(Integer, ForeignKey("users.id"))
     title = Column(String)
     amount = Column(Integer, default=0)
+    stripes = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime, default=datetime.datetime.now)
     updated_at = Column(DateTime, onupdate=datetime.datetime.now)
 
     owner = relationship("User", back_populates="wallets")
+
+
+class WalletStripe(Base):
+    """
+    A sub-balance of a striped wallet. Striping spreads the writes to a
+    hot wallet over several rows; the balance of a striped wallet is its
+    own amount plus the amount held in all of its stripes.
+    """
+
+    __tablename__ = "wallet_stripes"
+    __table_args__ = (
+        UniqueConstraint(
+            "wallet_id", "stripe", name="uq_wallet_stripes_wallet_stripe"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    wallet_id = Column(Integer, ForeignKey("users_wallet.id"), nullable=False)
+    stripe = Column(Integer, nullable=False)
+    amount = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, onupdate=datetime.datetime.now)
+
+
+class Transaction(Base):
+    """
+    A journal transaction groups the entries of a single money movement.
+    Rows are only ever inserted, never updated or deleted.
+    """
+
+    __tablename__ = "transactions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.now)
+
+    entries = relationship("Entry", back_populates="transaction")
+
+
+class Entry(Base):
+    """
+    A single leg of a journal transaction. The entries of a transaction
+    always sum up to zero; a leg without a wallet is the external
+    (outside world) side of a deposit or withdrawal.
+    """
+
+    __tablename__ = "entries"
+    __table_args__ = (
+        # the history of a wallet, newest first, a page at a time
+        Index("ix_entries_wallet_created", "wallet_id", "created_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    transaction_id = Column(
+        Integer, ForeignKey("transactions.id"), nullable=False, index=True
+    )
+    wallet_id = Column(Integer, ForeignKey("users_wallet.id"), nullable=True)
+    amount = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.now)
+
+    transaction = relationship("Transaction", back_populates="entries")
+
+
+class ImportJob(Base):
+    """
+    Progress of a bulk deposit import. The row counter is committed
+    together with every chunk of deposits, so an interrupted import
+    resumes right after the last committed chunk.
+    """
+
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    format = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="running")
+    rows_committed = Column(Integer, nullable=False, default=0)
+    chunks_committed = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    updated_at = Column(DateTime, onupdate=datetime.datetime.now)
+
+
+class IdempotencyKey(Base):
+    """
+    The outcome of a money movement request made with an
+    `Idempotency-Key` header. A row without a status code is a request
+    still in progress.
+    """
+
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint(
+            "user_id", "key", name="uq_idempotency_keys_user_key"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String, nullable=False)
+    fingerprint = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.now)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -2,7 +2,16 @@
 import datetime
 
 # SQLAlchemy Imports
-from sqlalchemy import Boolean, Column, Integer, String, DateTime
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    text,
+)
 from sqlalchemy.orm import relationship
 
 # Config Imports
@@ -14,6 +23,16 @@ from models.ledger import Wallet
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # the (few) users whose tokens were ever revoked
+        Index(
+            "ix_users_token_version",
+            "id",
+            "token_version",
+            postgresql_where=text("token_version > 0"),
+            sqlite_where=text("token_version > 0"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
@@ -21,7 +40,34 @@ class User(Base):
     password = Column(String)
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
+    # sum of the amounts of the user wallet rows, kept up to date in the
+    # same transaction as every balance change; the stripes of striped
+    # wallets are left out, and added when the total is read
+    balance = Column(Integer, nullable=False, default=0, server_default="0")
+    # number of wallets the user has, claimed before a wallet is created
+    wallet_count = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # bumped to invalidate the tokens (and cached principal) of the user
+    token_version = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
     created_at = Column(DateTime, default=datetime.datetime.now)
     updated_at = Column(DateTime, onupdate=datetime.datetime.now)
 
     wallets = relationship(Wallet, back_populates="owner")
+
+
+class RevokedToken(Base):
+    """
+    A token revoked before it expired, e.g on logout. The row is only
+    needed until the token expires, and is purged afterwards.
+    """
+
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String, nullable=False, unique=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.now, index=True)
@@ -1,23 +1,87 @@
+# Stdlib Imports
+from typing import List, Optional, Tuple
+
 # SQLAlchemy Imports
-from sqlalchemy import func
+from sqlalchemy import func, select, update
 
 # Own Imports
-from orm.ledger import BaseLedgerORM, Userwallet
+from models.user import User
+from orm.ledger import BaseLedgerORM, Userwallet, user_balance
+
+
+# A user whose stored total is off: (user id, stored, actual)
+Drift = Tuple[int, int, int]
 
 
 class LedgerAggregateORM(BaseLedgerORM):
     """ORM responsible for performing aggregate operations."""
 
     async def total_sum(self, user_id: int):
-        """This method aggregates the amount of a user wallet."""
-
-        return (
-            self.orm.query(Userwallet)
-            .join(Userwallet.owner)
-            .filter(Userwallet.user == user_id)
-            .with_entities(func.sum(Userwallet.amount))
-            .all()
+        """
+        This method returns the total balance of a user wallets: the
+        total kept up to date on the user row, plus the amount held in
+        the stripes of their striped wallets.
+        """
+
+        total = await self.read(
+            select(user_balance).where(User.id == user_id)
+        )
+        return total.all()
+
+    async def verify_totals(
+        self, after: int, limit: int, repair: bool = False
+    ) -> Tuple[Optional[int], List[Drift]]:
+        """
+        This method recomputes the total balance of a chunk of users from
+        their wallet rows (stripes excluded), and compares it with the
+        stored total. When repairing, the user rows are locked first, so
+        balance changes in flight land on top of the repaired totals.
+
+        :param after: The chunk starts after this user id
+        :type after: int
+
+        :param limit: The number of users in the chunk
+        :type limit: int
+
+        :param repair: Overwrite the totals that drifted
+        :type repair: bool
+
+        :return: The last user id of the chunk (None past the last
+        user), and the users whose total drifted.
+        """
+
+        users = select(User.id, User.balance).where(User.id > after)
+        if repair:
+            users = users.with_for_update()
+        users = await self.orm.execute(users.order_by(User.id).limit(limit))
+        stored = dict(users.all())
+        if not stored:
+            await self.orm.commit()
+            return None, []
+
+        actual = await self.orm.execute(
+            select(Userwallet.user, func.sum(Userwallet.amount))
+            .where(Userwallet.user.in_(stored))
+            .group_by(Userwallet.user)
         )
+        actual = dict(actual.all())
+
+        drifts = [
+            (user_id, balance, actual.get(user_id) or 0)
+            for user_id, balance in stored.items()
+            if balance != (actual.get(user_id) or 0)
+        ]
+        if repair:
+            for user_id, _, balance in drifts:
+                await self.orm.execute(
+                    update(User)
+                    .where(User.id == user_id)
+                    .values(balance=balance)
+                    .execution_options(synchronize_session=False)
+                )
+        await self.orm.commit()
+
+        return max(stored), drifts
 
 
 ledger_aggregate_orm = LedgerAggregateORM()
@@ -1,40 +1,53 @@
 # SQLAlchemy Imports
-from sqlalchemy.orm import Session
+from sqlalchemy.engine import Result
+from sqlalchemy.sql import Executable
+from sqlalchemy.ext.asyncio import AsyncResult, async_scoped_session
 
 # Own Imports
 from config.database import SessionLocal
-from tests.conftest import _get_test_db
+from config.replicas import replica_router
+from tests.conftest import SessionTesting
 from core.settings import ledger_settings
 
 
+# The database sessions of the ORMs, one per request (or asyncio task).
+orm_session: async_scoped_session = (
+    SessionLocal if not ledger_settings.USE_TEST_DB else SessionTesting
+)
+
+
 class ORMSessionMixin:
     """Base orm session mixin for interacting with the database."""
 
     def __init__(self):
         """
-        If we're not using the test database, then get the next 
-        database session from the database pool. , get the next database session 
-        from the test database pool.
+        If we're not using the test database, then use the session of the
+        current request from the database pool, otherwise; use the session
+        of the current request from the test database pool.
         """
-        self.orm: Session = (
-            self.get_db().__next__()
-            if not ledger_settings.USE_TEST_DB
-            else _get_test_db().__next__()
-        )
+        self.orm: async_scoped_session = orm_session
 
-    def get_db(self):
+    async def read(self, statement: Executable) -> Result:
+        """
+        This method runs a read-only statement, on a read replica
+        unless the session or its user have written recently.
         """
-        This function creates a database session,
-        yield it to the get_db function, rollback the transaction
-        if there's an exception and then finally closes the session.
 
-        Yields:
-            db: scoped database session
+        session = self.orm()
+        return await session.execute(
+            statement,
+            bind_arguments=replica_router.read_bind(session.sync_session),
+        )
+
+    async def stream(self, statement: Executable, batch_size: int) -> AsyncResult:
+        """
+        This method runs a read-only statement on a server-side cursor,
+        fetching `batch_size` rows per round trip, on a read replica
+        unless the session or its user have written recently.
         """
-        db = SessionLocal()
-        try:
-            yield db
-        except Exception:
-            db.rollback()
-        finally:
-            db.close()
+
+        session = self.orm()
+        return await session.stream(
+            statement.execution_options(yield_per=batch_size),
+            bind_arguments=replica_router.read_bind(session.sync_session),
+        )
@@ -0,0 +1,96 @@
+# Stdlib Imports
+import datetime
+from typing import AsyncIterator, Optional
+
+# SQLAlchemy Imports
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+
+# Own Imports
+from models.user import User
+from models.ledger import Entry, Transaction
+from core.settings import ledger_settings
+from orm.ledger import (
+    BaseLedgerORM,
+    Userwallet,
+    user_balance,
+    wallet_balance,
+)
+
+
+class ExportORM(BaseLedgerORM):
+    """
+    ORM responsible for reading whole tables for the exports. Rows are
+    streamed from a server-side cursor, a batch at a time, so memory
+    stays flat whatever the size of the tables.
+    """
+
+    def __init__(self, batch_size: int = ledger_settings.EXPORT_BATCH_SIZE):
+        super().__init__()
+        self.batch_size = batch_size
+
+    async def users(self) -> AsyncIterator[Row]:
+        """
+        This method yields every user along with each of their wallets
+        (one row per wallet, a user without wallets gets a single row
+        with empty wallet columns), in user id then wallet id order.
+        """
+
+        rows = await self.stream(
+            select(
+                User.id.label("user_id"),
+                User.name,
+                User.email,
+                User.is_active,
+                user_balance.label("total_balance"),
+                Userwallet.id.label("wallet_id"),
+                Userwallet.title.label("wallet_title"),
+                wallet_balance.label("amount"),
+                Userwallet.created_at.label("wallet_created_at"),
+            )
+            .outerjoin(Userwallet, Userwallet.user == User.id)
+            .order_by(User.id, Userwallet.id),
+            self.batch_size,
+        )
+        async for row in rows:
+            yield row
+
+    async def entries(
+        self,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+    ) -> AsyncIterator[Row]:
+        """
+        This method yields the journal entries created from `start`
+        (inclusive) up to `end` (exclusive), in id order.
+
+        :param start: The earliest creation time, unbounded when None
+        :type start: Optional[datetime.datetime]
+
+        :param end: The creation time to stop at, unbounded when None
+        :type end: Optional[datetime.datetime]
+        """
+
+        entries = (
+            select(
+                Entry.id,
+                Entry.transaction_id,
+                Transaction.type,
+                Entry.wallet_id,
+                Entry.amount,
+                Entry.created_at,
+            )
+            .join(Transaction, Transaction.id == Entry.transaction_id)
+            .order_by(Entry.id)
+        )
+        if start is not None:
+            entries = entries.filter(Entry.created_at >= start)
+        if end is not None:
+            entries = entries.filter(Entry.created_at < end)
+
+        rows = await self.stream(entries, self.batch_size)
+        async for row in rows:
+            yield row
+
+
+export_orm = ExportORM()
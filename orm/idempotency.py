@@ -0,0 +1,179 @@
+# Stdlib Imports
+import datetime
+from typing import Iterable, List, Optional
+
+# SQLAlchemy Imports
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+# Own Imports
+from orm.base import ORMSessionMixin
+from models.ledger import IdempotencyKey
+
+
+# The session info holding the responses to store on its next commit
+STAGED_RESPONSES = "idempotency_responses"
+
+
+class StagedResponse:
+    """
+    The response of a claimed key, stored by the commit of the money
+    movement it answers, so the key is completed if and only if the
+    money moved.
+    """
+
+    def __init__(
+        self, key_id: int, status_code: int, response: Optional[str] = None
+    ):
+        self.key_id = key_id
+        self.status_code = status_code
+        self.response = response
+        self.committed = False
+
+
+class IdempotencyKeyORM(ORMSessionMixin):
+    """CRUD Operations for the idempotency keys."""
+
+    async def get(self, user_id: int, key: str) -> IdempotencyKey:
+        """This method retrieves the idempotency key of a user."""
+
+        idempotency_key = await self.orm.execute(
+            select(IdempotencyKey)
+            .filter(IdempotencyKey.user_id == user_id)
+            .filter(IdempotencyKey.key == key)
+        )
+        return idempotency_key.scalars().first()
+
+    async def claim(
+        self,
+        user_id: int,
+        key: str,
+        fingerprint: str,
+        expires_at: datetime.datetime,
+    ) -> Optional[IdempotencyKey]:
+        """
+        This method claims an idempotency key for a request in progress.
+        The unique (user_id, key) index makes sure only one request can
+        claim a key.
+
+        :return: The new key, or None if the key is already taken.
+        """
+
+        idempotency_key = IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            fingerprint=fingerprint,
+            expires_at=expires_at,
+        )
+
+        self.orm.add(idempotency_key)
+        try:
+            await self.orm.commit()
+        except IntegrityError:
+            await self.orm.rollback()
+            return None
+
+        return idempotency_key
+
+    async def complete(
+        self, idempotency_key: IdempotencyKey, status_code: int, response: str
+    ) -> IdempotencyKey:
+        """This method stores the response of a claimed key."""
+
+        idempotency_key.status_code = status_code
+        idempotency_key.response = response
+        await self.orm.commit()
+
+        return idempotency_key
+
+    def stage(
+        self,
+        idempotency_key: IdempotencyKey,
+        status_code: int,
+        response: Optional[str] = None,
+    ) -> StagedResponse:
+        """
+        This method stages the response of a claimed key, it is written
+        by the next commit of the current session.
+        """
+
+        staged = StagedResponse(idempotency_key.id, status_code, response)
+        self.stage_many([staged])
+        return staged
+
+    def stage_many(self, staged: Iterable[StagedResponse]) -> None:
+        """This method stages responses on the current session."""
+
+        self.orm().sync_session.info.setdefault(STAGED_RESPONSES, []).extend(
+            staged
+        )
+
+    def staged(self) -> List[StagedResponse]:
+        """This method returns the responses staged on the current session."""
+
+        return list(self.orm().sync_session.info.get(STAGED_RESPONSES, ()))
+
+    def respond(self, response: str) -> None:
+        """
+        This method sets the response of the keys staged on the current
+        session, for operations that only know it once they ran.
+        """
+
+        for staged in self.staged():
+            staged.response = response
+
+    def unstage(self, *staged: StagedResponse) -> None:
+        """This method drops responses that were not committed yet."""
+
+        info = self.orm().sync_session.info
+        remaining = [
+            pending
+            for pending in info.get(STAGED_RESPONSES, ())
+            if pending not in staged
+        ]
+        if remaining:
+            info[STAGED_RESPONSES] = remaining
+        else:
+            info.pop(STAGED_RESPONSES, None)
+
+    async def delete(self, idempotency_key: IdempotencyKey) -> bool:
+        """This method deletes an idempotency key."""
+
+        await self.orm.delete(idempotency_key)
+        await self.orm.commit()
+
+        return True
+
+    async def purge_expired(self) -> int:
+        """This method deletes the expired keys, and returns their count."""
+
+        purged = await self.orm.execute(
+            delete(IdempotencyKey)
+            .where(IdempotencyKey.expires_at <= datetime.datetime.now())
+            .execution_options(synchronize_session=False)
+        )
+        await self.orm.commit()
+
+        return purged.rowcount
+
+
+@event.listens_for(Session, "before_commit")
+def _store_staged_responses(session: Session) -> None:
+    for staged in session.info.get(STAGED_RESPONSES, ()):
+        session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.id == staged.key_id)
+            .values(status_code=staged.status_code, response=staged.response)
+            .execution_options(synchronize_session=False)
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _staged_responses_committed(session: Session) -> None:
+    # kept across rollbacks, so a replayed transaction stores them too
+    for staged in session.info.pop(STAGED_RESPONSES, ()):
+        staged.committed = True
+
+
+idempotency_keys_orm = IdempotencyKeyORM()
@@ -0,0 +1,48 @@
+# Own Imports
+from orm.base import ORMSessionMixin
+from models.ledger import ImportJob
+
+
+class ImportJobORM(ORMSessionMixin):
+    """CRUD Operations for the bulk import jobs."""
+
+    async def get(self, job_id: int) -> ImportJob:
+        """This method retrieves an import job by its id."""
+
+        return await self.orm.get(ImportJob, job_id)
+
+    async def create(self, format: str) -> ImportJob:
+        """This method creates a new import job."""
+
+        job = ImportJob(format=format, rows_committed=0, chunks_committed=0)
+
+        self.orm.add(job)
+        await self.orm.commit()
+        await self.orm.refresh(job)
+
+        return job
+
+    async def advance(self, job: ImportJob, rows: int) -> None:
+        """
+        This method moves the job past a chunk of rows. The change is
+        left for the caller to commit along with the chunk itself.
+        """
+
+        job.rows_committed += rows
+        job.chunks_committed += 1
+        await self.orm.flush()
+
+    async def finish(
+        self, job: ImportJob, status: str, error: str = None
+    ) -> ImportJob:
+        """This method records the final status of an import job."""
+
+        job.status = status
+        job.error = error
+        await self.orm.commit()
+        await self.orm.refresh(job)
+
+        return job
+
+
+import_jobs_orm = ImportJobORM()
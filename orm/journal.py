@@ -0,0 +1,173 @@
+# Stdlib Imports
+import datetime
+from typing import List, Optional, Tuple
+
+# SQLAlchemy Imports
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.engine import Row
+
+# Own Imports
+from orm.base import ORMSessionMixin
+from models.ledger import Entry, Transaction, TransactionType
+
+
+# A journal leg is a (wallet id, signed amount) pair, where a wallet id
+# of `None` stands for the external side of the movement.
+Leg = Tuple[Optional[int], int]
+
+
+class JournalORM(ORMSessionMixin):
+    """
+    Append-only journal of money movement.
+
+    Entries are written in the caller's transaction and are never
+    committed here, so they land atomically with the balance changes
+    they describe.
+    """
+
+    async def record(
+        self, transaction_type: TransactionType, legs: List[Leg]
+    ) -> int:
+        """
+        This method writes a balanced transaction and its entries,
+        and returns the id of the journal transaction.
+
+        :param transaction_type: The kind of money movement
+        :type transaction_type: TransactionType
+
+        :param legs: The (wallet id, signed amount) pairs of the movement
+        :type legs: List[Leg]
+
+        :return: The journal transaction id.
+        """
+
+        transaction_ids = await self.record_many(transaction_type, [legs])
+        return transaction_ids[0]
+
+    async def record_many(
+        self, transaction_type: TransactionType, movements: List[List[Leg]]
+    ) -> List[int]:
+        """
+        This method writes a batch of balanced transactions of the same
+        type, with all their entries inserted in a single statement.
+
+        :param transaction_type: The kind of money movement
+        :type transaction_type: TransactionType
+
+        :param movements: The legs of every transaction to record
+        :type movements: List[List[Leg]]
+
+        :return: The journal transaction ids, in the order given.
+        """
+
+        if any(sum(amount for _, amount in legs) for legs in movements):
+            raise ValueError("Journal entries must balance to zero.")
+        if not movements:
+            return []
+
+        now = datetime.datetime.now()
+        row = {
+            "type": TransactionType(transaction_type).value,
+            "created_at": now,
+        }
+
+        if self.orm.get_bind().dialect.full_returning:
+            # ids come from a sequence, so they follow the order of the rows
+            inserted = await self.orm.execute(
+                insert(Transaction)
+                .values([row] * len(movements))
+                .returning(Transaction.id)
+            )
+            transaction_ids = sorted(inserted.scalars())
+        else:
+            transaction_ids = []
+            for _ in movements:
+                inserted = await self.orm.execute(
+                    insert(Transaction).values(row)
+                )
+                transaction_ids.append(inserted.inserted_primary_key[0])
+
+        await self.orm.execute(
+            insert(Entry),
+            [
+                {
+                    "transaction_id": transaction_id,
+                    "wallet_id": wallet_id,
+                    "amount": amount,
+                    "created_at": now,
+                }
+                for transaction_id, legs in zip(transaction_ids, movements)
+                for wallet_id, amount in legs
+            ],
+        )
+        return transaction_ids
+
+    async def history(
+        self,
+        wallet_id: int,
+        limit: int,
+        before: Optional[Tuple[datetime.datetime, int]] = None,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        types: Optional[List[TransactionType]] = None,
+    ) -> List[Row]:
+        """
+        This method returns a page of the entries of a wallet, newest
+        first. Pages start after the last seen (creation time, entry id)
+        pair, so with the (wallet_id, created_at, id) index every page
+        costs the same however long the history is.
+
+        :param wallet_id: The id of the wallet
+        :type wallet_id: int
+
+        :param limit: The number of entries in the page
+        :type limit: int
+
+        :param before: The (creation time, id) of the last seen entry
+        :type before: Optional[Tuple[datetime.datetime, int]]
+
+        :param start: The earliest creation time, unbounded when None
+        :type start: Optional[datetime.datetime]
+
+        :param end: The creation time to stop at, unbounded when None
+        :type end: Optional[datetime.datetime]
+
+        :param types: The kinds of movement to keep, all when None
+        :type types: Optional[List[TransactionType]]
+
+        :return: The entries with the type of their transaction.
+        """
+
+        entries = (
+            select(
+                Entry.id,
+                Entry.transaction_id,
+                Transaction.type,
+                Entry.amount,
+                Entry.created_at,
+            )
+            .join(Transaction, Transaction.id == Entry.transaction_id)
+            .where(Entry.wallet_id == wallet_id)
+            .order_by(Entry.created_at.desc(), Entry.id.desc())
+            .limit(limit)
+        )
+        if before is not None:
+            entries = entries.where(
+                tuple_(Entry.created_at, Entry.id) < tuple_(*before)
+            )
+        if start is not None:
+            entries = entries.where(Entry.created_at >= start)
+        if end is not None:
+            entries = entries.where(Entry.created_at < end)
+        if types:
+            entries = entries.where(
+                Transaction.type.in_(
+                    [TransactionType(kind).value for kind in types]
+                )
+            )
+
+        entries = await self.read(entries)
+        return entries.all()
+
+
+journal_orm = JournalORM()
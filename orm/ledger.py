@@ -1,13 +1,108 @@
 # Stdlib Imports
-from typing import List
+import time
+import datetime
+import random
+from collections import defaultdict
+from typing import Dict, List, Optional
 
 # FastAPI Imports
 from fastapi import HTTPException
 
+# SQLAlchemy Imports
+from sqlalchemy import (
+    Integer,
+    bindparam,
+    case,
+    column,
+    delete,
+    exists,
+    func,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.sql import Select
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+
 # Own Imports
 from orm.base import ORMSessionMixin
+from orm.journal import journal_orm
+from core.settings import ledger_settings
 from schemas.ledger import WalletCreate
-from models.ledger import Wallet as Userwallet
+from models.user import User
+from models.ledger import (
+    Entry,
+    TransactionType,
+    Wallet as Userwallet,
+    WalletStripe,
+)
+
+
+# The balance of a wallet: its own amount, plus the amount held in its
+# stripes when the wallet is striped.
+wallet_balance = case(
+    (
+        Userwallet.stripes > 1,
+        Userwallet.amount
+        + select(func.coalesce(func.sum(WalletStripe.amount), 0))
+        .where(WalletStripe.wallet_id == Userwallet.id)
+        .scalar_subquery(),
+    ),
+    else_=Userwallet.amount,
+)
+
+# The total balance of a user: the total kept up to date on the user
+# row, plus the amount held in the stripes of their striped wallets.
+# The wallets are aliased, so a query that also joins the wallets of
+# the user still sums the stripes of all of them.
+_striped_wallet = aliased(Userwallet)
+user_balance = (
+    User.balance
+    + select(func.coalesce(func.sum(WalletStripe.amount), 0))
+    .join(_striped_wallet, _striped_wallet.id == WalletStripe.wallet_id)
+    .where(_striped_wallet.user == User.id)
+    .scalar_subquery()
+)
+
+
+class StripeRegistry:
+    """
+    In-process map of the striped wallets (wallet id -> stripe count),
+    reloaded every `refresh_interval` seconds. A stale map only sends
+    writes to the wallet row itself, which is always correct.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._stripes: Dict[int, int] = {}
+        self._loaded_at: Optional[float] = None
+
+    async def stripes(self, db: AsyncSession, wallet_id: int) -> int:
+        """This method returns the stripe count of a wallet."""
+
+        now = time.monotonic()
+        if (
+            self._loaded_at is None
+            or now - self._loaded_at > self.refresh_interval
+        ):
+            striped = await db.execute(
+                select(Userwallet.id, Userwallet.stripes).where(
+                    Userwallet.stripes > 1
+                )
+            )
+            self._stripes = dict(striped.all())
+            self._loaded_at = now
+
+        return self._stripes.get(wallet_id, 1)
+
+    def set(self, wallet_id: int, stripes: int) -> None:
+        """This method records a newly striped wallet."""
+
+        self._stripes[wallet_id] = stripes
+
+
+striped_wallets = StripeRegistry(ledger_settings.STRIPE_REGISTRY_REFRESH)
 
 
 class BaseLedgerORM(ORMSessionMixin):
@@ -19,10 +114,27 @@ class BaseLedgerORM(ORMSessionMixin):
     def partial_list(self):
         """This method partially retrieves a list of the user wallets."""
 
-        wallets = self.orm.query(Userwallet)
+        wallets = select(Userwallet)
+        return wallets
+
+    def partial_balances(self):
+        """
+        This method partially retrieves a list of the user wallets,
+        with the balance of striped wallets as their amount.
+        """
+
+        wallets = select(
+            Userwallet.id,
+            Userwallet.user,
+            Userwallet.title,
+            wallet_balance.label("amount"),
+            Userwallet.stripes,
+            Userwallet.created_at,
+            Userwallet.updated_at,
+        )
         return wallets
 
-    def partial_filter(self, values: dict[str, int]):
+    async def partial_filter(self, values: dict[str, int]):
         """
         This method partially retrieves a user wallet
         and locks the row for update.
@@ -32,15 +144,15 @@ class BaseLedgerORM(ORMSessionMixin):
             - user_id: int
         """
 
-        wallet = (
+        wallet = await self.orm.execute(
             self.partial_list()
             .filter(
                 Userwallet.id == values["wallet_id"],
                 Userwallet.user == values["user_id"],
             )
             .with_for_update()
-            .first()
         )
+        wallet = wallet.scalars().first()
 
         if wallet is None:
             raise HTTPException(
@@ -51,6 +163,320 @@ class BaseLedgerORM(ORMSessionMixin):
             )
         return wallet
 
+    async def lock_wallets(self, wallet_ids: List[int]) -> Dict[int, Userwallet]:
+        """
+        This method locks a set of user wallets for update with a single
+        statement. Rows are locked in ascending id order, so concurrent
+        callers locking overlapping wallets can not deadlock each other.
+
+        :param wallet_ids: The ids of the wallets to lock
+        :type wallet_ids: List[int]
+
+        :return: The locked wallets keyed by their id.
+        """
+
+        wallets = await self.orm.execute(
+            self.partial_list()
+            .filter(Userwallet.id.in_(sorted(set(wallet_ids))))
+            .order_by(Userwallet.id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return {wallet.id: wallet for wallet in wallets.scalars()}
+
+    async def adjust_balance(
+        self,
+        wallet_id: int,
+        user_id: int,
+        amount: int,
+        overdraft_guard: bool = False,
+    ) -> Optional[int]:
+        """
+        This method adds the (signed) amount to a user wallet, and to the
+        user total, with a single conditional `UPDATE` and returns the new
+        balance. The rows are only locked for the duration of the statement
+        and the change is left for the caller to commit.
+
+        Striped wallets are credited (and debited, when one stripe holds
+        enough) on a random stripe, leaving the user total alone; a debit
+        larger than any one stripe borrows across all of them.
+
+        :param wallet_id: The id of the wallet to credit or debit
+        :type wallet_id: int
+
+        :param user_id: The id of the wallet owner
+        :type user_id: int
+
+        :param amount: The amount to add, negative for a debit
+        :type amount: int
+
+        :param overdraft_guard: Refuse to take the balance below zero
+        :type overdraft_guard: bool
+
+        :return: The new balance, or None for a striped wallet.
+        """
+
+        stripes = await striped_wallets.stripes(self.orm, wallet_id)
+        if stripes > 1 and await self._adjust_stripe(
+            wallet_id,
+            user_id,
+            random.randrange(stripes),
+            amount,
+            overdraft_guard,
+        ):
+            return None
+
+        condition = (Userwallet.id == wallet_id) & (Userwallet.user == user_id)
+        statement = (
+            update(Userwallet)
+            .where(condition)
+            .values(amount=Userwallet.amount + amount)
+        )
+        if overdraft_guard:
+            statement = statement.where(Userwallet.amount >= -amount)
+
+        if self.orm.get_bind().dialect.full_returning:
+            # one round trip: the wallet update, the user total update
+            # and the wallet lookup run in the same statement
+            updated = statement.returning(Userwallet.amount).cte("updated")
+            totals = (
+                update(User)
+                .where(
+                    User.id == user_id,
+                    select(updated.c.amount).exists(),
+                )
+                .values(
+                    balance=User.balance + amount,
+                    # named apart from the wallet `updated_at`
+                    updated_at=bindparam(
+                        "user_updated_at", datetime.datetime.now()
+                    ),
+                )
+                .returning(User.id)
+                .cte("totals")
+            )
+            balance, stripes, _ = (
+                await self.orm.execute(
+                    select(
+                        select(updated.c.amount).scalar_subquery(),
+                        select(Userwallet.stripes)
+                        .where(condition)
+                        .scalar_subquery(),
+                        select(totals.c.id).scalar_subquery(),
+                    )
+                )
+            ).one()
+        elif (await self.orm.execute(statement)).rowcount:
+            await self.adjust_totals({user_id: amount})
+
+            # backends without UPDATE .. RETURNING (SQLite) read the
+            # balance back, the row is already write locked
+            balance, stripes = (
+                await self.orm.execute(
+                    select(Userwallet.amount, Userwallet.stripes).where(
+                        condition
+                    )
+                )
+            ).one()
+        else:
+            balance = None
+            stripes = await self.orm.scalar(
+                select(Userwallet.stripes).where(condition)
+            )
+
+        if stripes is None:
+            raise HTTPException(
+                404, {"message": f"Wallet ID:{wallet_id} does not exist!"}
+            )
+        if balance is None and stripes > 1:
+            return await self.borrow(wallet_id, user_id, -amount)
+        if balance is None:
+            raise HTTPException(
+                400,
+                {"message": f"Insufficient funds in wallet ID:{wallet_id}!"},
+            )
+        return balance if stripes == 1 else None
+
+    async def _adjust_stripe(
+        self,
+        wallet_id: int,
+        user_id: int,
+        stripe: int,
+        amount: int,
+        overdraft_guard: bool,
+    ) -> bool:
+        """
+        This method adds the (signed) amount to one stripe of a wallet,
+        without touching the wallet or the user row.
+
+        :return: True if the stripe was updated.
+        """
+
+        statement = (
+            update(WalletStripe)
+            .where(
+                WalletStripe.wallet_id == wallet_id,
+                WalletStripe.stripe == stripe,
+                select(Userwallet.id)
+                .where(Userwallet.id == wallet_id, Userwallet.user == user_id)
+                .exists(),
+            )
+            .values(amount=WalletStripe.amount + amount)
+            .execution_options(synchronize_session=False)
+        )
+        if overdraft_guard:
+            statement = statement.where(WalletStripe.amount >= -amount)
+
+        # the stripes are left out of the owner total (see `User.balance`),
+        # so writers to a striped wallet do not queue on the user row
+        return (await self.orm.execute(statement)).rowcount == 1
+
+    async def borrow(self, wallet_id: int, user_id: int, amount: int) -> None:
+        """
+        This method debits a striped wallet across its stripes. The wallet
+        and its stripes are locked, in that order, and drained one after
+        the other until the amount is covered.
+
+        :param wallet_id: The id of the wallet to debit
+        :type wallet_id: int
+
+        :param user_id: The id of the wallet owner
+        :type user_id: int
+
+        :param amount: The (positive) amount to debit
+        :type amount: int
+        """
+
+        wallet = (await self.lock_wallets([wallet_id]))[wallet_id]
+        balance = wallet.amount
+        stripes = await self.orm.execute(
+            select(WalletStripe)
+            .filter(WalletStripe.wallet_id == wallet_id)
+            .order_by(WalletStripe.stripe)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        stripes = stripes.scalars().all()
+
+        if wallet.amount + sum(stripe.amount for stripe in stripes) < amount:
+            raise HTTPException(
+                400,
+                {"message": f"Insufficient funds in wallet ID:{wallet_id}!"},
+            )
+
+        for holder in [*stripes, wallet]:
+            taken = min(max(holder.amount, 0), amount)
+            holder.amount -= taken
+            amount -= taken
+
+        await self.orm.flush()
+        # only what was taken from the wallet row is part of the total
+        await self.adjust_totals({user_id: wallet.amount - balance})
+
+    async def lock_balances(self, wallets: Dict[int, Userwallet]) -> Dict[int, int]:
+        """
+        This method locks the stripes of the striped wallets among a set of
+        locked wallets, and returns the balance of every wallet.
+
+        :param wallets: Wallets locked with `lock_wallets`
+        :type wallets: Dict[int, Userwallet]
+
+        :return: The balance of the wallets keyed by their id.
+        """
+
+        balances = {
+            wallet_id: wallet.amount for wallet_id, wallet in wallets.items()
+        }
+
+        striped = sorted(
+            wallet_id
+            for wallet_id, wallet in wallets.items()
+            if wallet.stripes > 1
+        )
+        if striped:
+            stripes = await self.orm.execute(
+                select(WalletStripe.wallet_id, WalletStripe.amount)
+                .filter(WalletStripe.wallet_id.in_(striped))
+                .order_by(WalletStripe.wallet_id, WalletStripe.stripe)
+                .with_for_update()
+            )
+            for wallet_id, amount in stripes.all():
+                balances[wallet_id] += amount
+
+        return balances
+
+    async def adjust_totals(self, deltas: Dict[int, int]) -> None:
+        """
+        This method adds a (signed) amount to the total balance of many
+        users. Rows are updated in ascending id order, so concurrent
+        callers can not deadlock each other on them.
+
+        :param deltas: The amount to add, keyed by user id
+        :type deltas: Dict[int, int]
+        """
+
+        deltas = sorted(
+            (user_id, delta) for user_id, delta in deltas.items() if delta
+        )
+        if not deltas:
+            return
+
+        await self.orm.execute(
+            update(User)
+            .where(User.id == bindparam("user_id"))
+            .values(balance=User.balance + bindparam("delta"))
+            .execution_options(synchronize_session=False),
+            [{"user_id": user_id, "delta": delta} for user_id, delta in deltas],
+        )
+
+    async def apply_deltas(
+        self, deltas: Dict[int, int], wallets: Dict[int, Userwallet]
+    ) -> None:
+        """
+        This method adds a (signed) amount to many wallets at once, with
+        a single set-based `UPDATE .. FROM (VALUES ..)` where supported,
+        and updates the totals of their owners. Callers are expected to
+        hold the row locks and to have checked the balances already.
+
+        :param deltas: The amount to add, keyed by wallet id
+        :type deltas: Dict[int, int]
+
+        :param wallets: The locked wallets, keyed by their id
+        :type wallets: Dict[int, Userwallet]
+        """
+
+        totals = defaultdict(int)
+        for wallet_id, delta in deltas.items():
+            totals[wallets[wallet_id].user] += delta
+        await self.adjust_totals(totals)
+
+        deltas = {
+            wallet_id: delta for wallet_id, delta in deltas.items() if delta
+        }
+        if not deltas:
+            return
+
+        if self.orm.get_bind().dialect.name == "postgresql":
+            changes = values(
+                column("id", Integer), column("delta", Integer), name="deltas"
+            ).data(sorted(deltas.items()))
+            await self.orm.execute(
+                update(Userwallet)
+                .where(Userwallet.id == changes.c.id)
+                .values(amount=Userwallet.amount + changes.c.delta)
+            )
+        else:
+            # SQLite can not name the columns of a VALUES list
+            await self.orm.execute(
+                update(Userwallet)
+                .where(Userwallet.id == bindparam("wallet_id"))
+                .values(amount=Userwallet.amount + bindparam("delta")),
+                [
+                    {"wallet_id": wallet_id, "delta": delta}
+                    for wallet_id, delta in sorted(deltas.items())
+                ],
+            )
+
 
 class LedgerORM(BaseLedgerORM):
     """CRUD Operations for the ledger to interact with the database."""
@@ -58,25 +484,38 @@ class LedgerORM(BaseLedgerORM):
     async def get(self, user_id: int, wallet_id: int) -> Userwallet:
         """This method retrives a wallet by its id and user/owner id."""
 
-        wallet = (
-            self.partial_list()
+        wallet = await self.read(
+            self.partial_balances()
             .join(Userwallet.owner)
             .filter(Userwallet.user == user_id)
             .filter(Userwallet.id == wallet_id)
-            .first()
         )
-        return wallet
+        return wallet.first()
 
-    async def list(self, skip: int, limit: int) -> List[Userwallet]:
-        """This method retrieves all the wallets in the database."""
+    async def owner(self, wallet_id: int) -> Optional[int]:
+        """
+        This method returns the id of the owner of a wallet,
+        None if there is no such wallet.
+        """
 
-        wallets = (
-            self.partial_list()
-            .offset(self.skip if skip is None else skip)
-            .limit(self.limit if limit is None else limit)
-            .all()
+        owner = await self.read(
+            select(Userwallet.user).filter(Userwallet.id == wallet_id)
         )
-        return wallets
+        return owner.scalar()
+
+    async def list(
+        self, skip: int, limit: int, after: Optional[int] = None
+    ) -> List[Userwallet]:
+        """
+        This method retrieves all the wallets in the database, in id
+        order. Pages either start after the last seen wallet id (keyset)
+        or skip a number of wallets (offset).
+        """
+
+        wallets = await self.orm.execute(
+            self.paginate(self.partial_balances(), skip, limit, after)
+        )
+        return wallets.all()
 
     async def filter(self, **kwargs) -> List[Userwallet]:
         """
@@ -84,27 +523,87 @@ class LedgerORM(BaseLedgerORM):
 
         - the offset (default is 0)
         - the limit (default is 10)
+        - the last seen wallet id (keyset pagination, overrides the offset)
         - the wallet owner/user id
         """
 
-        wallets = (
-            self.partial_list()
-            .join(Userwallet.owner)
-            .filter(Userwallet.user == kwargs["user_id"])
-            .offset(self.skip if kwargs["skip"] is None else kwargs["skip"])
-            .limit(self.limit if kwargs["limit"] is None else kwargs["limit"])
-            .all()
+        wallets = await self.read(
+            self.paginate(
+                self.partial_balances()
+                .join(Userwallet.owner)
+                .filter(Userwallet.user == kwargs["user_id"]),
+                kwargs["skip"],
+                kwargs["limit"],
+                kwargs.get("after"),
+            )
         )
-        return wallets
+        return wallets.all()
+
+    def paginate(
+        self,
+        statement: Select,
+        skip: Optional[int],
+        limit: Optional[int],
+        after: Optional[int] = None,
+    ) -> Select:
+        """
+        This method orders a wallet query by id and limits it to a page,
+        starting after a wallet id when one is given: deep pages then
+        cost as much as the first one.
+        """
+
+        statement = statement.order_by(Userwallet.id).limit(
+            10 if limit is None else limit
+        )
+        if after is not None:
+            return statement.filter(Userwallet.id > after)
+        return statement.offset(skip or 0)
 
     async def create(self, wallet: WalletCreate) -> Userwallet:
-        """This method creates a new wallet."""
+        """
+        This method creates a new wallet, once a wallet of the owner's
+        limit has been claimed: the conditional update of the counter
+        locks the user row, so concurrent creates can not overshoot it.
+        """
+
+        claimed = await self.orm.execute(
+            update(User)
+            .where(
+                User.id == wallet.user,
+                User.wallet_count < ledger_settings.WALLET_LIMIT,
+            )
+            .values(wallet_count=User.wallet_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if not claimed.rowcount:
+            await self.orm.rollback()
+            if await self.orm.get(User, wallet.user) is None:
+                raise HTTPException(404, {"message": "User does not exist!"})
+            raise HTTPException(
+                400,
+                {
+                    "message": "User can only have "
+                    f"{ledger_settings.WALLET_LIMIT} wallets!"
+                },
+            )
 
         user_wallet = Userwallet(**wallet.dict())
 
         self.orm.add(user_wallet)
-        self.orm.commit()
-        self.orm.refresh(user_wallet)
+        await self.orm.flush()
+
+        # journal the opening balance so the wallet can be replayed
+        if user_wallet.amount:
+            await self.adjust_totals({user_wallet.user: user_wallet.amount})
+            await journal_orm.record(
+                TransactionType.DEPOSIT,
+                [
+                    (user_wallet.id, user_wallet.amount),
+                    (None, -user_wallet.amount),
+                ],
+            )
+        await self.orm.commit()
+        await self.orm.refresh(user_wallet)
 
         return user_wallet
 
@@ -120,25 +619,78 @@ class LedgerORM(BaseLedgerORM):
 
         # solution 2
         # locks row for this particular wallet
-        wallet = (
-            self.partial_list()
-            .filter_by(id=wallet_id)
-            .with_for_update()
-            .update(kwargs)
+        await self.orm.execute(
+            update(Userwallet).filter_by(id=wallet_id).values(**kwargs)
         )
+        wallet = await self.orm.get(Userwallet, wallet_id)
 
-        self.orm.commit()
-        self.orm.refresh(wallet)
+        await self.orm.commit()
+        await self.orm.refresh(wallet)
 
         return wallet
 
+    async def stripe(self, wallet_id: int, stripes: int) -> Userwallet:
+        """
+        This method splits the balance updates of a hot wallet across
+        `stripes` rows. The stripe count of a wallet is never reduced.
+        """
+
+        wallet = (await self.lock_wallets([wallet_id])).get(wallet_id)
+        if wallet is None:
+            raise HTTPException(
+                404, {"message": f"Wallet ID:{wallet_id} does not exist!"}
+            )
+
+        for stripe in range(wallet.stripes if wallet.stripes > 1 else 0, stripes):
+            self.orm.add(WalletStripe(wallet_id=wallet_id, stripe=stripe))
+        wallet.stripes = max(wallet.stripes, stripes)
+
+        await self.orm.commit()
+        striped_wallets.set(wallet_id, wallet.stripes)
+
+        wallet = await self.orm.execute(
+            self.partial_balances().filter(Userwallet.id == wallet_id)
+        )
+        return wallet.one()
+
     async def delete(self, wallet_id: int) -> bool:
-        """This method deletes a wallet."""
+        """
+        This method deletes a wallet. A wallet with journal entries or
+        stripes is refused, the journal has to keep its history.
+        """
 
-        self.orm.query(Userwallet).filter_by(
-            Userwallet.id == wallet_id
-        ).delete()
-        self.orm.commit()
+        wallets = await self.lock_wallets([wallet_id])
+        referenced = await self.orm.scalar(
+            select(
+                exists().where(Entry.wallet_id == wallet_id)
+                | exists().where(WalletStripe.wallet_id == wallet_id)
+            )
+        )
+        if referenced:
+            await self.orm.rollback()
+            raise HTTPException(
+                400,
+                {
+                    "message": f"Wallet ID:{wallet_id} has entries "
+                    "or stripes, it can not be deleted!"
+                },
+            )
+
+        await self.adjust_totals(
+            {wallet.user: -wallet.amount for wallet in wallets.values()}
+        )
+
+        for wallet in wallets.values():
+            await self.orm.execute(
+                update(User)
+                .where(User.id == wallet.user)
+                .values(wallet_count=User.wallet_count - 1)
+                .execution_options(synchronize_session=False)
+            )
+        await self.orm.execute(
+            delete(Userwallet).where(Userwallet.id == wallet_id)
+        )
+        await self.orm.commit()
 
         return True
 
@@ -0,0 +1,84 @@
+# Stdlib Imports
+import datetime
+from typing import List, Optional
+
+# SQLAlchemy Imports
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.exc import IntegrityError
+
+# Own Imports
+from orm.base import ORMSessionMixin
+from models.user import RevokedToken
+
+
+class RevokedTokenORM(ORMSessionMixin):
+    """
+    CRUD Operations for the revoked tokens. Lookups run on the primary,
+    a replica lagging behind would miss the latest revocations.
+    """
+
+    async def add(
+        self, jti: str, user_id: int, expires_at: datetime.datetime
+    ) -> bool:
+        """
+        This method records a revoked token, once.
+
+        :return: True if the token was recorded, False if it was
+        revoked already.
+        """
+
+        try:
+            await self.orm.execute(
+                insert(RevokedToken).values(
+                    jti=jti,
+                    user_id=user_id,
+                    expires_at=expires_at,
+                    created_at=datetime.datetime.now(),
+                )
+            )
+            await self.orm.commit()
+        except IntegrityError:
+            # revoked already
+            await self.orm.rollback()
+            return False
+        return True
+
+    async def exists(self, jti: str) -> bool:
+        """This method checks if a token was revoked."""
+
+        return await self.orm.scalar(
+            select(exists().where(RevokedToken.jti == jti))
+        )
+
+    async def list_ids(
+        self, created_after: Optional[datetime.datetime] = None
+    ) -> List[str]:
+        """
+        This method returns the ids of the revoked tokens that have not
+        expired, only those revoked after the given time if any.
+        """
+
+        revoked = select(RevokedToken.jti).where(
+            RevokedToken.expires_at > datetime.datetime.now()
+        )
+        if created_after is not None:
+            revoked = revoked.where(RevokedToken.created_at >= created_after)
+
+        revoked = await self.orm.execute(revoked)
+        await self.orm.commit()
+        return revoked.scalars().all()
+
+    async def purge_expired(self) -> int:
+        """This method deletes the expired tokens, and returns their count."""
+
+        purged = await self.orm.execute(
+            delete(RevokedToken)
+            .where(RevokedToken.expires_at <= datetime.datetime.now())
+            .execution_options(synchronize_session=False)
+        )
+        await self.orm.commit()
+
+        return purged.rowcount
+
+
+revoked_tokens_orm = RevokedTokenORM()
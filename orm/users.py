@@ -1,12 +1,13 @@
 # Stdlib Imports
-from typing import List
+from typing import Dict, List, Optional
 
 # SQLAlchemy Imports
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload, selectinload
 
 # Own Imports
 from models.user import User
-from schemas.user import UserCreate
+from schemas.user import Principal, UserCreate
 from orm.base import ORMSessionMixin
 
 
@@ -14,7 +15,7 @@ class BaseUsersORM(ORMSessionMixin):
     def partial_list(self):
         """This method partially retrieves a list of users."""
 
-        return self.orm.query(User)
+        return select(User)
 
 
 class UsersORM(BaseUsersORM):
@@ -23,35 +24,64 @@ class UsersORM(BaseUsersORM):
     async def get(self, user_id: int) -> User:
         """This method gets a user from the database."""
 
-        user = (
+        user = await self.read(
             self.partial_list()
             .options(joinedload(User.wallets))
             .filter(User.id == user_id)
-            .first()
         )
-        return user
+        return user.unique().scalars().first()
+
+    async def get_principal(self, user_id: int) -> Optional[Principal]:
+        """
+        This method gets the fields of a user that authentication needs,
+        without its wallets.
+        """
+
+        user = await self.read(
+            select(
+                User.id, User.is_active, User.is_admin, User.token_version
+            ).filter(User.id == user_id)
+        )
+        user = user.first()
+        return None if user is None else Principal.from_orm(user)
 
     async def get_email(self, user_email: str) -> User:
         """This method gets a user based on their email from the database."""
 
-        user = (
+        user = await self.orm.execute(
             self.partial_list()
             .options(joinedload(User.wallets))
             .filter(User.email == user_email)
-            .first()
-        )
-        return user
-
-    async def list(self, skip: int, limit: int) -> List[User]:
-        """This method gets all the users from the database."""
-
-        return (
-            self.partial_list()
-            .options(joinedload(User.wallets))
-            .offset(skip)
-            .limit(limit)
-            .all()
         )
+        return user.unique().scalars().first()
+
+    async def list(
+        self,
+        skip: int,
+        limit: int,
+        after: Optional[int] = None,
+        include_wallets: bool = False,
+    ) -> List[User]:
+        """
+        This method gets all the users from the database, in id order.
+        Pages either start after the last seen user id (keyset)
+        or skip a number of users (offset).
+
+        The wallets of the page are only loaded when asked for, with a
+        single `IN` query once the users are paged: joining them in
+        would make the limit count wallets rather than users.
+        """
+
+        users = self.partial_list().order_by(User.id).limit(limit)
+        if after is not None:
+            users = users.filter(User.id > after)
+        else:
+            users = users.offset(skip)
+        if include_wallets:
+            users = users.options(selectinload(User.wallets))
+
+        users = await self.read(users)
+        return users.scalars().all()
 
     async def create(self, user: UserCreate, password: str) -> User:
         """This method creates a new user."""
@@ -59,10 +89,10 @@ class UsersORM(BaseUsersORM):
         user = User(name=user.name, email=user.email, password=password)
 
         self.orm.add(user)
-        self.orm.commit()
-        self.orm.refresh(user)
+        await self.orm.commit()
 
-        return user
+        # reload the user along with its (empty) list of wallets
+        return await self.get(user.id)
 
     async def create_admin(
         self, name: str, email: str, password, is_admin: bool
@@ -74,10 +104,67 @@ class UsersORM(BaseUsersORM):
         )
 
         self.orm.add(user)
-        self.orm.commit()
-        self.orm.refresh(user)
+        await self.orm.commit()
+
+        # reload the user along with its (empty) list of wallets
+        return await self.get(user.id)
+
+    async def update(self, user_id: int, **values) -> Optional[int]:
+        """
+        This method updates the given columns of a user. A change of
+        role or active status also increments the token version, so
+        the tokens issued before can not be used anymore.
 
-        return user
+        :return: The new token version if it was incremented, else None.
+        """
+
+        revoke = "is_admin" in values or "is_active" in values
+        if revoke:
+            values["token_version"] = User.token_version + 1
+
+        await self.orm.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        version = None
+        if revoke:
+            version = await self.orm.scalar(
+                select(User.token_version).where(User.id == user_id)
+            )
+        await self.orm.commit()
+        return version
+
+    async def bump_token_version(self, user_id: int) -> Optional[int]:
+        """
+        This method increments the token version of a user, which
+        revokes every token issued before, and returns the new version.
+        """
+
+        await self.orm.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(token_version=User.token_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        version = await self.orm.scalar(
+            select(User.token_version).where(User.id == user_id)
+        )
+        await self.orm.commit()
+        return version
+
+    async def token_versions(self) -> Dict[int, int]:
+        """
+        This method returns the token version of every user whose
+        tokens were revoked, read from the primary.
+        """
+
+        versions = await self.orm.execute(
+            select(User.id, User.token_version).where(User.token_version > 0)
+        )
+        await self.orm.commit()
+        return dict(versions.all())
 
 
 users_orm = UsersORM()
@@ -5,3 +5,7 @@ from pydantic import BaseModel, EmailStr
 class UserLoginSchema(BaseModel):
     email: EmailStr
     password: str
+
+
+class RefreshTokenSchema(BaseModel):
+    refresh_token: str
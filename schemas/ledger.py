@@ -1,15 +1,9 @@
-# Pydantic Imports
-from pydantic import BaseModel, validator
-
-# FastAPI & SQLAlchemy Imports
-from fastapi import HTTPException
-from sqlalchemy.orm import Session
-
-# Core Imports
-from config.database import SessionLocal
+# Stdlib Imports
+import datetime
+from typing import Optional
 
-# Models Imports
-from models.ledger import Wallet as UserWallet
+# Pydantic Imports
+from pydantic import BaseModel
 
 
 class WalletBase(BaseModel):
@@ -20,34 +14,6 @@ class WalletBase(BaseModel):
 class WalletCreate(WalletBase):
     title: str
 
-    @validator("user", pre=True)
-    def ensure_user_can_only_have_one_wallet(cls, value: int):
-        """
-        Validation to ensure that the user can only have 10 wallets,
-        otherwise; raise an error. `@validator("user", pre=True)` means
-        that it will be called before the `user` field is validated
-
-        :param cls: The class of the model that is being validated
-
-        :param value: The value of the field being validated
-        :type value: int
-
-        :return: The value of the user_wallet_counts
-        """
-        db: Session = SessionLocal()
-        user_wallet_counts = (
-            db.query(UserWallet)
-            .join(UserWallet.owner)
-            .filter(UserWallet.user == value)
-            .count()
-        )
-
-        if user_wallet_counts == 10:
-            raise HTTPException(
-                400, {"message": "User can only have ten wallet!"}
-            )
-        return value
-
 
 class WalletDeposit(WalletBase):
     id: int
@@ -76,6 +42,24 @@ class Wallet2UserWalletTransfer(Wallet2WalletTransfer):
     user_to: int
 
 
+class TransferResult(BaseModel):
+    index: int
+    status: str
+    message: str
+
+
+class ImportJob(BaseModel):
+    id: int
+    format: str
+    status: str
+    rows_committed: int
+    chunks_committed: int
+    error: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
 class Wallet(WalletBase):
     id: int
     title: str
@@ -85,3 +69,14 @@ class Wallet(WalletBase):
         # model from your path operation,
         # it wouldn't include the relationship data
         orm_mode = True
+
+
+class WalletTransaction(BaseModel):
+    id: int
+    transaction_id: int
+    type: str
+    amount: int
+    created_at: datetime.datetime
+
+    class Config:
+        orm_mode = True
@@ -11,11 +11,41 @@ class UserCreate(UserBase):
     password: str
 
 
-class User(UserBase):
+class UserSummary(UserBase):
     id: int
     is_active: bool
     is_admin: bool
+
+    class Config:
+        orm_mode = True
+
+
+class User(UserSummary):
     wallets: list[Wallet] = []
 
+
+class Principal(BaseModel):
+    """The authenticated user, as much of it as most endpoints need."""
+
+    id: int
+    is_active: bool
+    is_admin: bool
+    token_version: int
+
     class Config:
         orm_mode = True
+        allow_mutation = False
+
+    @classmethod
+    def from_claims(cls, claims: dict) -> "Principal":
+        """
+        This method reads the principal off the claims of an access
+        token, tokens are only issued to active users.
+        """
+
+        return cls(
+            id=int(claims["sub"]),
+            is_active=True,
+            is_admin=claims["role"] == "admin",
+            token_version=claims["ver"],
+        )
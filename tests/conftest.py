@@ -4,10 +4,16 @@ import os
 
 # SQLAlchemy Impprts
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_scoped_session,
+    create_async_engine,
+)
 
 # Own Imports
 from models.user import Base
+from config.database import current_scope
 
 
 # this is to include backend dir in sys.path
@@ -21,9 +27,19 @@ engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 
+async_engine = create_async_engine(
+    "sqlite+aiosqlite:///./test_db.sqlite",
+    connect_args={"check_same_thread": False},
+)
+
 # Use connect_args parameter only with sqlite
-session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-SessionTesting = scoped_session(session_factory)
+session_factory = sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+SessionTesting = async_scoped_session(session_factory, scopefunc=current_scope)
 
 
 def create_tables():
@@ -35,17 +51,3 @@ def create_tables():
     Base.metadata.create_all(engine)
     yield
     Base.metadata.drop_all(engine)
-
-
-def _get_test_db():
-
-    # Call method to create tables
-    create_tables()
-
-    session = SessionTesting()
-    try:
-        yield session
-    except Exception:
-        session.rollback()
-    finally:
-        session.close()
@@ -0,0 +1,354 @@
+# Stdlib Imports
+import csv
+import gzip
+import json
+import random
+import sqlite3
+import string
+
+# Own Imports
+from orm.users import users_orm
+from core.metrics import metrics
+from config.database import ObservedQueuePool, SQLALCHEMY_DATABASE_URL
+from config.replicas import ReplicaRouter, request_user
+from ledger.services.balances import BalanceCache
+from core.cache import LRUCache
+from orm.ledger import ledger_orm
+from orm.aggregate import ledger_aggregate_orm
+from models.user import User
+from schemas.ledger import WalletCreate, WalletDeposit, WalletWithdraw
+from ledger.services.operations import ledger_operations
+from auth.hashers import pwd_hasher
+from tests.test_user import client
+
+# Third Party Imports
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+
+admin_name = "".join(random.choice(string.ascii_lowercase) for i in range(8))
+admin_email = admin_name + "@admin.com"
+admin_password = admin_name + "_weakpassword"
+
+
+async def login_admin() -> str:
+    """Function to create an admin user (once) and get its access token."""
+
+    if await users_orm.get_email(admin_email) is None:
+        await users_orm.create_admin(
+            admin_name,
+            admin_email,
+            pwd_hasher.hash_password(admin_password),
+            True,
+        )
+
+    response = client.post(
+        "/login/",
+        data=json.dumps({"email": admin_email, "password": admin_password}),
+    )
+    return response.json()["access_token"]
+
+
+@pytest.mark.asyncio
+async def test_service_metrics():
+    """Ensure an admin user can read the service metrics."""
+
+    token = await login_admin()
+    response = client.get(
+        "/admin/metrics/", headers={"Authorization": "Bearer " + token}
+    )
+
+    assert response.status_code == 200
+    assert set(response.json()) == {"counters", "gauges", "timings"}
+
+
+def test_pool_metrics():
+    """Ensure every connection pool reports its own usage."""
+
+    pool = ObservedQueuePool(
+        lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=1
+    )
+    replica = ObservedQueuePool(
+        lambda: sqlite3.connect(":memory:"),
+        pool_size=1,
+        max_overflow=0,
+        logging_name="replica0",
+    )
+
+    connection = pool.connect()
+    replica.connect().close()
+    assert metrics.snapshot()["gauges"]["db.pool.primary.checked_out"] == 1
+    assert metrics.snapshot()["gauges"]["db.pool.primary.saturation"] == 0.5
+    assert metrics.snapshot()["gauges"]["db.pool.replica0.checked_out"] == 0
+
+    # a pool without any capacity is saturated, not a division by zero
+    ObservedQueuePool(
+        lambda: sqlite3.connect(":memory:"),
+        pool_size=0,
+        max_overflow=0,
+        logging_name="empty",
+    )._report()
+    assert metrics.snapshot()["gauges"]["db.pool.empty.saturation"] == 1.0
+
+    connection.close()
+    assert metrics.snapshot()["gauges"]["db.pool.primary.checked_out"] == 0
+    assert metrics.snapshot()["timings"]["db.pool.checkout_wait"]["count"]
+
+
+@pytest.mark.asyncio
+async def test_replica_routing():
+    """Ensure reads go to a healthy replica, unless the user just wrote."""
+
+    router = ReplicaRouter([SQLALCHEMY_DATABASE_URL], read_your_writes=60)
+    replica = router.replicas[0].engine.sync_engine
+
+    # replicas only get reads once their lag has been measured
+    assert router.read_bind(Session()) is None
+    await router.check_lag()
+    assert router.read_bind(Session()) == {"bind": replica}
+
+    token = request_user.set(1)
+    router.record_write(1)
+    assert router.read_bind(Session()) is None
+    request_user.reset(token)
+
+    session = Session()
+    session.info["wrote"] = True
+    assert router.read_bind(session) is None
+
+    # balances are cached for every user, so they are loaded from the
+    # primary, whoever wrote them last
+    async def load() -> int:
+        assert router.read_bind(Session()) is None
+        return 100
+
+    cache = BalanceCache(local=LRUCache(10, 60))
+    assert await cache.wallet_balance(2, 1, load) == 100
+    assert router.read_bind(Session()) == {"bind": replica}
+
+    await router.stop()
+    assert router.read_bind(Session()) is None
+
+
+async def create_admin_wallet() -> int:
+    """Function to create a wallet for the admin user."""
+
+    admin_user = await users_orm.get_email(admin_email)
+    wallet = await ledger_orm.create(
+        WalletCreate(user=admin_user.id, amount=0, title="imports")
+    )
+    return wallet.id
+
+
+@pytest.mark.asyncio
+async def test_import_deposits():
+    """Ensure an admin user can import a csv file of deposits."""
+
+    token = await login_admin()
+    admin_user = await users_orm.get_email(admin_email)
+    wallet_id = await create_admin_wallet()
+
+    rows = "".join(
+        f"{admin_user.id},{wallet_id},{amount}\n" for amount in (100, 200, 300)
+    )
+    response = client.post(
+        "/admin/imports/deposits/",
+        params={"format": "csv", "chunk_size": 2},
+        content="user,id,amount\n" + rows,
+        headers={"Authorization": "Bearer " + token},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert response.json()["rows_committed"] == 3
+    assert response.json()["chunks_committed"] == 2
+
+    wallet = await ledger_orm.get(admin_user.id, wallet_id)
+    assert wallet.amount == 600
+
+
+@pytest.mark.asyncio
+async def test_resume_import_deposits():
+    """Ensure a failed import resumes after its last committed chunk."""
+
+    token = await login_admin()
+    admin_user = await users_orm.get_email(admin_email)
+    wallet_id = await create_admin_wallet()
+
+    def ndjson(amounts: list) -> str:
+        return "".join(
+            json.dumps({"user": admin_user.id, "id": wallet_id, "amount": a})
+            + "\n"
+            for a in amounts
+        )
+
+    response = client.post(
+        "/admin/imports/deposits/",
+        params={"format": "ndjson", "chunk_size": 2},
+        content=ndjson([100, 200, "oops", 400]),
+        headers={"Authorization": "Bearer " + token},
+    )
+    job = response.json()
+
+    assert job["status"] == "failed"
+    assert job["rows_committed"] == 2
+
+    response = client.post(
+        "/admin/imports/deposits/",
+        params={"format": "ndjson", "chunk_size": 2, "job_id": job["id"]},
+        content=ndjson([100, 200, 300, 400]),
+        headers={"Authorization": "Bearer " + token},
+    )
+
+    assert response.json()["status"] == "completed"
+    assert response.json()["rows_committed"] == 4
+
+    wallet = await ledger_orm.get(admin_user.id, wallet_id)
+    assert wallet.amount == 1000
+
+
+@pytest.mark.asyncio
+async def test_import_unknown_wallet():
+    """Ensure a chunk refused by the ledger fails the import job."""
+
+    token = await login_admin()
+    admin_user = await users_orm.get_email(admin_email)
+    wallet_id = await create_admin_wallet()
+
+    rows = "".join(
+        f"{admin_user.id},{wallet}\n"
+        for wallet in (wallet_id, wallet_id, 2_000_000_000, wallet_id)
+    )
+    response = client.post(
+        "/admin/imports/deposits/",
+        params={"format": "csv", "chunk_size": 2},
+        content="user,id,amount\n" + rows.replace("\n", ",100\n"),
+        headers={"Authorization": "Bearer " + token},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "failed"
+    assert response.json()["rows_committed"] == 2
+    assert response.json()["error"].startswith("Chunk after row 2: ")
+
+    wallet = await ledger_orm.get(admin_user.id, wallet_id)
+    assert wallet.amount == 200
+
+
+@pytest.mark.asyncio
+async def test_stripe_wallet():
+    """Ensure a striped wallet keeps a single, correct balance."""
+
+    token = await login_admin()
+    admin_user = await users_orm.get_email(admin_email)
+    wallet_id = await create_admin_wallet()
+
+    response = client.post(
+        f"/admin/wallets/{wallet_id}/stripes/",
+        params={"stripes": 4},
+        headers={"Authorization": "Bearer " + token},
+    )
+    assert response.status_code == 200
+
+    total = (await ledger_aggregate_orm.total_sum(admin_user.id))[0][0]
+    stored = await users_orm.orm.scalar(
+        select(User.balance).where(User.id == admin_user.id)
+    )
+
+    for _ in range(8):
+        await ledger_operations.deposit_money_to_wallet(
+            WalletDeposit(user=admin_user.id, id=wallet_id, amount=100)
+        )
+
+    # more than any one stripe holds, so it borrows across the stripes
+    await ledger_operations.withdraw_money_from_wallet(
+        WalletWithdraw(user=admin_user.id, id=wallet_id, amount=700)
+    )
+
+    wallet = await ledger_orm.get(admin_user.id, wallet_id)
+    assert wallet.amount == 100
+    assert wallet.stripes == 4
+
+    # the stripes are added to the total when it is read,
+    # writers to the stripes never queue on the user row
+    assert (await ledger_aggregate_orm.total_sum(admin_user.id))[0][0] == (
+        total + 100
+    )
+    assert (
+        await users_orm.orm.scalar(
+            select(User.balance).where(User.id == admin_user.id)
+        )
+        == stored
+    )
+
+    with pytest.raises(HTTPException):
+        await ledger_operations.withdraw_money_from_wallet(
+            WalletWithdraw(user=admin_user.id, id=wallet_id, amount=101)
+        )
+
+
+@pytest.mark.asyncio
+async def test_export_ledger():
+    """Ensure an admin user can stream the users and journal exports."""
+
+    token = await login_admin()
+    admin_user = await users_orm.get_email(admin_email)
+    headers = {"Authorization": "Bearer " + token}
+
+    response = client.get("/admin/exports/users/", headers=headers)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert admin_user.id in {row["user_id"] for row in rows}
+
+    response = client.get(
+        "/admin/exports/users/",
+        params={"format": "csv", "gzip": True},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert next(csv.reader(lines))[:3] == ["user_id", "name", "email"]
+    assert len(lines) == len(rows) + 1
+
+    response = client.get(
+        "/admin/exports/entries/",
+        params={"start": "2000-01-01T00:00:00", "end": "2000-01-02T00:00:00"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.text == ""
+
+    response = client.get("/admin/exports/passwords/", headers=headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_export_striped_totals():
+    """Ensure the exported total of a user adds up its exported wallets."""
+
+    token = await login_admin()
+    admin_user = await users_orm.get_email(admin_email)
+    headers = {"Authorization": "Bearer " + token}
+    wallet_id = await create_admin_wallet()
+
+    client.post(
+        f"/admin/wallets/{wallet_id}/stripes/",
+        params={"stripes": 4},
+        headers=headers,
+    )
+    for _ in range(4):
+        await ledger_operations.deposit_money_to_wallet(
+            WalletDeposit(user=admin_user.id, id=wallet_id, amount=100)
+        )
+
+    response = client.get("/admin/exports/users/", headers=headers)
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    rows = [row for row in rows if row["user_id"] == admin_user.id]
+
+    assert {row["wallet_id"]: row["amount"] for row in rows}[wallet_id] == 400
+    assert rows[0]["total_balance"] == sum(row["amount"] for row in rows)
+    assert rows[0]["total_balance"] == (
+        await ledger_aggregate_orm.total_sum(admin_user.id)
+    )[0][0]
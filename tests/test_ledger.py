@@ -1,16 +1,33 @@
 # Stdlib Imports
 import json
+import asyncio
 import random
 import string
 from typing import Tuple
 
 # Own Imports
 from orm.users import users_orm
-from orm.ledger import ledger_orm
+from orm.ledger import ledger_orm, wallet_balance
+from orm.journal import journal_orm
+from orm.aggregate import ledger_aggregate_orm
+from models.ledger import Entry, TransactionType, Wallet as Userwallet
+from models.user import User
+from schemas.ledger import WalletCreate, WalletDeposit
 from tests.test_user import client
+from core.metrics import metrics
+from ledger.services.transfers import DEADLOCK_DETECTED, TransferEngine
+from ledger.services.idempotency import idempotent_requests
+from ledger.services.coalescing import DepositQueue
+from config.replicas import replica_router, request_user
+from ledger.services.balances import BalanceCache, balance_cache
+from ledger.services.operations import ledger_operations
+from core.cache import LRUCache, LocalStore, SharedCache
 
 # Third Party Imports
 import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select, text, update
+from sqlalchemy.exc import DBAPIError
 
 
 name = "".join(random.choice(string.ascii_lowercase) for i in range(6))
@@ -78,6 +95,197 @@ async def test_get_wallets():
     assert response.status_code == 200
 
 
+@pytest.mark.asyncio
+async def test_get_wallets_by_cursor():
+    """Ensure the wallets of a user can be paged through with cursors."""
+
+    cursor_name = "".join(random.choice(string.ascii_lowercase) for i in range(8))
+    cursor_email = cursor_name + "@email.com"
+    client.post(
+        "/register/",
+        data=json.dumps(
+            {"name": cursor_name, "email": cursor_email, "password": password}
+        ),
+    )
+    user_id = await get_user_id(cursor_email)
+    token = await login_user(cursor_email, password)
+
+    for index in range(3):
+        await ledger_orm.create(
+            WalletCreate(user=user_id, amount=0, title=f"{cursor_name}{index}")
+        )
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        response = client.get(
+            "/wallets/",
+            params=params,
+            headers={"Authorization": "Bearer " + token},
+        )
+        assert response.status_code == 200
+
+        seen += [wallet["id"] for wallet in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert len(seen) == 3
+    assert seen == sorted(seen)
+
+    response = client.get(
+        "/wallets/",
+        params={"cursor": "not-a-cursor"},
+        headers={"Authorization": "Bearer " + token},
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_wallet_transaction_history():
+    """Ensure the transactions of a wallet can be paged through and filtered."""
+
+    history_name = "".join(random.choice(string.ascii_lowercase) for i in range(8))
+    history_email = history_name + "@email.com"
+    client.post(
+        "/register/",
+        data=json.dumps(
+            {"name": history_name, "email": history_email, "password": password}
+        ),
+    )
+    user_id = await get_user_id(history_email)
+    token = await login_user(history_email, password)
+    headers = {"Authorization": "Bearer " + token}
+
+    wallet = await ledger_orm.create(
+        WalletCreate(user=user_id, amount=0, title=history_name)
+    )
+    for kind, amount in [
+        (TransactionType.DEPOSIT, 100),
+        (TransactionType.DEPOSIT, 200),
+        (TransactionType.WITHDRAWAL, -50),
+        (TransactionType.DEPOSIT, 300),
+    ]:
+        await journal_orm.record(kind, [(wallet.id, amount), (None, -amount)])
+    await journal_orm.orm.commit()
+
+    url = f"/wallets/{wallet.id}/transactions/"
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3} if cursor is None else {"limit": 3, "cursor": cursor}
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+
+        seen += response.json()
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert [entry["amount"] for entry in seen] == [300, -50, 200, 100]
+    assert seen[1]["type"] == "withdrawal"
+
+    response = client.get(url, params={"type": "withdrawal"}, headers=headers)
+    assert [entry["amount"] for entry in response.json()] == [-50]
+
+    response = client.get(
+        url,
+        params={"from": seen[2]["created_at"], "to": seen[0]["created_at"]},
+        headers=headers,
+    )
+    assert [entry["amount"] for entry in response.json()] == [-50, 200]
+
+    response = client.get(url, params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400
+
+    # the history of another user wallet is not disclosed
+    other_token = await login_user(email, password)
+    response = client.get(
+        url, headers={"Authorization": "Bearer " + other_token}
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_wallet_limit():
+    """Ensure concurrent wallet creations can not exceed the wallet limit."""
+
+    limit_name = "".join(random.choice(string.ascii_lowercase) for i in range(8))
+    client.post(
+        "/register/",
+        data=json.dumps(
+            {
+                "name": limit_name,
+                "email": limit_name + "@email.com",
+                "password": password,
+            }
+        ),
+    )
+    user_id = await get_user_id(limit_name + "@email.com")
+
+    async def create(index: int):
+        return await ledger_orm.create(
+            WalletCreate(user=user_id, amount=0, title=f"{limit_name}{index}")
+        )
+
+    created = await asyncio.gather(
+        *(create(index) for index in range(12)), return_exceptions=True
+    )
+    refused = [result for result in created if isinstance(result, HTTPException)]
+
+    assert len(created) - len(refused) == 10
+    assert all(error.status_code == 400 for error in refused)
+    assert refused[0].detail["message"] == "User can only have 10 wallets!"
+
+    user = await users_orm.get(user_id)
+    assert user.wallet_count == len(user.wallets) == 10
+
+
+@pytest.mark.asyncio
+async def test_delete_wallet():
+    """Ensure only a wallet without history can be deleted."""
+
+    owner_name = "".join(random.choice(string.ascii_lowercase) for i in range(8))
+    client.post(
+        "/register/",
+        data=json.dumps(
+            {
+                "name": owner_name,
+                "email": owner_name + "@email.com",
+                "password": password,
+            }
+        ),
+    )
+    user_id = await get_user_id(owner_name + "@email.com")
+
+    used, unused = [
+        (
+            await ledger_orm.create(
+                WalletCreate(user=user_id, amount=0, title=f"{owner_name}{index}")
+            )
+        ).id
+        for index in range(2)
+    ]
+    await ledger_operations.deposit_money_to_wallet(
+        WalletDeposit(user=user_id, id=used, amount=100)
+    )
+
+    with pytest.raises(HTTPException) as error:
+        await ledger_orm.delete(used)
+    assert error.value.status_code == 400
+    assert (
+        await ledger_orm.orm.scalar(
+            select(Userwallet.amount).where(Userwallet.id == used)
+        )
+        == 100
+    )
+
+    assert await ledger_orm.delete(unused)
+    assert await ledger_orm.get(user_id, unused) is None
+
+    user = await users_orm.get(user_id)
+    assert user.wallet_count == len(user.wallets) == 1
+
+
 @pytest.mark.asyncio
 async def test_deposit_money():
     """Ensure an authenticated user can deposit money."""
@@ -126,6 +334,111 @@ async def test_withdraw_money():
     )
 
 
+@pytest.mark.asyncio
+async def test_withdraw_money_insufficient_funds():
+    """Ensure a withdrawal can not take a wallet below zero."""
+
+    user_id = await get_user_id(email)
+    token = await login_user(email, password)
+    wallets = await ledger_orm.filter(
+        **{"user_id": user_id, "skip": 0, "limit": 2}
+    )
+
+    payload = {
+        "user": user_id,
+        "amount": wallets[0].amount + 1,
+        "id": wallets[0].id,
+    }
+    response = client.post(
+        "/withdraw/",
+        data=json.dumps(payload),
+        headers={"Authorization": "Bearer " + token},
+    )
+
+    assert response.status_code == 400
+    assert (
+        response.json()["detail"]["message"]
+        == f"Insufficient funds in wallet ID:{wallets[0].id}!"
+    )
+
+
+@pytest.mark.asyncio
+async def test_deposit_money_idempotency_key():
+    """Ensure a retried deposit with the same Idempotency-Key is applied once."""
+
+    user_id = await get_user_id(email)
+    token = await login_user(email, password)
+    wallets = await ledger_orm.filter(
+        **{"user_id": user_id, "skip": 0, "limit": 2}
+    )
+    balance = wallets[0].amount
+
+    payload = {"user": user_id, "amount": 700, "id": wallets[0].id}
+    headers = {
+        "Authorization": "Bearer " + token,
+        "Idempotency-Key": "deposit-" + wallet_title,
+    }
+    first = client.post("/deposit/", data=json.dumps(payload), headers=headers)
+    retry = client.post("/deposit/", data=json.dumps(payload), headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert first.json() == retry.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+    # replayed from the stored key once the in-process cache is cold
+    idempotent_requests.cache.clear()
+    retry = client.post("/deposit/", data=json.dumps(payload), headers=headers)
+    assert retry.json() == first.json()
+
+    wallet = await ledger_orm.get(user_id, wallets[0].id)
+    assert wallet.amount == balance + 700
+
+    response = client.post(
+        "/deposit/",
+        data=json.dumps({**payload, "amount": 800}),
+        headers=headers,
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_idempotency_key_kept_once_money_moved(monkeypatch):
+    """Ensure a request failing after its money moved is not applied twice."""
+
+    user_id = await get_user_id(email)
+    wallets = await ledger_orm.filter(
+        **{"user_id": user_id, "skip": 0, "limit": 1}
+    )
+    balance = wallets[0].amount
+    deposit = WalletDeposit(user=user_id, id=wallets[0].id, amount=300)
+    response = {"message": "NGN300 deposit successful!"}
+
+    async def cache_unavailable(*args):
+        raise ConnectionError("balance cache is unavailable")
+
+    monkeypatch.setattr(balance_cache, "wallet_changed", cache_unavailable)
+
+    async def operation() -> dict:
+        await ledger_operations.deposit_money_to_wallet(deposit)
+        return response
+
+    key = "committed-" + wallet_title
+    with pytest.raises(ConnectionError):
+        await idempotent_requests.run(
+            user_id, key, "/deposit/", deposit, operation, response
+        )
+
+    idempotent_requests.cache.clear()
+    retry = await idempotent_requests.run(
+        user_id, key, "/deposit/", deposit, operation, response
+    )
+    assert retry.status_code == 200
+    assert json.loads(retry.body) == response
+
+    wallet = await ledger_orm.get(user_id, wallets[0].id)
+    assert wallet.amount == balance + 300
+
+
 @pytest.mark.asyncio
 async def test_wallet_to_wallet_transfer():
     """Ensure an authenticated user can transfer from x to y wallet."""
@@ -138,7 +451,7 @@ async def test_wallet_to_wallet_transfer():
         data=json.dumps(
             {
                 "user": user_id,
-                "amount": random.randint(10000, 99999),
+                "amount": random.randint(50000, 99999),
                 "title": wallet_title,
             }
         ),
@@ -253,6 +566,52 @@ async def test_wallet_to_user_transfer():
     assert wallet_to.json()["title"] == wallet_title + "_2"
 
 
+@pytest.mark.asyncio
+async def test_batch_transfer():
+    """Ensure a batch of transfers is applied with a result per transfer."""
+
+    user_id = await get_user_id(email)
+    token = await login_user(email, password)
+    wallets = await ledger_orm.filter(
+        **{"user_id": user_id, "skip": 0, "limit": 2}
+    )
+    wallet_from, wallet_to = wallets[0], wallets[1]
+    balance_from, balance_to = wallet_from.amount, wallet_to.amount
+
+    transfer = {
+        "user": user_id,
+        "wallet_from": wallet_from.id,
+        "wallet_to": wallet_to.id,
+        "user_to": user_id,
+    }
+    payload = [
+        {**transfer, "amount": 100},
+        {**transfer, "amount": balance_from},
+        {**transfer, "amount": 200},
+    ]
+    response = client.post(
+        "/transfer/batch/",
+        data=json.dumps(payload),
+        headers={"Authorization": "Bearer " + token},
+    )
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()] == [
+        "completed",
+        "failed",
+        "completed",
+    ]
+    assert (
+        response.json()[1]["message"]
+        == f"Insufficient funds in wallet ID:{wallet_from.id}!"
+    )
+
+    wallet_from = await ledger_orm.get(user_id, wallet_from.id)
+    wallet_to = await ledger_orm.get(user_id, wallet_to.id)
+    assert wallet_from.amount == balance_from - 300
+    assert wallet_to.amount == balance_to + 300
+
+
 @pytest.mark.asyncio
 async def test_total_wallet_balance():
     """Ensure an authenticated user can get the total balance of their wallets."""
@@ -282,3 +641,214 @@ async def test_wallet_balance():
     )
 
     assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_money_movement_is_journaled():
+    """Ensure every wallet balance is backed by balanced journal entries."""
+
+    user_id = await get_user_id(email)
+    wallets = await ledger_orm.filter(
+        **{"user_id": user_id, "skip": 0, "limit": 10}
+    )
+
+    for wallet in wallets:
+        entries = await journal_orm.orm.scalars(
+            select(Entry).filter(Entry.wallet_id == wallet.id)
+        )
+        entries = entries.all()
+        assert sum(entry.amount for entry in entries) == wallet.amount
+
+        for entry in entries:
+            legs = await journal_orm.orm.scalars(
+                select(Entry).filter(
+                    Entry.transaction_id == entry.transaction_id
+                )
+            )
+            assert sum(leg.amount for leg in legs) == 0
+
+
+@pytest.mark.asyncio
+async def test_transfer_retries_deadlocks():
+    """Ensure a transfer aborted by a deadlock is replayed."""
+
+    class Deadlock(Exception):
+        pgcode = DEADLOCK_DETECTED
+
+    attempts = []
+
+    async def operation():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise DBAPIError("UPDATE users_wallet", {}, Deadlock())
+        return "done"
+
+    retried = metrics.snapshot()["counters"].get(
+        "transfers.retried.deadlock", 0
+    )
+    engine = TransferEngine(ledger_orm.orm, max_retries=2, base_delay=0)
+
+    assert await engine.run(operation) == "done"
+    assert len(attempts) == 2
+    assert (
+        metrics.snapshot()["counters"]["transfers.retried.deadlock"]
+        == retried + 1
+    )
+
+
+@pytest.mark.asyncio
+async def test_coalesced_deposits():
+    """Ensure queued deposits are group committed and all answered."""
+
+    user_id = await get_user_id(email)
+    wallet = await ledger_orm.create(
+        WalletCreate(user=user_id, amount=0, title=wallet_title)
+    )
+    queue = DepositQueue(ledger_orm.orm, max_batch=50, max_delay=0.05)
+
+    # the flusher is started by a request of another user
+    replica_router._writes.delete(user_id)
+    token = request_user.set(-1)
+    results = await asyncio.gather(
+        *[
+            queue.submit(WalletDeposit(user=user_id, id=wallet.id, amount=10))
+            for _ in range(20)
+        ],
+        queue.submit(WalletDeposit(user=user_id, id=0, amount=10)),
+        return_exceptions=True,
+    )
+    await queue.close()
+    request_user.reset(token)
+
+    assert sorted(results[:20]) == list(range(10, 210, 10))
+    assert results[20].status_code == 404
+    assert (await ledger_orm.get(user_id, wallet.id)).amount == 200
+    assert metrics.snapshot()["timings"]["deposits.batch_size"]["max"] > 1
+
+    # the writes are the depositors', not the user who started the flusher
+    assert replica_router._writes.get(user_id)
+    assert replica_router._writes.get(-1) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "cache",
+    [
+        BalanceCache(local=LRUCache(10, 60)),
+        BalanceCache(shared=SharedCache(LocalStore(10), 60)),
+    ],
+)
+async def test_balance_cache(cache: BalanceCache):
+    """Ensure cached balances are loaded once and follow our writes."""
+
+    loads = []
+
+    async def load() -> int:
+        loads.append(1)
+        return 100
+
+    assert await cache.wallet_balance(1, 1, load) == 100
+    assert await cache.wallet_balance(1, 1, load) == 100
+    assert len(loads) == 1
+
+    # a committed write drops the balance, along with the user total
+    assert await cache.total_balance(1, load) == 100
+    await cache.wallet_changed(1, 1)
+    assert await cache.wallet_balance(1, 1, load) == 100
+    assert await cache.total_balance(1, load) == 100
+    assert len(loads) == 4
+
+
+@pytest.mark.asyncio
+async def test_shared_balance_cache_refuses_stale_loads():
+    """Ensure a balance loaded before another worker's write is not cached."""
+
+    store = LocalStore(10)
+    reader = BalanceCache(shared=SharedCache(store, 60), hold=60)
+    writer = BalanceCache(shared=SharedCache(store, 60), hold=60)
+    balances = [100]
+
+    async def load_during_write() -> int:
+        balance = balances[0]
+        # the write commits and invalidates while the reader loads
+        balances[0] = 150
+        await writer.wallet_changed(1, 1)
+        return balance
+
+    async def load() -> int:
+        return balances[0]
+
+    assert await reader.wallet_balance(1, 1, load_during_write) == 100
+    assert await reader.wallet_balance(1, 1, load) == 150
+
+
+@pytest.mark.asyncio
+async def test_user_totals_follow_balances():
+    """Ensure the user totals match their wallets, and can be repaired."""
+
+    async def verify(repair: bool = False) -> list:
+        after, drifts = 0, []
+        while after is not None:
+            after, chunk = await ledger_aggregate_orm.verify_totals(
+                after, 2, repair=repair
+            )
+            drifts += chunk
+        return drifts
+
+    assert await verify() == []
+
+    user_id = await get_user_id(email)
+    balance = (await ledger_aggregate_orm.total_sum(user_id))[0][0]
+    await ledger_orm.orm.execute(
+        update(User).where(User.id == user_id).values(balance=balance + 7)
+    )
+    await ledger_orm.orm.commit()
+
+    assert await verify(repair=True) == [(user_id, balance + 7, balance)]
+    assert await verify() == []
+
+
+@pytest.mark.asyncio
+async def test_wallet_queries_use_owner_indexes():
+    """Ensure the wallet queries by owner and the wallet history use an index."""
+
+    session = ledger_orm.orm
+    dialect = session.get_bind().dialect
+    if dialect.name == "postgresql":
+        # the test tables are too small for the planner to bother
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+        explain = "EXPLAIN "
+    else:
+        explain = "EXPLAIN QUERY PLAN "
+
+    queries = [
+        ledger_orm.partial_balances().filter(Userwallet.user == 1),
+        select(func.count())
+        .select_from(Userwallet)
+        .filter(Userwallet.user == 1),
+        select(Userwallet.user, func.sum(wallet_balance))
+        .filter(Userwallet.user.in_([1, 2]))
+        .group_by(Userwallet.user),
+    ]
+    for query in queries:
+        sql = query.compile(
+            dialect=dialect, compile_kwargs={"literal_binds": True}
+        )
+        plan = await session.execute(text(explain + str(sql)))
+        plan = " ".join(str(row) for row in plan.all())
+
+        assert "ix_users_wallet_user" in plan, plan
+
+    history = (
+        select(Entry.id)
+        .filter(Entry.wallet_id == 1)
+        .order_by(Entry.created_at.desc(), Entry.id.desc())
+        .limit(10)
+    )
+    sql = history.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    plan = await session.execute(text(explain + str(sql)))
+    plan = " ".join(str(row) for row in plan.all())
+
+    assert "ix_entries_wallet_created" in plan, plan
+
+    await session.rollback()
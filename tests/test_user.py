@@ -1,5 +1,7 @@
 # Stdlib Imports
+import os
 import json
+import asyncio
 import random
 import string
 
@@ -9,10 +11,25 @@ from fastapi.testclient import TestClient
 # Own Imports
 from main import app
 from orm.users import users_orm
-from auth.hashers import pwd_hasher
+from auth.hashers import (
+    PasswordHasher,
+    load_rounds,
+    pwd_hasher,
+    rounds_context,
+)
+from auth.principals import principals
+from auth.revocation import revoked_tokens
+from users.auth import refresh_token
+from schemas.auth import RefreshTokenSchema
+from core.bloom import BloomFilter
+from auth.auth_handler import AuthHandler
+from core.metrics import metrics
+from core.settings import ledger_settings
 
 # Third Party Imports
+import jwt
 import pytest
+from fastapi import HTTPException
 
 
 # initialize test client
@@ -105,6 +122,26 @@ async def test_users_info():
     )
 
     assert response.status_code == 200
+    assert all("wallets" not in user for user in response.json())
+
+    response = client.get(
+        "/users/",
+        params={"include": "wallets", "limit": 2},
+        headers={"Authorization": "Bearer " + token},
+    )
+
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert all("wallets" in user for user in response.json())
+
+    next_page = client.get(
+        "/users/",
+        params={"cursor": response.headers["X-Next-Cursor"], "limit": 2},
+        headers={"Authorization": "Bearer " + token},
+    )
+
+    assert next_page.status_code == 200
+    assert next_page.json()[0]["id"] > response.json()[-1]["id"]
 
 
 @pytest.mark.asyncio
@@ -123,3 +160,239 @@ async def test_user_info():
     assert response.status_code == 200
     assert response.json()["email"] == email
     assert response.json()["is_active"] == True
+
+
+@pytest.mark.asyncio
+async def test_self_contained_tokens():
+    """Ensure tokens carry the role of the user, and can be revoked."""
+
+    tokens = client.post(
+        "/login/", data=json.dumps({"email": email, "password": password})
+    ).json()
+    headers = {"Authorization": "Bearer " + tokens["access_token"]}
+    user = await users_orm.get_email(email)
+
+    claims = jwt.decode(tokens["access_token"], options={"verify_signature": False})
+    assert claims["sub"] == str(user.id)
+    assert claims["role"] == "user" and claims["typ"] == "access"
+    assert {"iat", "exp", "jti", "ver"} <= set(claims)
+
+    assert client.get("/wallets/", headers=headers).status_code == 200
+    assert client.get("/users/", headers=headers).status_code == 401
+
+    # a refresh token is not an access token
+    response = client.get(
+        "/wallets/", headers={"Authorization": "Bearer " + tokens["refresh_token"]}
+    )
+    assert response.status_code == 403
+
+    # promoting the user revokes their tokens, the refresh token
+    # of before the promotion can not be traded either
+    await principals.update(user.id, is_admin=True)
+    assert client.get("/wallets/", headers=headers).status_code == 401
+    response = client.post(
+        "/refresh/", data=json.dumps({"refresh_token": tokens["refresh_token"]})
+    )
+    assert response.status_code == 401
+
+    tokens = client.post(
+        "/login/", data=json.dumps({"email": email, "password": password})
+    ).json()
+    response = client.post(
+        "/refresh/", data=json.dumps({"refresh_token": tokens["refresh_token"]})
+    )
+    assert response.status_code == 200
+    headers = {"Authorization": "Bearer " + response.json()["access_token"]}
+    assert client.get("/users/", headers=headers).status_code == 200
+
+    # so does demoting them, the admin token is not honoured anymore
+    await principals.update(user.id, is_admin=False)
+    assert client.get("/users/", headers=headers).status_code == 401
+    assert client.get("/wallets/", headers=headers).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_cached_principal():
+    """Ensure the principal of a user is cached until the user changes."""
+
+    user = await users_orm.get_email(email)
+    principals.invalidate(user.id)
+
+    misses = metrics.snapshot()["counters"].get("principals.cache_misses", 0)
+    assert (await principals.get(user.id)).id == user.id
+    assert metrics.snapshot()["counters"]["principals.cache_misses"] == misses + 1
+
+    hits = metrics.snapshot()["counters"].get("principals.cache_hits", 0)
+    assert (await principals.get(user.id)).id == user.id
+    assert metrics.snapshot()["counters"]["principals.cache_hits"] == hits + 1
+
+    # the change is seen straight away, not when the entry expires
+    await principals.update(user.id, is_active=False)
+    assert (await principals.get(user.id)).is_active is False
+    assert metrics.snapshot()["counters"]["principals.cache_misses"] == misses + 2
+
+    await principals.update(user.id, is_active=True)
+    assert (await principals.get(user.id)).is_active is True
+
+
+@pytest.mark.asyncio
+async def test_verified_token_cache():
+    """Ensure a token is verified once, and never served once expired."""
+
+    user = await users_orm.get_email(email)
+    handler = AuthHandler()
+    token = handler.sign_jwt(user)["access_token"]
+
+    claims = jwt.decode(token, options={"verify_signature": False})
+    assert isinstance(claims["exp"], int)
+
+    hits = metrics.snapshot()["counters"].get("auth.token_cache_hits", 0)
+    assert handler.decode_jwt(token)["sub"] == str(user.id)
+    assert handler.decode_jwt(token)["sub"] == str(user.id)
+    assert metrics.snapshot()["counters"]["auth.token_cache_hits"] == hits + 1
+
+    expired = AuthHandler(token_lifetime=-1).sign_jwt(user)["access_token"]
+    with pytest.raises(HTTPException) as error:
+        handler.decode_jwt(expired)
+    assert error.value.status_code == 400
+
+    with pytest.raises(HTTPException) as error:
+        handler.decode_jwt(token + "x")
+    assert error.value.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_hasher_pool():
+    """Ensure passwords are hashed off the event loop, and bursts are shed."""
+
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    try:
+        hashed = await hasher.async_hash_password(password)
+        assert await hasher.async_check_password(password, hashed)
+        assert not await hasher.async_check_password("string", hashed)
+        assert hasher.check_password(password, hashed)
+
+        results = await asyncio.gather(
+            *(hasher.async_hash_password(password) for _ in range(3)),
+            return_exceptions=True,
+        )
+        rejected = [error for error in results if isinstance(error, HTTPException)]
+        assert len(rejected) == 2
+        assert all(error.status_code == 503 for error in rejected)
+    finally:
+        hasher.close()
+
+
+@pytest.mark.asyncio
+async def test_rehash_on_login(tmp_path):
+    """Ensure hashes weaker than the calibrated cost are redone."""
+
+    path = str(tmp_path / "rounds.json")
+    hasher = PasswordHasher(rounds=0)
+    hasher.calibrated = False
+    try:
+        rounds = hasher.calibrate(budget=0, path=path)
+        assert rounds == ledger_settings.BCRYPT_MIN_ROUNDS == load_rounds(path)
+        assert ledger_settings.BCRYPT_ROUNDS == rounds
+        assert os.listdir(tmp_path) == ["rounds.json"]
+    finally:
+        ledger_settings.BCRYPT_ROUNDS = 0
+
+    # only weaker hashes are redone, not those of a faster host
+    hasher = PasswordHasher(rounds=5)
+    assert hasher.needs_update(rounds_context(4).hash(password))
+    assert not hasher.needs_update(rounds_context(6).hash(password))
+
+    weak_name = "".join(random.choice(string.ascii_lowercase) for i in range(8))
+    weak_user = await users_orm.create_admin(
+        weak_name,
+        weak_name + "@email.com",
+        rounds_context(4).hash(password),
+        False,
+    )
+    assert pwd_hasher.needs_update(weak_user.password)
+
+    response = client.post(
+        "/login/",
+        data=json.dumps({"email": weak_user.email, "password": password}),
+    )
+    assert response.status_code == 200
+
+    user = await users_orm.get_email(weak_user.email)
+    await users_orm.orm.refresh(user)
+    assert not pwd_hasher.needs_update(user.password)
+    assert pwd_hasher.check_password(password, user.password)
+
+
+@pytest.mark.asyncio
+async def test_logout():
+    """Ensure logged out and traded tokens can not be used anymore."""
+
+    def login() -> dict:
+        return client.post(
+            "/login/", data=json.dumps({"email": email, "password": password})
+        ).json()
+
+    def refresh(refresh_token: str):
+        return client.post(
+            "/refresh/", data=json.dumps({"refresh_token": refresh_token})
+        )
+
+    tokens, other = login(), login()
+    headers = {"Authorization": "Bearer " + tokens["access_token"]}
+
+    # a refresh token is traded once
+    assert refresh(other["refresh_token"]).status_code == 200
+    assert refresh(other["refresh_token"]).status_code == 401
+
+    response = client.post(
+        "/logout/",
+        data=json.dumps({"refresh_token": tokens["refresh_token"]}),
+        headers=headers,
+    )
+    assert response.status_code == 200
+
+    assert client.get("/wallets/", headers=headers).status_code == 401
+    assert refresh(tokens["refresh_token"]).status_code == 401
+
+    # the tokens of the other session are still valid
+    other_headers = {"Authorization": "Bearer " + other["access_token"]}
+    assert client.get("/wallets/", headers=other_headers).status_code == 200
+
+    # rebuilt from the table, the filter still holds the revoked tokens
+    await revoked_tokens.compact()
+    assert client.get("/wallets/", headers=headers).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refresh():
+    """Ensure concurrent trades of a refresh token yield a single pair."""
+
+    tokens = client.post(
+        "/login/", data=json.dumps({"email": email, "password": password})
+    ).json()
+    refresh = RefreshTokenSchema(refresh_token=tokens["refresh_token"])
+
+    results = await asyncio.gather(
+        *(refresh_token(refresh) for _ in range(5)), return_exceptions=True
+    )
+    refused = [error for error in results if isinstance(error, HTTPException)]
+
+    assert len(results) - len(refused) == 1
+    assert all(error.status_code == 401 for error in refused)
+
+
+def test_bloom_filter():
+    """Ensure the Bloom filter has no false negatives, and few positives."""
+
+    bloom = BloomFilter(1000, 0.01)
+    bloom.update(f"revoked-{i}" for i in range(1000))
+
+    assert all(f"revoked-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"valid-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+    # the overlapping refreshes add the same keys again
+    count = bloom.count
+    bloom.update(f"revoked-{i}" for i in range(1000))
+    assert bloom.count == count <= 1000
@@ -1,27 +1,47 @@
+# Stdlib Imports
+from typing import List, Optional, Union
+
 # FastAPI Imports
-from fastapi import Depends, HTTPException
+from fastapi import Depends, Query
 
 # Own Imports
-from schemas.user import User
+from schemas.user import Principal, User, UserSummary
 from users.router import router
 from orm.users import users_orm
 from core.deps import get_current_user, get_admin_user
+from core.responses import stream_json
+from core.pagination import decode_cursor, set_next_cursor
 
 
-@router.get("/users/", response_model=list[User])
+# users without their wallets, unless `include=wallets` is given
+@router.get(
+    "/users/", response_model=Union[List[UserSummary], List[User]]
+)
 async def users_info(
-    skip: int = 0, limit: int = 100, admin_user: User = Depends(get_admin_user)
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include: Optional[str] = Query(None, regex="^wallets$"),
+    admin_user: Principal = Depends(get_admin_user),
 ):
+    """
+    List the users, with their wallets when `include=wallets` is given.
+    Pass the `X-Next-Cursor` header of a page as `cursor` to get the
+    next one.
+    """
 
-    if admin_user is None:
-        raise HTTPException(404, {"message": "Admin user does not exist!"})
+    include_wallets = include == "wallets"
+    users = await users_orm.list(
+        skip, limit, decode_cursor(cursor), include_wallets
+    )
 
-    users = await users_orm.list(skip, limit)
-    return users
+    response = stream_json(users, User if include_wallets else UserSummary)
+    set_next_cursor(response, users, limit)
+    return response
 
 
 @router.get("/users/me/", response_model=User)
-async def user_info(current_user: User = Depends(get_current_user)):
+async def user_info(current_user: Principal = Depends(get_current_user)):
 
     user = await users_orm.get(user_id=current_user.id)
     return user
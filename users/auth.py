@@ -1,5 +1,9 @@
+# Stdlib Imports
+import datetime
+from typing import Optional
+
 # FastAPI Imports
-from fastapi import HTTPException
+from fastapi import Depends, HTTPException, Request
 
 # Own Imports
 from orm.users import users_orm
@@ -7,8 +11,11 @@ from users.router import router
 from users.services import create_user
 from auth.auth_handler import authentication
 from auth.hashers import pwd_hasher
-from schemas.user import User, UserCreate
-from schemas.auth import UserLoginSchema
+from auth.principals import principals
+from auth.revocation import revoked_tokens, token_versions
+from core.deps import get_current_user
+from schemas.user import Principal, User, UserCreate
+from schemas.auth import RefreshTokenSchema, UserLoginSchema
 
 
 # Remove dependencies
@@ -29,10 +36,82 @@ async def login_user(authenticate: UserLoginSchema):
     user = await users_orm.get_email(authenticate.email)
 
     if user:
-        user_token = authentication.sign_jwt(user.id)
+        if await pwd_hasher.async_check_password(
+            authenticate.password, user.password
+        ):
+            if not user.is_active:
+                raise HTTPException(401, {"message": "User is inactive!"})
 
-        if pwd_hasher.check_password(authenticate.password, user.password):
-            return user_token
+            # redo hashes weaker than this host's cost
+            if pwd_hasher.needs_update(user.password):
+                await users_orm.update(
+                    user.id,
+                    password=await pwd_hasher.async_hash_password(
+                        authenticate.password
+                    ),
+                )
+            return authentication.sign_jwt(user)
 
         raise HTTPException(401, {"message": "Password incorrect!"})
     raise HTTPException(404, {"message": "User does not exist!"})
+
+
+@router.post("/refresh/")
+async def refresh_token(refresh: RefreshTokenSchema):
+    """Trade a refresh token for a new pair of access and refresh tokens."""
+
+    claims = authentication.decode_jwt(refresh.refresh_token)
+    if claims["typ"] != "refresh":
+        raise HTTPException(403, {"message": "Token invalid."})
+
+    user_id = int(claims["sub"])
+    if not await token_versions.is_current(
+        user_id, claims["ver"]
+    ) or await revoked_tokens.is_revoked(claims["jti"]):
+        raise HTTPException(401, {"message": "Token has been revoked!"})
+
+    user = await principals.get(user_id)
+    if user is not None and user.token_version < claims["ver"]:
+        # cached from before a revocation made by another worker
+        principals.invalidate(user_id)
+        user = await principals.get(user_id)
+
+    if user is None:
+        raise HTTPException(404, {"message": "User does not exist!"})
+    if not user.is_active:
+        raise HTTPException(401, {"message": "User is inactive!"})
+
+    # a refresh token is traded once: of concurrent trades, only the
+    # one recording its revocation is answered
+    if not await revoked_tokens.revoke(
+        claims["jti"], user_id, datetime.datetime.fromtimestamp(claims["exp"])
+    ):
+        raise HTTPException(401, {"message": "Token has been revoked!"})
+    return authentication.sign_jwt(user)
+
+
+@router.post("/logout/")
+async def logout_user(
+    request: Request,
+    refresh: Optional[RefreshTokenSchema] = None,
+    current_user: Principal = Depends(get_current_user),
+) -> dict:
+    """
+    Revoke the access token of the request, and the refresh token
+    given along with it, if any.
+    """
+
+    tokens = [request.state.claims]
+    if refresh is not None:
+        claims = authentication.decode_jwt(refresh.refresh_token)
+        if claims["sub"] != str(current_user.id):
+            raise HTTPException(403, {"message": "Token invalid."})
+        tokens.append(claims)
+
+    for claims in tokens:
+        await revoked_tokens.revoke(
+            claims["jti"],
+            current_user.id,
+            datetime.datetime.fromtimestamp(claims["exp"]),
+        )
+    return {"message": "Logged out!"}
@@ -15,6 +15,6 @@ async def create_user(user: UserCreate) -> User:
     :return: The user object
     """
 
-    hashed_password = pwd_hasher.hash_password(user.password)
+    hashed_password = await pwd_hasher.async_hash_password(user.password)
     user = await users_orm.create(user, hashed_password)
     return user